@@ -0,0 +1,134 @@
+"""Append-only checkpoints for long, resumable extraction runs.
+
+Each finished batch is written once, as its own CSV part file, and a tiny
+cursor record says how far the run got and which batches were skipped:
+
+    <dir>/parts/part-000000-000025.csv
+    <dir>/parts/part-000025-000075.csv
+    <dir>/cursor.json      {"next_index": 75, "skipped": [[25, 50]]}
+
+Part files and the cursor are written to a temporary name and renamed into
+place, so a crash leaves either the old or the new version, never a torn
+file. A part is only "committed" once the cursor covers it; parts left over
+from a crash between the two writes are removed on resume and redone.
+
+Resuming reads only cursor.json. `consolidate()` stitches the parts (in
+grid order) into one CSV at the end of a run.
+"""
+import csv
+import glob
+import json
+import os
+
+
+def _atomic_write(path, write):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class CheckpointStore:
+    def __init__(self, directory, fieldnames):
+        self.directory = directory
+        self.fieldnames = list(fieldnames)
+        self.parts_dir = os.path.join(directory, "parts")
+        self.cursor_path = os.path.join(directory, "cursor.json")
+        os.makedirs(self.parts_dir, exist_ok=True)
+        self.next_index, self.skipped = self._read_cursor()
+        self._drop_uncommitted_parts()
+
+    def _read_cursor(self):
+        try:
+            with open(self.cursor_path, encoding="utf-8") as f:
+                cursor = json.load(f)
+        except FileNotFoundError:
+            return 0, []
+        return cursor.get("next_index", 0), [tuple(r) for r in cursor.get("skipped", [])]
+
+    def _write_cursor(self):
+        cursor = {"next_index": self.next_index, "skipped": [list(r) for r in sorted(self.skipped)]}
+        _atomic_write(self.cursor_path, lambda f: json.dump(cursor, f))
+
+    def _part_path(self, start, end):
+        return os.path.join(self.parts_dir, f"part-{start:06d}-{end:06d}.csv")
+
+    def _parts(self):
+        """(start, end, path) for every part file, in grid order."""
+        out = []
+        for path in glob.glob(os.path.join(self.parts_dir, "part-*.csv")):
+            _, start, end = os.path.basename(path)[:-4].split("-")
+            out.append((int(start), int(end), path))
+        return sorted(out)
+
+    def _drop_uncommitted_parts(self):
+        for start, end, path in self._parts():
+            beyond_cursor = start >= self.next_index
+            in_skipped = any(s <= start < e for s, e in self.skipped)
+            if beyond_cursor or in_skipped:
+                os.remove(path)
+
+    def write_batch(self, start, end, rows):
+        """Persist rows for cells [start, end) and advance the cursor past them."""
+        def write(f):
+            writer = csv.DictWriter(f, fieldnames=self.fieldnames, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+
+        _atomic_write(self._part_path(start, end), write)
+        if start >= self.next_index:
+            self.next_index = end
+        else:
+            # A retried batch that had been skipped earlier
+            remaining = self._split_skipped(start, end)
+            self.skipped = [r for r in self.skipped if not (r[0] <= start and end <= r[1])] + remaining
+        self._write_cursor()
+
+    def _split_skipped(self, start, end):
+        """What remains of the skipped range containing [start, end) after it succeeds."""
+        for s, e in self.skipped:
+            if s <= start and end <= e:
+                return [r for r in ((s, start), (end, e)) if r[0] < r[1]]
+        return []
+
+    def skip_batch(self, start, end):
+        """Record [start, end) as failed so a later run can retry it."""
+        # A retried piece of an already-skipped range is still covered by it
+        if not any(s <= start and end <= e for s, e in self.skipped):
+            self.skipped.append((start, end))
+        self.next_index = max(self.next_index, end)
+        self._write_cursor()
+
+    def row_count(self):
+        total = 0
+        for _, _, path in self._parts():
+            with open(path, newline="", encoding="utf-8") as f:
+                total += sum(1 for _ in f) - 1
+        return total
+
+    def consolidate(self, output_path):
+        """Concatenate all committed parts, in grid order, into `output_path`."""
+        def write(out):
+            out.write(",".join(self.fieldnames) + "\n")
+            for _, _, path in self._parts():
+                with open(path, newline="", encoding="utf-8") as f:
+                    next(f)  # header
+                    for line in f:
+                        out.write(line)
+
+        _atomic_write(output_path, write)
+
+
+def import_legacy_progress(store, progress_file):
+    """Turn an old progress.json ({"last_batch_index", "results"}) into one part."""
+    if store.next_index or not os.path.exists(progress_file):
+        return False
+    with open(progress_file, encoding="utf-8") as f:
+        legacy = json.load(f)
+    last = legacy.get("last_batch_index", 0)
+    if not last:
+        return False
+    store.write_batch(0, last, legacy.get("results", []))
+    return True
@@ -0,0 +1,225 @@
+"""On-disk cache of Earth Engine reduction results, per grid cell and band.
+
+Each value is stored under
+
+    (cell, band key) = (hash of the cell geometry,
+                        dataset | band | composite | reducer | scale | dates | transform
+                        | reduction scale)
+
+in a SQLite file (`ee_cache.sqlite` next to the scripts by default), so any
+script that reduces the same dataset over the same cell reuses the value,
+whatever grid or run it came from. `cached_extract()` looks every cell up
+first and sends only the misses to `ee_extract.extract`, grouped by which
+bands they are missing. Changing one band's dates or scale re-fetches only
+that band. Adding a year as a new band (e.g. "lst_2024") fetches only the
+new year. Results are written after every batch, so an interrupted run
+resumes where it stopped.
+
+A band's value depends on the scale the stack is reduced at, not only on
+its own: multiband_layer reduces at the finest scale of the bands stacked
+together. `cached_extract()` splits the requested bands into scale groups
+(ee_extract.scale_groups), reduces each band at the finest scale of its
+group, also when only some of the group's bands are missing, and makes that
+scale part of the key.
+
+    from ee_cache import ReductionCache, cached_extract
+    cells, failed = cached_extract(features, n, bands, ReductionCache(), batch_size=25)
+
+    python ee_cache.py [ee_cache.sqlite]     # what the cache holds
+"""
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+
+from ee_extract import extract, multiband_layer, scale_groups
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ee_cache.sqlite")
+# Coordinates are rounded to this many decimals (~1 cm) before hashing
+GEOMETRY_DECIMALS = 7
+# Features per getInfo() when pulling the grid geometries (EE caps collections at 5000)
+PAGE_SIZE = 5000
+SQL_CHUNK = 500
+CELL_PROPERTY = "_cell"
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS reductions (
+        cell TEXT NOT NULL,
+        band TEXT NOT NULL,
+        value REAL,
+        fetched_at REAL,
+        PRIMARY KEY (band, cell)
+    ) WITHOUT ROWID;
+"""
+
+
+def _round(coords):
+    if isinstance(coords, (list, tuple)):
+        return [_round(c) for c in coords]
+    return round(float(coords), GEOMETRY_DECIMALS)
+
+
+def geometry_hash(geometry):
+    """Stable hash of a GeoJSON geometry's type and (rounded) coordinates."""
+    canonical = json.dumps([geometry["type"], _round(geometry["coordinates"])], separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("ascii")).hexdigest()
+
+
+def band_key(band, reduce_scale=None):
+    """Cache key of an ee_extract.Band reduced at `reduce_scale` (default: its own scale).
+
+    The band's `key` must describe the source.
+    """
+    if not band.key:
+        raise ValueError(f"band {band.name!r} has no key; describe its dataset to cache it")
+    k = band.key
+    dates = "/".join(k.get("dates") or ())
+    return "|".join(str(part) for part in (
+        k["dataset"], k.get("band", ""), k.get("composite", ""), k.get("reducer", ""),
+        band.scale, dates, k.get("transform", ""), band.scale if reduce_scale is None else reduce_scale,
+    ))
+
+
+class ReductionCache:
+    """SQLite table of (cell hash, band key) -> value (NULL = EE returned no value)."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute(SCHEMA)
+
+    def get_many(self, cells, band):
+        """{cell: value} for the cached ones among `cells`."""
+        found = {}
+        cells = list(dict.fromkeys(cells))
+        for i in range(0, len(cells), SQL_CHUNK):
+            chunk = cells[i:i + SQL_CHUNK]
+            rows = self.conn.execute(
+                f"SELECT cell, value FROM reductions WHERE band = ? AND cell IN ({','.join('?' * len(chunk))})",
+                [band, *chunk],
+            )
+            found.update(rows)
+        return found
+
+    def put_many(self, rows):
+        """Store (cell, band, value) rows in one transaction."""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO reductions (cell, band, value, fetched_at) VALUES (?, ?, ?, ?)",
+                [(cell, band, value, now) for cell, band, value in rows],
+            )
+
+    def summary(self):
+        return self.conn.execute(
+            "SELECT band, COUNT(*), MAX(fetched_at) FROM reductions GROUP BY band ORDER BY band"
+        ).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+class _LocalFeatures:
+    """Stand-in for the `ee.List` that extract() slices: batches of local GeoJSON features."""
+
+    def __init__(self, features, ee_module):
+        self.features = features
+        self.ee = ee_module
+
+    def slice(self, start, end=None):
+        return self.ee.List([self.ee.Feature(f) for f in self.features[start:end]])
+
+
+def fetch_features(features, n, page_size=PAGE_SIZE):
+    """GeoJSON features of features[0:n] (an ee.List), a page per getInfo()."""
+    out = []
+    for start in range(0, n, page_size):
+        out.extend(features.slice(start, min(n, start + page_size)).getInfo())
+    return out
+
+
+def cached_extract(features, n, bands, cache, ee_module=None, progress=None, **extract_kwargs):
+    """Reduce `bands` over features[0:n], fetching only values missing from `cache`.
+
+    Returns (cells, failed): `cells` are {"id", "geometry", "properties"}
+    dicts for every cell, in grid order, and `failed` the number of cells
+    whose missing bands could not be fetched this run. Those bands are NaN
+    (None means EE returned no value) and are not cached. `progress(k)` is
+    called as k more cells are done.
+    """
+    if ee_module is None:
+        import ee as ee_module
+
+    local = fetch_features(features, n)
+    hashes = [geometry_hash(f["geometry"]) for f in local]
+    # Each band is reduced at the finest scale of its scale group, so a value
+    # does not depend on which other bands happened to be missing with it
+    reduce_scale = {b.name: group[0].scale for group in scale_groups(bands) for b in group}
+    keys = {b.name: band_key(b, reduce_scale[b.name]) for b in bands}
+    values = {b.name: cache.get_many(hashes, keys[b.name]) for b in bands}
+
+    # Cells grouped by the set of bands they are missing
+    groups = defaultdict(list)
+    for i, h in enumerate(hashes):
+        missing = tuple(b.name for b in bands if h not in values[b.name])
+        if missing:
+            groups[missing].append(i)
+    pending = sum(len(idx) for idx in groups.values())
+    detail = ", ".join(f"{len(idx)} missing {'/'.join(m)}" for m, idx in groups.items())
+    print(f"🗄️ {n - pending} of {n} cells fully cached; fetching {pending}" + (f" ({detail})" if detail else ""))
+    if progress:
+        progress(n - pending)
+
+    failed = 0
+    for missing, idx in groups.items():
+        # One layer (request) per reduction scale; only band values and our cell index come back
+        by_scale = defaultdict(list)
+        for b in bands:
+            if b.name in missing:
+                by_scale[reduce_scale[b.name]].append(b)
+        layers = []
+        for scale, group in sorted(by_scale.items()):
+            layer = multiband_layer(f"cells@{scale}", group, ee_module=ee_module, keep_geometry=False, scale=scale)
+            layer.properties = layer.properties + [CELL_PROPERTY]
+            layers.append(layer)
+        subset = [
+            {"type": "Feature", "id": str(i), "geometry": local[i]["geometry"], "properties": {CELL_PROPERTY: i}}
+            for i in idx
+        ]
+        for batch in extract(_LocalFeatures(subset, ee_module), len(subset), layers,
+                             ee_module=ee_module, **extract_kwargs):
+            if progress:
+                progress(batch.end - batch.start)
+            if not batch.ok:
+                print(f"❌ {batch.end - batch.start} cells not fetched: {batch.error}")
+                failed += batch.end - batch.start
+                continue
+            rows = []
+            for cell in batch.cells():
+                props = cell["properties"]
+                h = hashes[int(props[CELL_PROPERTY])]
+                for name in missing:
+                    values[name][h] = props.get(name)
+                    rows.append((h, keys[name], props.get(name)))
+            cache.put_many(rows)
+
+    cells = [
+        {
+            "id": local[i].get("id"),
+            "geometry": local[i]["geometry"],
+            "properties": {b.name: values[b.name].get(h, math.nan) for b in bands},
+        }
+        for i, h in enumerate(hashes)
+    ]
+    return cells, failed
+
+
+if __name__ == "__main__":
+    cache = ReductionCache(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH)
+    for band, count, last in cache.summary():
+        print(f"{count:>8} cells  {band}  (last fetched {time.strftime('%Y-%m-%d %H:%M', time.localtime(last))})")
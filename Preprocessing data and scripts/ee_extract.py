@@ -0,0 +1,305 @@
+"""Concurrent Earth Engine extraction shared by the preprocessing scripts.
+
+The scripts used to loop over the grid 25 cells at a time and, for each
+batch, call `reduceRegions(...).getInfo()` once per layer, one after the
+other. `extract()` issues those calls from a bounded thread pool instead:
+
+- every (batch, layer) pair is its own task, so layers and batches overlap;
+- a shared token bucket caps requests per second to stay inside EE quotas;
+- the batch size adapts: it grows while batches come back quickly and
+  halves when a request fails (EE "computation timed out"/"too many
+  concurrent" errors are usually caused by oversized batches);
+- failed layer requests are retried with backoff, and a batch that still
+  fails is reported (not silently dropped) so callers can record it.
+
+Results are yielded in grid order, so callers can append rows and keep a
+simple "everything before index i is done" cursor.
+
+Rather than one request per dataset, `multiband_layer()` stacks several
+images into one multi-band image with a combined reducer, so each batch is
+a single `reduceRegions` call and each cell's geometry comes back once.
+The stack is reduced at its finest band's scale, so stacking a 10 m band
+with a 7 km one would evaluate the coarse band on the 10 m grid (far more
+pixels per request, and EE timeouts). `scale_layers()` therefore stacks
+only bands of similar scale, one layer (one request per batch) per group:
+
+    layers = scale_layers("cells", [
+        Band("landcover", dw_img, ee.Reducer.mode(), scale=30),
+        Band("lighting", viirs_img, ee.Reducer.mean(), scale=500),
+        Band("lst", lst_day, ee.Reducer.mean(), scale=1000),
+    ], ee_module=ee)
+    for batch in extract(features, n, layers):
+        if batch.ok:
+            for cell in batch.cells():
+                cell["properties"]["landcover"], cell["properties"]["lighting"], ...
+
+`fake_ee.py` is a local stand-in for the `ee` module for trying this out
+without Earth Engine credentials.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Bands whose scales differ by more than this factor are reduced in separate layers
+MAX_SCALE_RATIO = 4
+
+
+class Layer:
+    """One image reduced over the grid: `image.reduceRegions(batch, reducer, scale)`.
+
+    With `properties` set, only those properties come back and the geometry
+    is dropped server-side; results are then joined on the feature id.
+    """
+
+    def __init__(self, name, image, reducer, scale, properties=None):
+        self.name = name
+        self.image = image
+        self.reducer = reducer
+        self.scale = scale
+        self.properties = properties
+
+    def reduce(self, collection):
+        reduced = self.image.reduceRegions(collection=collection, reducer=self.reducer, scale=self.scale)
+        if self.properties is not None:
+            reduced = reduced.select(self.properties, None, False)
+        return reduced
+
+
+class Band:
+    """One dataset inside a multi-band layer, reduced at its own native scale.
+
+    `key` describes what the image is, e.g. {"dataset": ..., "band": ...,
+    "composite": "mean", "reducer": "mean", "dates": (start, end)}, since
+    an ee.Image cannot be inspected locally; ee_cache.py needs it to cache
+    the band's results.
+    """
+
+    def __init__(self, name, image, reducer, scale, key=None):
+        self.name = name
+        self.image = image
+        self.reducer = reducer
+        self.scale = scale
+        self.key = key
+
+
+def multiband_layer(name, bands, ee_module=None, crs="EPSG:4326", keep_geometry=True, scale=None):
+    """Stack `bands` into one image reduced by one combined reducer.
+
+    Each band is reprojected to its own scale before stacking, and the stack
+    is reduced at the finest of them (or at `scale`), so a coarser band is
+    averaged over the pixels of its native grid that cover the cell. Every
+    band is evaluated at that scale, though: stack bands of similar scale
+    (see scale_layers). The combined reducer does not share inputs: its i-th
+    reducer sees only the i-th band and writes a property named after it.
+    """
+    if ee_module is None:
+        import ee as ee_module
+
+    image = ee_module.Image.cat([
+        b.image.reproject(crs=crs, scale=b.scale).rename(b.name) for b in bands
+    ])
+    reducer = bands[0].reducer.setOutputs([bands[0].name])
+    for b in bands[1:]:
+        reducer = reducer.combine(b.reducer.setOutputs([b.name]), sharedInputs=False)
+    if scale is None:
+        scale = min(b.scale for b in bands)
+    properties = None if keep_geometry else [b.name for b in bands]
+    return Layer(name, image, reducer, scale, properties=properties)
+
+
+def scale_groups(bands, max_ratio=MAX_SCALE_RATIO):
+    """`bands` split by scale, finest first; each group is within `max_ratio` of its finest band."""
+    groups = []
+    for b in sorted(bands, key=lambda b: b.scale):
+        if groups and b.scale <= groups[-1][0].scale * max_ratio:
+            groups[-1].append(b)
+        else:
+            groups.append([b])
+    return groups
+
+
+def scale_layers(name, bands, ee_module=None, keep_geometry=True, max_ratio=MAX_SCALE_RATIO):
+    """One multiband_layer per scale group, named "<name>@<scale>".
+
+    Only the first layer returns geometry; BatchResult.cells() joins the
+    others on the feature id.
+    """
+    return [
+        multiband_layer(f"{name}@{group[0].scale}", group, ee_module=ee_module,
+                        keep_geometry=keep_geometry and i == 0)
+        for i, group in enumerate(scale_groups(bands, max_ratio))
+    ]
+
+
+class BatchResult:
+    """Features per layer for grid cells [start, end), or the error that stopped them."""
+
+    def __init__(self, start, end, features=None, error=None):
+        self.start = start
+        self.end = end
+        self.features = features or {}
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def cells(self):
+        """Per-cell dicts with the properties of every layer, joined on feature id.
+
+        Order follows the first layer. Features are matched by id, never by
+        position, so a layer returning cells in a different order (or
+        dropping one) cannot shift values onto the wrong cell.
+        """
+        names = list(self.features)
+        if not names:
+            return []
+        merged = {}
+        order = []
+        for name in names:
+            for f in self.features[name]:
+                cell = merged.get(f.get("id"))
+                if cell is None:
+                    if name != names[0]:
+                        continue
+                    cell = merged[f.get("id")] = {"id": f.get("id"), "geometry": f.get("geometry"), "properties": {}}
+                    order.append(cell)
+                elif cell["geometry"] is None:
+                    cell["geometry"] = f.get("geometry")
+                cell["properties"].update(f.get("properties") or {})
+        return order
+
+    def __repr__(self):
+        state = "ok" if self.ok else f"failed: {self.error}"
+        return f"BatchResult({self.start}-{self.end}, {state})"
+
+
+class RateLimiter:
+    """Token bucket shared by all worker threads."""
+
+    def __init__(self, per_second, burst=None):
+        self.per_second = per_second
+        self.capacity = burst or max(1.0, per_second)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.per_second:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_second)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.per_second
+            time.sleep(delay)
+
+
+class AdaptiveBatchSize:
+    """Grow the batch while requests finish under `target_seconds`; halve on failure."""
+
+    def __init__(self, size, min_size, max_size, target_seconds):
+        self.size = size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_seconds = target_seconds
+        self._lock = threading.Lock()
+
+    def succeeded(self, seconds):
+        with self._lock:
+            if seconds < self.target_seconds / 2:
+                self.size = min(self.max_size, int(self.size * 1.5) or 1)
+            elif seconds > self.target_seconds:
+                self.size = max(self.min_size, self.size * 3 // 4)
+
+    def failed(self):
+        with self._lock:
+            self.size = max(self.min_size, self.size // 2)
+
+
+def _reduce_layer(ee_module, features, start, end, layer, limiter):
+    limiter.acquire()
+    began = time.perf_counter()
+    batch = ee_module.FeatureCollection(features.slice(start, end))
+    info = layer.reduce(batch).getInfo()
+    return info["features"], time.perf_counter() - began
+
+
+def extract(features, n, layers, start=0, batch_size=25, max_workers=8,
+            requests_per_second=10.0, max_retries=3, retry_wait=30.0,
+            min_batch_size=5, max_batch_size=200, target_seconds=20.0,
+            ee_module=None):
+    """Reduce `layers` over features[start:n] concurrently; yield BatchResults in order.
+
+    `features` is an `ee.List` of grid features (as from `grid.toList(...)`).
+    `retry_wait` is the base backoff; attempt k waits k * retry_wait seconds.
+    """
+    if ee_module is None:
+        import ee as ee_module
+
+    limiter = RateLimiter(requests_per_second)
+    sizer = AdaptiveBatchSize(batch_size, min_batch_size, max_batch_size, target_seconds)
+
+    batches = {}        # start -> {"end", "features", "pending", "error"}
+    retries = deque()   # (not_before, start, layer_index, attempt)
+    running = {}        # future -> (start, layer_index, attempt)
+    next_start = start
+    emit_start = start
+
+    def submit(pool, lo, li, attempt):
+        hi = batches[lo]["end"]
+        fut = pool.submit(_reduce_layer, ee_module, features, lo, hi, layers[li], limiter)
+        running[fut] = (lo, li, attempt)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while True:
+            now = time.monotonic()
+            # Retries whose backoff has elapsed go first, then new batches
+            while len(running) < max_workers and retries and retries[0][0] <= now:
+                _, lo, li, attempt = retries.popleft()
+                submit(pool, lo, li, attempt)
+            # Bound the look-ahead so a slow head-of-line batch cannot pile up results
+            while len(running) < max_workers and next_start < n and len(batches) < 4 * max_workers:
+                lo, hi = next_start, min(n, next_start + sizer.size)
+                next_start = hi
+                batches[lo] = {"end": hi, "features": {}, "pending": len(layers), "error": None}
+                for li in range(len(layers)):
+                    submit(pool, lo, li, 0)
+
+            if not running and not retries:
+                break
+            timeout = max(0.0, retries[0][0] - now) if retries else None
+            if not running:
+                time.sleep(timeout)
+                continue
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for fut in done:
+                lo, li, attempt = running.pop(fut)
+                state = batches[lo]
+                try:
+                    feats, seconds = fut.result()
+                except Exception as e:
+                    sizer.failed()
+                    if attempt + 1 < max_retries:
+                        retries.append((time.monotonic() + retry_wait * (attempt + 1), lo, li, attempt + 1))
+                        continue
+                    state["error"] = e
+                else:
+                    sizer.succeeded(seconds)
+                    state["features"][layers[li].name] = feats
+                state["pending"] -= 1
+
+            retries = deque(sorted(retries))
+
+            # Emit finished batches in grid order
+            while emit_start in batches and batches[emit_start]["pending"] == 0:
+                state = batches.pop(emit_start)
+                yield BatchResult(emit_start, state["end"], state["features"] if state["error"] is None else None,
+                                  state["error"])
+                emit_start = state["end"]
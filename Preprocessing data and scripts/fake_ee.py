@@ -0,0 +1,319 @@
+"""Local stand-in for the parts of the `ee` client the preprocessing scripts use.
+
+It returns synthetic but deterministic values for each grid cell (derived
+from the cell's centroid) after a configurable delay, so the extraction
+engine can be exercised without Earth Engine credentials or quota:
+
+    import fake_ee as ee
+    ee.configure(latency=0.5, failure_rate=0.05)
+    grid = ee.fishnet(ee.Geometry.BBox(76.8, 28.4, 77.4, 28.9), rows=80, cols=80)
+
+Run it directly to time `ee_extract.extract` over a synthetic grid:
+
+    python fake_ee.py --rows 100 --cols 100 --latency 0.3 --workers 8
+"""
+import argparse
+import math
+import random
+import sys
+import threading
+import time
+
+_config = {"latency": 0.0, "jitter": 0.0, "failure_rate": 0.0, "per_feature": 0.0}
+_stats = {"requests": 0, "failures": 0}
+_stats_lock = threading.Lock()
+
+
+def configure(latency=0.0, jitter=0.0, failure_rate=0.0, per_feature=0.0):
+    """Set the simulated round-trip (seconds), its random jitter, the chance a
+    request raises, and extra seconds per feature in the batch."""
+    _config.update(latency=latency, jitter=jitter, failure_rate=failure_rate, per_feature=per_feature)
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def Authenticate():
+    pass
+
+
+def Initialize(project=None):
+    pass
+
+
+class EEException(Exception):
+    pass
+
+
+class _Value:
+    def __init__(self, value):
+        self._value = value
+
+    def getInfo(self):
+        return self._value
+
+
+class Geometry:
+    def __init__(self, geojson):
+        self.geojson = geojson
+
+    @staticmethod
+    def BBox(west, south, east, north):
+        return Geometry({
+            "type": "Polygon",
+            "coordinates": [[[west, south], [east, south], [east, north], [west, north], [west, south]]],
+        })
+
+    def bounds(self):
+        return self
+
+    def getInfo(self):
+        return self.geojson
+
+
+class List:
+    def __init__(self, items):
+        self._items = list(items)
+
+    def slice(self, start, end=None):
+        return List(self._items[start:end])
+
+    def size(self):
+        return _Value(len(self._items))
+
+    def getInfo(self):
+        return list(self._items)
+
+
+def Feature(geojson):
+    """GeoJSON Feature dict -> feature (the real client wraps it server-side)."""
+    return dict(geojson)
+
+
+class FeatureCollection:
+    def __init__(self, features):
+        if isinstance(features, List):
+            features = features.getInfo()
+        elif isinstance(features, FeatureCollection):
+            features = features.features
+        self.features = list(features)
+
+    def size(self):
+        return _Value(len(self.features))
+
+    def toList(self, count=None):
+        return List(self.features[:count.getInfo() if isinstance(count, _Value) else count])
+
+    def filterBounds(self, geometry):
+        return self
+
+    def getInfo(self):
+        return {"type": "FeatureCollection", "features": self.features}
+
+
+def fishnet(bbox, rows, cols):
+    """Axis-aligned rows x cols grid over `bbox` (same cell layout as geemap.fishnet)."""
+    ring = bbox.geojson["coordinates"][0]
+    west, south = ring[0]
+    east, north = ring[2]
+    dx = (east - west) / cols
+    dy = (north - south) / rows
+    features = []
+    for r in range(rows):
+        for c in range(cols):
+            x0, y0 = west + c * dx, south + r * dy
+            x1, y1 = x0 + dx, y0 + dy
+            features.append({
+                "type": "Feature",
+                "geometry": {
+                    "geodesic": False,
+                    "type": "Polygon",
+                    "coordinates": [[[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]],
+                },
+                "id": str(len(features)),
+                "properties": {},
+            })
+    return FeatureCollection(features)
+
+
+class _Reducer:
+    def __init__(self, outputs):
+        self.outputs = outputs
+
+    def setOutputs(self, outputs):
+        return _Reducer(list(outputs))
+
+    def combine(self, reducer2, outputPrefix="", sharedInputs=False):
+        return _Reducer(self.outputs + [outputPrefix + o for o in reducer2.outputs])
+
+
+class Reducer:
+    @staticmethod
+    def mode():
+        return _Reducer(["mode"])
+
+    @staticmethod
+    def mean():
+        return _Reducer(["mean"])
+
+    @staticmethod
+    def median():
+        return _Reducer(["median"])
+
+
+def _centroid(geometry):
+    ring = geometry["coordinates"][0]
+    if geometry["type"] == "MultiPolygon":
+        ring = ring[0]
+    xs = [p[0] for p in ring]
+    ys = [p[1] for p in ring]
+    return sum(xs) / len(xs), sum(ys) / len(ys)
+
+
+# Synthetic value per band name, from a smooth function of the centroid
+_BANDS = {
+    "label": lambda u: float(int(u * 9) % 9),
+    "avg_rad": lambda u: 60.0 * u,
+    "LST_Day_1km": lambda u: 25.0 + 20.0 * u,
+    "tropospheric_NO2_column_number_density": lambda u: 5e-5 + 1.5e-4 * u,
+}
+
+
+def _synthetic(band, x, y):
+    u = (math.sin(x * 37.1 + y * 11.3) + 1) / 2
+    return _BANDS.get(band, lambda v: v)(u)
+
+
+class Image:
+    def __init__(self, band, name=None, parts=None):
+        self.band = band
+        self.name = name or band
+        # Multi-band images (Image.cat) keep their single-band parts in order
+        self.parts = parts or [self]
+
+    @staticmethod
+    def cat(images):
+        return Image(None, parts=[p for img in images for p in img.parts])
+
+    # Chainable no-ops standing in for ee.Image / ee.ImageCollection methods
+    def filterDate(self, *args):
+        return self
+
+    def select(self, band):
+        return Image(band)
+
+    def rename(self, name):
+        return Image(self.band, name=name)
+
+    def mode(self):
+        return self
+
+    mean = median = mode
+
+    def multiply(self, value):
+        return self
+
+    subtract = clip = multiply
+
+    def reproject(self, crs=None, scale=None):
+        return self
+
+    def reduceRegions(self, collection, reducer, scale):
+        return _Reduced(self, collection, reducer)
+
+
+def ImageCollection(asset_id):
+    return Image(asset_id)
+
+
+class _Reduced:
+    def __init__(self, image, collection, reducer, properties=None, retain_geometry=True):
+        self.image = image
+        self.collection = collection
+        self.reducer = reducer
+        self.properties = properties
+        self.retain_geometry = retain_geometry
+
+    def select(self, propertySelectors, newProperties=None, retainGeometry=True):
+        return _Reduced(self.image, self.collection, self.reducer, propertySelectors, retainGeometry)
+
+    def getInfo(self):
+        features = self.collection.features
+        delay = _config["latency"] + random.uniform(0, _config["jitter"]) + _config["per_feature"] * len(features)
+        time.sleep(delay)
+        with _stats_lock:
+            _stats["requests"] += 1
+            if random.random() < _config["failure_rate"]:
+                _stats["failures"] += 1
+                raise EEException("Computation timed out.")
+        parts = self.image.parts
+        out = []
+        for f in features:
+            x, y = _centroid(f["geometry"])
+            props = dict(f.get("properties", {}))
+            if len(parts) == 1:
+                # Single band: every reducer output gets the band's value
+                for name in self.reducer.outputs:
+                    props[name] = _synthetic(parts[0].band, x, y)
+            else:
+                # Non-shared combined reducer: i-th output reduces i-th band
+                for name, part in zip(self.reducer.outputs, parts):
+                    props[name] = _synthetic(part.band, x, y)
+            if self.properties is not None:
+                props = {k: v for k, v in props.items() if k in self.properties}
+            geometry = f["geometry"] if self.retain_geometry else None
+            out.append({"type": "Feature", "geometry": geometry, "id": f.get("id"), "properties": props})
+        return {"type": "FeatureCollection", "features": out}
+
+
+def main():
+    from ee_extract import Band, Layer, extract, multiband_layer
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--cols", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=25)
+    parser.add_argument("--per-layer", action="store_true",
+                        help="one reduceRegions call per dataset instead of one multi-band call")
+    parser.add_argument("--rps", type=float, default=0, help="requests per second cap (0 = none)")
+    args = parser.parse_args()
+
+    configure(latency=args.latency, failure_rate=args.failure_rate)
+    ee = sys.modules[__name__]
+    grid = fishnet(Geometry.BBox(70.0, 27.5, 78.0, 32.5), rows=args.rows, cols=args.cols)
+    features = grid.toList(grid.size())
+    n = features.size().getInfo()
+    bands = [
+        Band("landcover", ImageCollection("GOOGLE/DYNAMICWORLD/V1").select("label").mode(), Reducer.mode(), 30),
+        Band("lighting", ImageCollection("NOAA/VIIRS").select("avg_rad").median(), Reducer.mean(), 500),
+        Band("lst", ImageCollection("MODIS/061/MOD11A2").select("LST_Day_1km").mean(), Reducer.mean(), 1000),
+        Band("no2", ImageCollection("S5P").select("tropospheric_NO2_column_number_density").mean(),
+             Reducer.mean(), 1000),
+    ]
+    if args.per_layer:
+        layers = [Layer(b.name, b.image, b.reducer, b.scale) for b in bands]
+    else:
+        layers = [multiband_layer("cells", bands, ee_module=ee)]
+
+    start = time.perf_counter()
+    cells = failed = 0
+    for batch in extract(features, n, layers, batch_size=args.batch_size, max_workers=args.workers,
+                         requests_per_second=args.rps, retry_wait=0.1, ee_module=ee):
+        if batch.ok:
+            cells += batch.end - batch.start
+        else:
+            failed += batch.end - batch.start
+    took = time.perf_counter() - start
+    serial = (n / args.batch_size) * len(bands) * args.latency
+    print(f"{n} cells, {len(layers)} request(s) per batch: {took:.1f}s with {args.workers} workers "
+          f"(serial per-layer estimate {serial:.1f}s); {stats()['requests']} requests, "
+          f"{cells} ok, {failed} failed")
+
+
+if __name__ == "__main__":
+    main()
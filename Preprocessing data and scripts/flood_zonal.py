@@ -0,0 +1,84 @@
+"""Fraction of flooded pixels per grid cell (zonal statistics).
+
+Takes the water mask written by newst_log.py (uint8 GeoTIFF, 1 = newly wet)
+and a grid dataset, burns the grid cell ids into the mask's pixel grid with
+`rasterio.features.rasterize`, and counts pixels per cell with
+`np.bincount` -- one vectorized pass per raster block, no per-cell loop:
+
+    flood_fraction = flooded pixels in the cell / mask pixels in the cell
+
+Cells the mask does not cover get NaN (unknown), not 0. The column is added
+to the grid CSV (and its GeoParquet copy) in place, ready for bulk_load.py:
+
+    python flood_zonal.py delhi_grid_landcover_lighting_uhi_no2.csv [sentinel_data/water_mask.tif]
+"""
+import json
+import sys
+
+import numpy as np
+import rasterio
+from rasterio.features import rasterize
+from rasterio.warp import transform_geom
+from rasterio.windows import Window, bounds as window_bounds
+
+from grid_io import geometry_bounds, load_grid, save_grid
+
+BLOCK_SIZE = 4096  # pixels per side of each processing block
+
+
+def _blocks(width, height, size):
+    for row in range(0, height, size):
+        for col in range(0, width, size):
+            yield Window(col, row, min(size, width - col), min(size, height - row))
+
+
+def flood_fraction(geometries, mask_path, block_size=BLOCK_SIZE):
+    """Flooded-pixel fraction for each GeoJSON geometry (lon/lat), NaN where uncovered."""
+    n = len(geometries)
+    flooded = np.zeros(n + 1)
+    total = np.zeros(n + 1)
+
+    with rasterio.open(mask_path) as src:
+        if src.crs and src.crs.to_epsg() != 4326:
+            geometries = [None if g is None else transform_geom("EPSG:4326", src.crs, g) for g in geometries]
+        xmin, ymin, xmax, ymax = geometry_bounds(geometries)
+
+        for block in _blocks(src.width, src.height, block_size):
+            left, bottom, right, top = window_bounds(block, src.transform)
+            # Only cells whose bbox overlaps this block are burned in
+            hit = np.nonzero((xmax > left) & (xmin < right) & (ymax > bottom) & (ymin < top))[0]
+            if not len(hit):
+                continue
+            # Label 0 = no cell; cell i gets label i + 1
+            labels = rasterize(
+                ((geometries[i], i + 1) for i in hit),
+                out_shape=(int(block.height), int(block.width)),
+                transform=src.window_transform(block),
+                fill=0,
+                dtype="int32",
+            )
+            water = src.read(1, window=block)
+            # Pixels without radar data (mask nodata) count as neither wet nor dry
+            valid = water != src.nodata if src.nodata is not None else np.ones(water.shape, dtype=bool)
+            labels = labels[valid]
+            total += np.bincount(labels, minlength=n + 1)
+            flooded += np.bincount(labels, weights=(water[valid] == 1).astype("f8"), minlength=n + 1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(total[1:] > 0, flooded[1:] / total[1:], np.nan)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("usage: python flood_zonal.py <grid.csv> [water_mask.tif]")
+    grid_path = sys.argv[1]
+    mask_path = sys.argv[2] if len(sys.argv) > 2 else "sentinel_data/water_mask.tif"
+
+    df = load_grid(grid_path)
+    geometries = [json.loads(g) if isinstance(g, str) else None for g in df["geometry"]]
+    df["flood_fraction"] = flood_fraction(geometries, mask_path)
+    covered = df["flood_fraction"].notna()
+    print(f"💧 {covered.sum()} of {len(df)} cells covered by {mask_path}; "
+          f"{(df.loc[covered, 'flood_fraction'] > 0).sum()} with any flooding")
+    save_grid(df, grid_path)
+    print(f"✅ Saved flood_fraction to {grid_path}")
@@ -0,0 +1,240 @@
+"""Parquet (GeoParquet) storage for the grid datasets.
+
+The extraction scripts write CSVs with each cell polygon as a JSON string,
+which every consumer re-parses row by row. `save_grid()` still writes that
+CSV, and next to it a GeoParquet file with the same rows:
+
+- numeric columns as float64, so the file round-trips the CSV values
+  exactly and scripts can rewrite a grid read from it (`landcover_class`
+  as int16);
+- `landcover_name` dictionary-encoded;
+- `geometry` as WKB, plus a `bbox` struct column (xmin, ymin, xmax, ymax),
+  declared as the GeoParquet bbox covering, so rectangular grid cells can
+  be used without decoding any geometry.
+
+`read_grid()` memory-maps the file and reads only the requested columns.
+`load_grid()` takes a CSV path and uses the .parquet next to it when it is
+at least as new, so callers keep working when only the CSV exists.
+
+pyarrow is optional; without it only the CSVs are written and read.
+
+    python grid_io.py convert delhi_grid_landcover_lighting_uhi_no2.csv ...
+"""
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: CSV only
+    pa = pq = None
+
+# pandas' default float parser can be off by one ulp; this reads back exactly what to_csv wrote
+CSV_FLOAT_PRECISION = "round_trip"
+
+DICTIONARY_COLUMNS = ("landcover_name",)
+INTEGER_COLUMNS = ("landcover_class",)
+GEOMETRY_COLUMN = "geometry"
+BBOX_FIELDS = ("xmin", "ymin", "xmax", "ymax")
+
+_WKB_POLYGON = 3
+_WKB_MULTIPOLYGON = 6
+
+
+def parquet_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+# ---------------------------
+# WKB <-> GeoJSON (Polygon / MultiPolygon only, which is all the grids hold)
+# ---------------------------
+def _polygon_wkb(rings):
+    out = [struct.pack("<BII", 1, _WKB_POLYGON, len(rings))]
+    for ring in rings:
+        out.append(struct.pack("<I", len(ring)))
+        out.append(np.asarray(ring, dtype="<f8")[:, :2].tobytes())
+    return b"".join(out)
+
+
+def to_wkb(geom):
+    if geom is None:
+        return None
+    if geom["type"] == "Polygon":
+        return _polygon_wkb(geom["coordinates"])
+    if geom["type"] == "MultiPolygon":
+        parts = [_polygon_wkb(p) for p in geom["coordinates"]]
+        return struct.pack("<BII", 1, _WKB_MULTIPOLYGON, len(parts)) + b"".join(parts)
+    raise ValueError(f"unsupported geometry type {geom['type']!r}")
+
+
+def _read_polygon(buf, offset):
+    order, kind, nrings = struct.unpack_from("<BII", buf, offset)
+    if order != 1 or kind != _WKB_POLYGON:
+        raise ValueError("expected a little-endian WKB polygon")
+    offset += 9
+    rings = []
+    for _ in range(nrings):
+        (npoints,) = struct.unpack_from("<I", buf, offset)
+        offset += 4
+        coords = np.frombuffer(buf, dtype="<f8", count=npoints * 2, offset=offset).reshape(npoints, 2)
+        rings.append(coords.tolist())
+        offset += npoints * 16
+    return rings, offset
+
+
+def from_wkb(buf):
+    if buf is None:
+        return None
+    order, kind = struct.unpack_from("<BI", buf, 0)
+    if kind == _WKB_POLYGON:
+        rings, _ = _read_polygon(buf, 0)
+        return {"type": "Polygon", "coordinates": rings}
+    if kind == _WKB_MULTIPOLYGON:
+        (count,) = struct.unpack_from("<I", buf, 5)
+        offset = 9
+        polygons = []
+        for _ in range(count):
+            rings, offset = _read_polygon(buf, offset)
+            polygons.append(rings)
+        return {"type": "MultiPolygon", "coordinates": polygons}
+    raise ValueError(f"unsupported WKB geometry type {kind}")
+
+
+def _bounds(geom):
+    if geom is None:
+        return (None,) * 4
+    rings = geom["coordinates"] if geom["type"] == "Polygon" else [r for p in geom["coordinates"] for r in p]
+    points = np.asarray([pt[:2] for ring in rings for pt in ring], dtype="f8")
+    xmin, ymin = points.min(axis=0)
+    xmax, ymax = points.max(axis=0)
+    return float(xmin), float(ymin), float(xmax), float(ymax)
+
+
+def _parse_geometry(value):
+    if isinstance(value, str):
+        return json.loads(value)
+    if isinstance(value, dict):
+        return value
+    return None  # NaN / missing
+
+
+def geometry_bounds(values):
+    """(xmin, ymin, xmax, ymax) float64 arrays for a column of GeoJSON strings/dicts."""
+    bounds = np.array([_bounds(_parse_geometry(v)) for v in values], dtype="f8").reshape(-1, 4)
+    return tuple(bounds.T)
+
+
+# ---------------------------
+# Writing
+# ---------------------------
+def to_table(df):
+    """DataFrame (CSV schema, geometry as GeoJSON string or dict) -> pyarrow Table."""
+    names, arrays = [], []
+    for col in df.columns:
+        if col == GEOMETRY_COLUMN:
+            continue
+        values = df[col]
+        if col in DICTIONARY_COLUMNS:
+            arr = pa.array(values.astype(object).where(values.notna(), None), type=pa.string()).dictionary_encode()
+        elif col in INTEGER_COLUMNS:
+            arr = pa.array(values, type=pa.int16(), from_pandas=True)
+        elif pd.api.types.is_numeric_dtype(values):
+            arr = pa.array(values.to_numpy(dtype="float64"), from_pandas=True)
+        else:
+            arr = pa.array(values, from_pandas=True)
+        names.append(col)
+        arrays.append(arr)
+
+    metadata = None
+    if GEOMETRY_COLUMN in df.columns:
+        geoms = [_parse_geometry(v) for v in df[GEOMETRY_COLUMN]]
+        bounds = list(zip(*(_bounds(g) for g in geoms))) if geoms else [[]] * 4
+        bbox = pa.StructArray.from_arrays([pa.array(b, type=pa.float64()) for b in bounds], names=list(BBOX_FIELDS))
+        names += [GEOMETRY_COLUMN, "bbox"]
+        arrays += [pa.array([to_wkb(g) for g in geoms], type=pa.binary()), bbox]
+
+        present = [b for b in zip(*bounds) if b[0] is not None]
+        geo = {
+            "version": "1.1.0",
+            "primary_column": GEOMETRY_COLUMN,
+            "columns": {GEOMETRY_COLUMN: {
+                # No "crs" key: GeoParquet then means OGC:CRS84 (lon/lat), as in the CSVs
+                "encoding": "WKB",
+                "geometry_types": sorted({g["type"] for g in geoms if g is not None}),
+                "bbox": [min(b[0] for b in present), min(b[1] for b in present),
+                         max(b[2] for b in present), max(b[3] for b in present)] if present else [],
+                "covering": {"bbox": {f: ["bbox", f] for f in BBOX_FIELDS}},
+            }},
+        }
+        metadata = {b"geo": json.dumps(geo).encode("utf-8")}
+
+    table = pa.Table.from_arrays(arrays, names=names)
+    return table.replace_schema_metadata(metadata) if metadata else table
+
+
+def write_grid(df, path, compression="zstd"):
+    tmp = f"{path}.tmp"
+    pq.write_table(to_table(df), tmp, compression=compression)
+    os.replace(tmp, path)
+
+
+def save_grid(df, csv_path):
+    """Write `df` as `csv_path` and, if pyarrow is installed, as GeoParquet next to it."""
+    df.to_csv(csv_path, index=False)
+    if pq is not None:
+        write_grid(df, parquet_path(csv_path))
+
+
+def csv_to_parquet(csv_path):
+    path = parquet_path(csv_path)
+    write_grid(pd.read_csv(csv_path, float_precision=CSV_FLOAT_PRECISION), path)
+    return path
+
+
+# ---------------------------
+# Reading
+# ---------------------------
+def read_grid(path, columns=None):
+    """Memory-mapped pyarrow Table with only `columns` (all by default)."""
+    return pq.read_table(path, columns=columns, memory_map=True)
+
+
+def bbox_arrays(table):
+    """(xmin, ymin, xmax, ymax) float64 arrays from the bbox covering column."""
+    bbox = table.column("bbox").combine_chunks()
+    return tuple(bbox.field(f).to_numpy(zero_copy_only=False) for f in BBOX_FIELDS)
+
+
+def to_frame(table, geometry="json"):
+    """Table -> DataFrame. `geometry` is "json" (GeoJSON strings, as in the CSVs),
+    "dict", or "wkb" (raw bytes, no decoding)."""
+    df = table.drop_columns([c for c in ("bbox",) if c in table.column_names]).to_pandas()
+    if GEOMETRY_COLUMN in df.columns and geometry != "wkb":
+        geoms = [from_wkb(b) for b in df[GEOMETRY_COLUMN]]
+        df[GEOMETRY_COLUMN] = geoms if geometry == "dict" else [None if g is None else json.dumps(g) for g in geoms]
+    if "landcover_name" in df.columns:
+        df["landcover_name"] = df["landcover_name"].astype(object)
+    return df
+
+
+def load_grid(csv_path, columns=None, geometry="json"):
+    """DataFrame for a grid CSV, read from its .parquet sibling when that is current."""
+    path = parquet_path(csv_path)
+    if pq is not None and os.path.exists(path) and (
+            not os.path.exists(csv_path) or os.path.getmtime(path) >= os.path.getmtime(csv_path)):
+        return to_frame(read_grid(path, columns), geometry=geometry)
+    return pd.read_csv(csv_path, usecols=columns, float_precision=CSV_FLOAT_PRECISION)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "convert":
+        sys.exit("usage: python grid_io.py convert <grid.csv> [...]")
+    if pq is None:
+        sys.exit("pyarrow is not installed")
+    for csv_file in sys.argv[2:]:
+        print(f"✅ {csv_file} -> {csv_to_parquet(csv_file)}")
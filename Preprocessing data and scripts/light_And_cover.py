@@ -2,8 +2,13 @@ import ee
 import geemap
 import pandas as pd
 import json
+import sys
 from tqdm import tqdm
 
+from ee_cache import ReductionCache, cached_extract
+from ee_extract import Band
+from grid_io import save_grid
+
 # Initialize
 ee.Authenticate()
 ee.Initialize(project='gae-lab-demo')
@@ -14,19 +19,22 @@ delhi_bbox = ee.Geometry.BBox(76.8, 28.4, 77.4, 28.9)
 # Create grid (e.g., 80x80)
 grid = geemap.fishnet(delhi_bbox, rows=80, cols=80)
 
+# 2023 composites; the dates are also part of the cache keys
+DATES = ("2023-01-01", "2023-12-31")
+
 # Dynamic World land cover (2023 median)
-dw = ee.ImageCollection("GOOGLE/DYNAMICWORLD/V1").filterDate("2023-01-01", "2023-12-31")
+dw = ee.ImageCollection("GOOGLE/DYNAMICWORLD/V1").filterDate(*DATES)
 dw_img = dw.select("label").mode()
 
 # VIIRS Day/Night Band nighttime lights (2023 median)
-viirs = ee.ImageCollection("NOAA/VIIRS/DNB/MONTHLY_V1/VCMCFG").filterDate("2023-01-01", "2023-12-31")
+viirs = ee.ImageCollection("NOAA/VIIRS/DNB/MONTHLY_V1/VCMCFG").filterDate(*DATES)
 viirs_img = viirs.select("avg_rad").median()  # average radiance
 
 # Convert grid to a list of features
 features = grid.toList(grid.size())
 n = features.size().getInfo()
 
-batch_size = 25  # smaller = more progress updates, slower total
+batch_size = 25  # starting size; extract() adapts it to how fast EE responds
 # Add human-readable labels
 labels = {
     0: "Water", 1: "Trees", 2: "Grass", 3: "Flooded vegetation",
@@ -35,41 +43,41 @@ labels = {
 
 results = []
 
-for i in tqdm(range(0, n, batch_size), desc="Processing grid cells"):
-    batch = ee.FeatureCollection(features.slice(i, min(i + batch_size, n)))
-
-    # Compute landcover for this batch
-    landcover = dw_img.reduceRegions(
-        collection=batch,
-        reducer=ee.Reducer.mode(),
-        scale=30,
-    )
-
-    # Compute mean nighttime lighting for this batch
-    lighting = viirs_img.reduceRegions(
-        collection=batch,
-        reducer=ee.Reducer.mean(),
-        scale=500,
-    )
-
-    landcover_info = landcover.getInfo()
-    lighting_info = lighting.getInfo()
-
-    for f_lc, f_light in zip(landcover_info["features"], lighting_info["features"]):
-        # Round landcover class to nearest integer
-        lc_class = round(f_lc["properties"].get("mode", -1))
-        lc_name = labels.get(lc_class, "Unknown")
-
-        results.append({
-            "landcover_class": lc_class,
-            "landcover_name": lc_name,
-            "lighting_radiance": f_light["properties"].get("mean"),
-            "geometry": json.dumps(f_lc["geometry"])
-        })
+# One multi-band reduceRegions call per batch and scale group (see ee_extract.scale_layers)
+bands = [
+    Band("landcover", dw_img, ee.Reducer.mode(), scale=30,       # landcover class per cell
+         key={"dataset": "GOOGLE/DYNAMICWORLD/V1", "band": "label", "composite": "mode", "reducer": "mode",
+              "dates": DATES}),
+    Band("lighting", viirs_img, ee.Reducer.mean(), scale=500,    # mean nighttime lighting
+         key={"dataset": "NOAA/VIIRS/DNB/MONTHLY_V1/VCMCFG", "band": "avg_rad", "composite": "median",
+              "reducer": "mean", "dates": DATES}),
+]
+
+# Values already in the local cache are reused; only missing cells/bands go
+# to Earth Engine, reduced concurrently (see ee_cache.py / ee_extract.py)
+with tqdm(total=n, desc="Processing grid cells") as progress:
+    cells, failed = cached_extract(features, n, bands, ReductionCache(), batch_size=batch_size,
+                                   progress=progress.update)
+if failed:
+    # Never write a grid with missing cells: bulk_load numbers cells by row
+    sys.exit(f"❌ {failed} cells could not be reduced; nothing saved, rerun to fetch just those")
+
+for cell in cells:
+    props = cell["properties"]
+    # Round landcover class to nearest integer
+    lc_class = round(props.get("landcover") if props.get("landcover") is not None else -1)
+    lc_name = labels.get(lc_class, "Unknown")
+
+    results.append({
+        "landcover_class": lc_class,
+        "landcover_name": lc_name,
+        "lighting_radiance": props.get("lighting"),
+        "geometry": json.dumps(cell["geometry"])
+    })
 
 # Convert to DataFrame
 df = pd.DataFrame(results)
 
-# Save CSV
-df.to_csv("delhi_landcover_lighting_grid.csv", index=False)
+# Save CSV (+ GeoParquet alongside)
+save_grid(df, "delhi_landcover_lighting_grid.csv")
 print("✅ Saved delhi_landcover_lighting_grid.csv")
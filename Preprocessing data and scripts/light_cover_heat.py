@@ -2,8 +2,14 @@ import ee
 import geemap
 import pandas as pd
 import json
+import sys
 from tqdm import tqdm
 
+from ee_cache import ReductionCache, cached_extract
+from ee_extract import Band
+from grid_io import save_grid
+from uhi import add_uhi
+
 # Initialize
 ee.Authenticate()
 ee.Initialize(project='gae-lab-demo')
@@ -14,16 +20,19 @@ delhi_bbox = ee.Geometry.BBox(76.8, 28.4, 77.4, 28.9)
 # Create grid (80x80)
 grid = geemap.fishnet(delhi_bbox, rows=80, cols=80)
 
+# 2023 composites; the dates are also part of the cache keys
+DATES = ("2023-01-01", "2023-12-31")
+
 # Dynamic World land cover (2023 median)
-dw = ee.ImageCollection("GOOGLE/DYNAMICWORLD/V1").filterDate("2023-01-01", "2023-12-31")
+dw = ee.ImageCollection("GOOGLE/DYNAMICWORLD/V1").filterDate(*DATES)
 dw_img = dw.select("label").mode()
 
 # VIIRS nighttime lights (2023 median)
-viirs = ee.ImageCollection("NOAA/VIIRS/DNB/MONTHLY_V1/VCMCFG").filterDate("2023-01-01", "2023-12-31")
+viirs = ee.ImageCollection("NOAA/VIIRS/DNB/MONTHLY_V1/VCMCFG").filterDate(*DATES)
 viirs_img = viirs.select("avg_rad").median()
 
 # MODIS Land Surface Temperature (2023 mean)
-modis_lst = ee.ImageCollection("MODIS/061/MOD11A2").filterDate("2023-01-01", "2023-12-31")
+modis_lst = ee.ImageCollection("MODIS/061/MOD11A2").filterDate(*DATES)
 lst_day = modis_lst.select("LST_Day_1km").mean().multiply(0.02).subtract(273.15)  # scale factor & convert to °C
 
 # Convert grid to list
@@ -39,46 +48,49 @@ labels = {
 
 results = []
 
-for i in tqdm(range(0, n, batch_size), desc="Processing grid cells"):
-    batch = ee.FeatureCollection(features.slice(i, min(i + batch_size, n)))
-
-    # Landcover
-    landcover = dw_img.reduceRegions(collection=batch, reducer=ee.Reducer.mode(), scale=30)
-
-    # Lighting
-    lighting = viirs_img.reduceRegions(collection=batch, reducer=ee.Reducer.mean(), scale=500)
-
-    # LST
-    lst = lst_day.reduceRegions(collection=batch, reducer=ee.Reducer.mean(), scale=1000)
-
-    landcover_info = landcover.getInfo()
-    lighting_info = lighting.getInfo()
-    lst_info = lst.getInfo()
-
-    for f_lc, f_light, f_lst in zip(landcover_info["features"], lighting_info["features"], lst_info["features"]):
-        lc_class = round(f_lc["properties"].get("mode", -1))
-        lc_name = labels.get(lc_class, "Unknown")
-
-        # Mean LST for cell
-        cell_lst = f_lst["properties"].get("mean")
-
-        # Simple UHI estimate: Urban cells vs. Crops/Vegetation reference
-        if lc_class == 6:  # Built-up
-            rural_ref = 28.702616110120662  # (placeholder: can be avg of Crops/Trees from all cells)
-            uhi_intensity = None if cell_lst is None else (cell_lst - rural_ref)
-        else:
-            uhi_intensity = None
-
-        results.append({
-            "landcover_class": lc_class,
-            "landcover_name": lc_name,
-            "lighting_radiance": f_light["properties"].get("mean"),
-            "lst_celsius": cell_lst,
-            "uhi_intensity": uhi_intensity,
-            "geometry": json.dumps(f_lc["geometry"])
-        })
-
-# Save CSV
+# One multi-band reduceRegions call per batch and scale group (see ee_extract.scale_layers)
+bands = [
+    Band("landcover", dw_img, ee.Reducer.mode(), scale=30,
+         key={"dataset": "GOOGLE/DYNAMICWORLD/V1", "band": "label", "composite": "mode", "reducer": "mode",
+              "dates": DATES}),
+    Band("lighting", viirs_img, ee.Reducer.mean(), scale=500,
+         key={"dataset": "NOAA/VIIRS/DNB/MONTHLY_V1/VCMCFG", "band": "avg_rad", "composite": "median",
+              "reducer": "mean", "dates": DATES}),
+    Band("lst", lst_day, ee.Reducer.mean(), scale=1000,
+         key={"dataset": "MODIS/061/MOD11A2", "band": "LST_Day_1km", "composite": "mean", "reducer": "mean",
+              "dates": DATES, "transform": "*0.02-273.15"}),
+]
+
+# Values already in the local cache are reused; only missing cells/bands go
+# to Earth Engine, reduced concurrently (see ee_cache.py / ee_extract.py)
+with tqdm(total=n, desc="Processing grid cells") as progress:
+    cells, failed = cached_extract(features, n, bands, ReductionCache(), batch_size=batch_size,
+                                   progress=progress.update)
+if failed:
+    # Never write a grid with missing cells: bulk_load numbers cells by row
+    sys.exit(f"❌ {failed} cells could not be reduced; nothing saved, rerun to fetch just those")
+
+for cell in cells:
+    props = cell["properties"]
+    lc_class = round(props.get("landcover") if props.get("landcover") is not None else -1)
+    lc_name = labels.get(lc_class, "Unknown")
+
+    # Mean LST for cell
+    cell_lst = props.get("lst")
+
+    results.append({
+        "landcover_class": lc_class,
+        "landcover_name": lc_name,
+        "lighting_radiance": props.get("lighting"),
+        "lst_celsius": cell_lst,
+        "uhi_intensity": None,  # filled in below, once all cells are known
+        "geometry": json.dumps(cell["geometry"])
+    })
+
+# Save CSV (+ GeoParquet alongside)
 df = pd.DataFrame(results)
-df.to_csv("delhi_landcover_lighting_uhi_grid_with_baseline.csv", index=False)
+
+# UHI: built-up LST minus the median LST of the grid's rural cells
+add_uhi(df)
+save_grid(df, "delhi_landcover_lighting_uhi_grid_with_baseline.csv")
 print("✅ Saved delhi_landcover_lighting_uhi_grid_with_baseline.csv with UHI info")
@@ -1,16 +1,12 @@
-import pandas as pd
-df = pd.read_csv('delhi_landcover_lighting_uhi_grid.csv')
+from grid_io import load_grid, save_grid
+from uhi import add_uhi
 
-# define rural classes
-rural_mask = df['landcover_class'].isin([0,1,2,3,4,5,7])
+# Reads the .parquet next to the CSV when it is up to date (same float64 values)
+df = load_grid('delhi_landcover_lighting_uhi_grid.csv')
 
-city_rural_mean = df.loc[rural_mask, 'lst_celsius'].median()   # use median or mean
-print('City rural baseline (°C):', city_rural_mean)
+# rural baseline = median LST of non-built cells (see uhi.RURAL_CLASSES);
+# pass by='district' / window=... to add_uhi for per-region baselines
+baseline = add_uhi(df, stat='median', column='uhi_city_rural_median')
+print('City rural baseline (°C):', baseline[0])
 
-# compute UHI for built-up cells relative to this baseline
-df['uhi_city_rural_median'] = df.apply(
-    lambda r: (r['lst_celsius'] - city_rural_mean) if r['landcover_class'] == 6 else None,
-    axis=1
-)
-
-df.to_csv('delhi_landcover_lighting_uhi_grid_with_baseline.csv', index=False)
+save_grid(df, 'delhi_landcover_lighting_uhi_grid_with_baseline.csv')
@@ -1,28 +1,34 @@
 # ---------------------------
 # Detect Waterlogging - Gurgaon (Local)
 # ---------------------------
+# Memory stays bounded by the processing block, not the AOI or the scene:
+# - downloads are streamed to disk in chunks;
+# - only the window covering the bbox is read, block by block;
+# - the water mask is written to a GeoTIFF (sentinel_data/water_mask.tif;
+#   1 = water, 0 = dry, 255 = no data), which flood_zonal.py aggregates onto the grid,
+#   and flooded areas are vectorized with rasterio.features.shapes into
+#   polygons (one GeoJSON layer) instead of one map marker per pixel.
+
+import json
+import os
 
-import rasterio
-import numpy as np
-import matplotlib.pyplot as plt
 import folium
-from rasterio.plot import show
-from rasterio.mask import mask
-from shapely.geometry import box, mapping
-import geopandas as gpd
+import matplotlib.pyplot as plt
+import numpy as np
+import rasterio
 import requests
-import os
+from rasterio.features import shapes, sieve
+from rasterio.warp import transform_bounds, transform_geom
+from rasterio.windows import Window, from_bounds
 
 # Define bounding box (small part of Gurgaon)
 bbox = [76.98, 28.38, 77.08, 28.48]  # minLon, minLat, maxLon, maxLat
-region = box(*bbox)
 
-# Create a folder for data
-os.makedirs("sentinel_data", exist_ok=True)
-
-# ---- Step 1: Download Sentinel-1 data ----
-# We'll use AWS open Sentinel-1 GRD data via requests
-# These files are public via AWS Open Data (use sample for now)
+THRESHOLD_DB = -2       # pre - post below this = newly wet
+BLOCK_SIZE = 2048       # pixels per side of each processing block
+MIN_REGION_PIXELS = 4   # drop flooded specks smaller than this
+PREVIEW_SIZE = 1000     # max side of the matplotlib previews
+MASK_NODATA = 255       # mask value where either scene has no data
 
 # Example pre and post images from AWS Sentinel-1 archive
 pre_url = "https://sentinel-s1-l1c.s3.amazonaws.com/GRD/S1A_IW_GRDH_1SDV_20240605T000000.tiff"
@@ -31,68 +37,157 @@ post_url = "https://sentinel-s1-l1c.s3.amazonaws.com/GRD/S1A_IW_GRDH_1SDV_202408
 # You can use real S1 data URLs from Copernicus Open Access Hub instead
 pre_path = "sentinel_data/pre_monsoon.tif"
 post_path = "sentinel_data/post_monsoon.tif"
-
-for url, path in [(pre_url, pre_path), (post_url, post_path)]:
-    if not os.path.exists(path):
-        print(f"Downloading {url} ...")
-        r = requests.get(url)
-        with open(path, "wb") as f:
-            f.write(r.content)
-    else:
-        print(f"File {path} already exists")
-
-# ---- Step 2: Read and crop rasters ----
-def crop_to_bbox(src_path, region_geom):
-    with rasterio.open(src_path) as src:
-        out_image, out_transform = mask(src, [mapping(region_geom)], crop=True)
-        out_meta = src.meta.copy()
-        out_meta.update({
-            "height": out_image.shape[1],
-            "width": out_image.shape[2],
-            "transform": out_transform
-        })
-    return out_image[0], out_meta
-
-pre_band, meta = crop_to_bbox(pre_path, region)
-post_band, _ = crop_to_bbox(post_path, region)
-
-# ---- Step 3: Compute VH difference ----
-diff = pre_band.astype(float) - post_band.astype(float)
-
-# ---- Step 4: Threshold for waterlogging ----
-water_mask = diff < -2  # difference of -2 dB or more
-
-# ---- Step 5: Visualize ----
-plt.figure(figsize=(8,6))
-plt.imshow(diff, cmap='RdBu', vmin=-5, vmax=5)
-plt.title("VH Backscatter Difference (Pre - Post)")
-plt.colorbar(label="dB Difference")
-plt.show()
-
-plt.figure(figsize=(8,6))
-plt.imshow(water_mask, cmap='Blues')
-plt.title("Detected Waterlogged Areas")
-plt.show()
-
-# ---- Step 6: Visualize on interactive map ----
-# Convert raster to polygons for Folium overlay
-transform = meta['transform']
-rows, cols = np.where(water_mask)
-
-flood_polygons = []
-for r, c in zip(rows, cols):
-    x, y = rasterio.transform.xy(transform, r, c)
-    flood_polygons.append([y, x])
-
-m = folium.Map(location=[28.43, 77.03], zoom_start=12)
-for lat, lon in flood_polygons:
-    folium.CircleMarker(
-        location=[lat, lon],
-        radius=2,
-        color='blue',
-        fill=True,
-        fill_opacity=0.6
+mask_path = "sentinel_data/water_mask.tif"
+
+
+def download(url, path, chunk_size=1 << 20):
+    """Stream `url` to `path` in chunks; a partial download never looks complete."""
+    tmp = f"{path}.part"
+    with requests.get(url, stream=True, timeout=60) as r:
+        r.raise_for_status()
+        with open(tmp, "wb") as f:
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+    os.replace(tmp, path)
+
+
+def bbox_window(src, lonlat_bbox):
+    """Pixel window of `src` covering a lon/lat bbox, clipped to the raster."""
+    bounds = lonlat_bbox
+    if src.crs and src.crs.to_epsg() != 4326:
+        bounds = transform_bounds("EPSG:4326", src.crs, *lonlat_bbox)
+    window = from_bounds(*bounds, transform=src.transform).round_offsets().round_lengths()
+    return window.intersection(Window(0, 0, src.width, src.height))
+
+
+def blocks(window, size):
+    """Sub-windows of at most size x size pixels tiling `window`."""
+    for row in range(0, int(window.height), size):
+        for col in range(0, int(window.width), size):
+            yield Window(col, row, min(size, window.width - col), min(size, window.height - row))
+
+
+def write_water_mask(pre_path, post_path, mask_path, lonlat_bbox, block_size=BLOCK_SIZE,
+                     threshold=THRESHOLD_DB):
+    """Write the uint8 water mask of the bbox window, block by block; returns (window, crs, flooded pixels)."""
+    with rasterio.open(pre_path) as pre, rasterio.open(post_path) as post:
+        if (pre.transform, pre.shape, pre.crs) != (post.transform, post.shape, post.crs):
+            raise SystemExit("❌ Pre and post rasters must share the same grid")
+
+        window = bbox_window(pre, lonlat_bbox)
+        transform = pre.window_transform(window)
+        profile = pre.profile.copy()
+        profile.update(driver="GTiff", dtype="uint8", count=1, nodata=MASK_NODATA, compress="deflate",
+                       width=int(window.width), height=int(window.height), transform=transform,
+                       tiled=True, blockxsize=256, blockysize=256)
+
+        flooded_pixels = 0
+        with rasterio.open(mask_path, "w", **profile) as dst:
+            for block in blocks(window, block_size):
+                src_block = Window(window.col_off + block.col_off, window.row_off + block.row_off,
+                                   block.width, block.height)
+                pre_band = pre.read(1, window=src_block, out_dtype="float32", masked=True)
+                post_band = post.read(1, window=src_block, out_dtype="float32", masked=True)
+                diff_block = pre_band - post_band
+                water = diff_block.filled(0) < threshold  # difference of -2 dB or more
+                flooded_pixels += int(water.sum())
+                out = water.astype("uint8")
+                out[np.ma.getmaskarray(diff_block) | np.isnan(diff_block.filled(0))] = MASK_NODATA
+                dst.write(out, 1, window=block)
+        return window, pre.crs, flooded_pixels
+
+
+def pixel_centers(affine, rows, cols):
+    """Vectorized pixel (row, col) -> map (x, y) of pixel centres."""
+    cols = np.asarray(cols, dtype="f8") + 0.5
+    rows = np.asarray(rows, dtype="f8") + 0.5
+    return affine.a * cols + affine.b * rows + affine.c, affine.d * cols + affine.e * rows + affine.f
+
+
+def water_polygons(mask_path, block_size=BLOCK_SIZE, min_region_pixels=MIN_REGION_PIXELS):
+    """Flooded areas of the mask as lon/lat GeoJSON features, plus the sum of flooded pixel centres (x, y)."""
+    features = []
+    sum_x = sum_y = 0.0
+    with rasterio.open(mask_path) as src:
+        crs = src.crs
+        for block in blocks(Window(0, 0, src.width, src.height), block_size):
+            water = (src.read(1, window=block) == 1).astype("uint8")
+            if not water.any():
+                continue
+            block_transform = src.window_transform(block)
+            xs, ys = pixel_centers(block_transform, *np.nonzero(water))
+            sum_x += xs.sum()
+            sum_y += ys.sum()
+            if min_region_pixels > 1:
+                water = sieve(water, size=min_region_pixels)
+            for geom, _ in shapes(water, mask=water.astype(bool), transform=block_transform):
+                if crs and crs.to_epsg() != 4326:
+                    geom = transform_geom(crs, "EPSG:4326", geom)
+                features.append({"type": "Feature", "geometry": geom, "properties": {}})
+    return features, sum_x, sum_y
+
+
+if __name__ == "__main__":
+    # Create a folder for data
+    os.makedirs("sentinel_data", exist_ok=True)
+
+    # ---- Step 1: Download Sentinel-1 data ----
+    # We'll use AWS open Sentinel-1 GRD data via requests
+    # These files are public via AWS Open Data (use sample for now)
+    for url, path in [(pre_url, pre_path), (post_url, post_path)]:
+        if not os.path.exists(path):
+            print(f"Downloading {url} ...")
+            download(url, path)
+        else:
+            print(f"File {path} already exists")
+
+    # ---- Step 2 - 4: bbox window, VH difference and water mask, block by block ----
+    window, crs, flooded_pixels = write_water_mask(pre_path, post_path, mask_path, bbox)
+
+    # Decimated previews: one read at reduced resolution, not the full window
+    with rasterio.open(pre_path) as pre, rasterio.open(post_path) as post:
+        scale = max(1, int(max(window.width, window.height) // PREVIEW_SIZE))
+        preview_shape = (max(1, int(window.height) // scale), max(1, int(window.width) // scale))
+        diff = (pre.read(1, window=window, out_shape=preview_shape, out_dtype="float32")
+                - post.read(1, window=window, out_shape=preview_shape, out_dtype="float32"))
+
+    window_pixels = int(window.width) * int(window.height)
+    print(f"💧 {flooded_pixels} flooded pixels ({flooded_pixels / max(window_pixels, 1):.2%}) "
+          f"in a {int(window.width)} x {int(window.height)} window")
+
+    # ---- Step 5: Visualize ----
+    plt.figure(figsize=(8,6))
+    plt.imshow(diff, cmap='RdBu', vmin=-5, vmax=5)
+    plt.title("VH Backscatter Difference (Pre - Post)")
+    plt.colorbar(label="dB Difference")
+    plt.show()
+
+    plt.figure(figsize=(8,6))
+    plt.imshow(diff < THRESHOLD_DB, cmap='Blues')
+    plt.title("Detected Waterlogged Areas")
+    plt.show()
+
+    # ---- Step 6: Visualize on interactive map ----
+    # Convert the mask to polygons (per block, so memory stays bounded) for one GeoJSON overlay
+    features, sum_x, sum_y = water_polygons(mask_path)
+    flood_geojson = {"type": "FeatureCollection", "features": features}
+    with open("sentinel_data/water_polygons.geojson", "w") as f:
+        json.dump(flood_geojson, f)
+
+    # Centre the map on the flooded pixels (or the bbox if none were found)
+    center = [(bbox[1] + bbox[3]) / 2, (bbox[0] + bbox[2]) / 2]
+    if flooded_pixels:
+        cx, cy = sum_x / flooded_pixels, sum_y / flooded_pixels
+        if crs and crs.to_epsg() != 4326:
+            (cx,), (cy,) = rasterio.warp.transform(crs, "EPSG:4326", [cx], [cy])
+        center = [cy, cx]
+
+    m = folium.Map(location=center, zoom_start=12)
+    folium.GeoJson(
+        flood_geojson,
+        name="Waterlogging",
+        style_function=lambda _: {"color": "blue", "weight": 1, "fillColor": "blue", "fillOpacity": 0.6},
     ).add_to(m)
 
-m.save("gurgaon_waterlogging_map.html")
-print("✅ Map saved as gurgaon_waterlogging_map.html")
+    m.save("gurgaon_waterlogging_map.html")
+    print(f"✅ Map saved as gurgaon_waterlogging_map.html ({len(features)} flood polygons)")
@@ -1,10 +1,14 @@
 import ee
 import geemap
 import json
+import sys
 import pandas as pd
 from tqdm import tqdm
-import os
-import time
+
+from checkpoint import CheckpointStore, import_legacy_progress
+from ee_extract import Band, extract, scale_layers
+from grid_io import save_grid
+from uhi import add_uhi
 
 # ---------------------------
 # 0. Authenticate & initialize
@@ -60,85 +64,92 @@ labels = {
 }
 
 results_file = "north_india_grid_landcover_lighting_uhi_no2_resumable.csv"
-progress_file = "progress.json"
+progress_file = "progress.json"  # legacy format, imported once if present
+checkpoint_dir = "north_india_checkpoint"
+
+columns = ["landcover_class", "landcover_name", "lighting_radiance",
+           "lst_celsius", "uhi_intensity", "no2", "geometry"]
 
 # ---------------------------
 # 4. Load progress if exists
 # ---------------------------
-if os.path.exists(progress_file):
-    with open(progress_file, "r") as f:
-        progress_data = json.load(f)
-        start_idx = progress_data.get("last_batch_index", 0)
-        results = progress_data.get("results", [])
-else:
-    start_idx = 0
-    results = []
+# Each batch is appended as its own part file; resuming only reads the
+# small cursor record (see checkpoint.py).
+store = CheckpointStore(checkpoint_dir, columns)
+if import_legacy_progress(store, progress_file):
+    print(f"📥 Imported {progress_file} into {checkpoint_dir}/")
+start_idx = store.next_index
 
-print(f"📦 Total grid cells: {n} | Batch size: {batch_size} | Starting from batch {start_idx}")
+print(f"📦 Total grid cells: {n} | Batch size: {batch_size} | Starting from cell {start_idx}"
+      f" | Skipped ranges to retry: {len(store.skipped)}")
 
 # ---------------------------
 # 5. Process batches
 # ---------------------------
-for i in tqdm(range(start_idx, n, batch_size), desc="Processing batches"):
-    batch = ee.FeatureCollection(features.slice(i, min(i + batch_size, n)))
-    
-    retry = 0
-    success = False
-    while not success and retry < 3:
-        try:
-            # Reduce for each dataset
-            landcover = dw_img.reduceRegions(collection=batch, reducer=ee.Reducer.mode(), scale=10)
-            lighting = viirs_img.reduceRegions(collection=batch, reducer=ee.Reducer.mean(), scale=500)
-            lst = lst_day.reduceRegions(collection=batch, reducer=ee.Reducer.mean(), scale=1000)
-            no2 = no2_img.reduceRegions(collection=batch, reducer=ee.Reducer.mean(), scale=7000)
-
-            landcover_info = landcover.getInfo()
-            lighting_info = lighting.getInfo()
-            lst_info = lst.getInfo()
-            no2_info = no2.getInfo()
-            success = True
-        except Exception as e:
-            retry += 1
-            wait_time = 30 * retry  # exponential backoff
-            print(f"⚠️ Batch {i}-{i+batch_size} failed (attempt {retry}). Retrying in {wait_time}s...")
-            time.sleep(wait_time)
-    
-    if not success:
-        print(f"❌ Skipping batch {i}-{i+batch_size} after 3 failed attempts.")
-        continue
-
-    # Process each cell in batch
-    for f_lc, f_light, f_lst, f_no2 in zip(
-        landcover_info["features"],
-        lighting_info["features"],
-        lst_info["features"],
-        no2_info["features"]
-    ):
-        lc_class = round(f_lc["properties"].get("mode", -1))
-        lc_name = labels.get(lc_class, "Unknown")
-        cell_lst = f_lst["properties"].get("mean")
-        uhi_intensity = None
-        if lc_class == 6 and cell_lst is not None:
-            rural_ref = 28.7
-            uhi_intensity = cell_lst - rural_ref
-
-        results.append({
-            "landcover_class": lc_class,
-            "landcover_name": lc_name,
-            "lighting_radiance": f_light["properties"].get("mean"),
-            "lst_celsius": cell_lst,
-            "uhi_intensity": uhi_intensity,
-            "no2": f_no2["properties"].get("mean"),
-            "geometry": json.dumps(f_lc["geometry"])
-        })
-
-    # ---------------------------
-    # 6. Save progress after each batch
-    # ---------------------------
-    with open(progress_file, "w") as f:
-        json.dump({"last_batch_index": i + batch_size, "results": results}, f)
-
-    # Also save CSV incrementally
-    pd.DataFrame(results).to_csv(results_file, index=False)
-
-print(f"✅ Finished all batches. Saved {len(results)} cells to {results_file}")
+# One reduceRegions call per batch for each group of similar-scale bands
+# (10 m landcover / 500 m-1 km VIIRS and LST / 7 km NO2): a single stack
+# would evaluate every band on the 10 m grid over ~20 km cells
+layers = scale_layers("cells", [
+    Band("landcover", dw_img, ee.Reducer.mode(), scale=10),
+    Band("lighting", viirs_img, ee.Reducer.mean(), scale=500),
+    Band("lst", lst_day, ee.Reducer.mean(), scale=1000),
+    Band("no2", no2_img, ee.Reducer.mean(), scale=7000),
+], ee_module=ee)
+
+
+def to_row(cell):
+    props = cell["properties"]
+    lc_class = round(props.get("landcover") if props.get("landcover") is not None else -1)
+    lc_name = labels.get(lc_class, "Unknown")
+    cell_lst = props.get("lst")
+
+    return {
+        "landcover_class": lc_class,
+        "landcover_name": lc_name,
+        "lighting_radiance": props.get("lighting"),
+        "lst_celsius": cell_lst,
+        "uhi_intensity": None,  # filled in after consolidation
+        "no2": props.get("no2"),
+        "geometry": json.dumps(cell["geometry"])
+    }
+
+
+def process(start, end, progress):
+    # Batches run concurrently; extract() retries failed requests
+    # (3 attempts, 30s/60s backoff) and yields batches in grid order.
+    for batch in extract(features, end, layers, start=start, batch_size=batch_size,
+                         max_retries=3, retry_wait=30):
+        progress.update(batch.end - batch.start)
+        if not batch.ok:
+            print(f"❌ Skipping batch {batch.start}-{batch.end} after 3 failed attempts (recorded for retry).")
+            store.skip_batch(batch.start, batch.end)
+            continue
+
+        # ---------------------------
+        # 6. Save progress after each batch
+        # ---------------------------
+        # Only this batch is written, then the cursor moves past it
+        store.write_batch(batch.start, batch.end, [to_row(cell) for cell in batch.cells()])
+
+
+retry_ranges = list(store.skipped)
+todo = (n - start_idx) + sum(e - s for s, e in retry_ranges)
+with tqdm(total=todo, desc="Processing cells") as progress:
+    # Batches skipped by earlier runs first, then the rest of the grid
+    for s, e in retry_ranges:
+        process(s, e, progress)
+    process(start_idx, n, progress)
+
+if store.skipped:
+    # A grid with gaps would shift every later cell's gid in bulk_load (gids are row numbers)
+    ranges = ", ".join(f"{s}-{e}" for s, e in sorted(store.skipped))
+    sys.exit(f"❌ Cells {ranges} still failed; nothing saved, rerun to retry them")
+
+store.consolidate(results_file)
+
+# UHI against the mean rural LST within 5 cells (~11x11 window) of each cell:
+# a single baseline cannot fit four states' worth of climate
+df = pd.read_csv(results_file)
+add_uhi(df, window=5)
+save_grid(df, results_file)
+print(f"✅ Finished all batches. Saved {store.row_count()} cells to {results_file}")
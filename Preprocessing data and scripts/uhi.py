@@ -0,0 +1,158 @@
+"""Urban heat island intensity against per-region rural baselines.
+
+UHI intensity of a built-up cell = its LST minus the rural baseline of its
+region, where the baseline is the median (or mean) LST of the region's rural
+cells (every landcover class except built area, snow and unknown).
+
+Regions can be:
+
+- the whole grid (`by=None`), as new_uhi.py did;
+- any label column, e.g. district or state names (`by="district"`);
+- square blocks of grid cells (`block_regions`);
+- a moving window of neighbouring cells (`window=radius`), mean only.
+
+Everything is array arithmetic over the whole grid: baselines for all
+regions come out of one sort/bincount pass, and the moving window uses a
+summed-area table, so thousands of regions take milliseconds.
+
+    python uhi.py north_india_grid_landcover_lighting_uhi_no2_resumable.csv
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+RURAL_CLASSES = (0, 1, 2, 3, 4, 5, 7)
+BUILT_CLASS = 6
+
+
+def rural_mask(landcover, lst):
+    return np.isin(landcover, RURAL_CLASSES) & np.isfinite(lst)
+
+
+def region_baselines(lst, landcover, codes, n_regions, stat="median"):
+    """Rural baseline per region; `codes` are 0..n_regions-1 (negative = no region)."""
+    keep = rural_mask(landcover, lst) & (codes >= 0)
+    values = lst[keep].astype("f8")
+    groups = codes[keep]
+    counts = np.bincount(groups, minlength=n_regions)
+    out = np.full(n_regions, np.nan)
+    has = counts > 0
+
+    if stat == "mean":
+        sums = np.bincount(groups, weights=values, minlength=n_regions)
+        out[has] = sums[has] / counts[has]
+    elif stat == "median":
+        # Sort by (region, value); each region's median sits in the middle of its run
+        order = np.lexsort((values, groups))
+        values = values[order]
+        starts = np.cumsum(counts) - counts
+        lo = starts + (counts - 1) // 2
+        hi = starts + counts // 2
+        out[has] = (values[lo[has]] + values[hi[has]]) / 2
+    else:
+        raise ValueError(f"unknown stat {stat!r}")
+    return out
+
+
+def grid_positions(xmin, ymin, xmax, ymax):
+    """(row, col) of each cell of a regular grid, from the cell bounds."""
+    dx = np.nanmedian(xmax - xmin)
+    dy = np.nanmedian(ymax - ymin)
+    col = np.rint((xmin - np.nanmin(xmin)) / dx)
+    row = np.rint((ymin - np.nanmin(ymin)) / dy)
+    missing = ~(np.isfinite(col) & np.isfinite(row))
+    col[missing] = row[missing] = -1
+    return row.astype(np.int64), col.astype(np.int64)
+
+
+def block_regions(row, col, size):
+    """Region code per cell for size x size blocks of the grid (-1 where row/col is)."""
+    n_block_cols = col.max() // size + 1
+    codes = (row // size) * n_block_cols + col // size
+    codes[(row < 0) | (col < 0)] = -1
+    return codes
+
+
+def window_baselines(lst, landcover, row, col, radius):
+    """Mean rural LST within `radius` cells (a (2r+1)^2 square) around each cell."""
+    keep = rural_mask(landcover, lst) & (row >= 0)
+    height, width = row.max() + 1, col.max() + 1
+    sums = np.zeros((height + 1, width + 1))
+    counts = np.zeros((height + 1, width + 1))
+    np.add.at(sums, (row[keep] + 1, col[keep] + 1), lst[keep])
+    np.add.at(counts, (row[keep] + 1, col[keep] + 1), 1)
+    # Summed-area tables: [i, j] holds the total over rows < i, cols < j
+    sums = sums.cumsum(0).cumsum(1)
+    counts = counts.cumsum(0).cumsum(1)
+
+    r0 = np.clip(row - radius, 0, height)
+    r1 = np.clip(row + radius + 1, 0, height)
+    c0 = np.clip(col - radius, 0, width)
+    c1 = np.clip(col + radius + 1, 0, width)
+
+    def box(table):
+        return table[r1, c1] - table[r0, c1] - table[r1, c0] + table[r0, c0]
+
+    n = box(counts)
+    out = np.full(len(lst), np.nan)
+    ok = (n > 0) & (row >= 0)
+    out[ok] = box(sums)[ok] / n[ok]
+    return out
+
+
+def uhi_intensity(lst, landcover, baseline):
+    """LST minus baseline for built-up cells, NaN elsewhere."""
+    return np.where(landcover == BUILT_CLASS, lst - baseline, np.nan)
+
+
+def add_uhi(df, by=None, window=None, stat="median", column="uhi_intensity", baseline_column=None):
+    """Fill `column` (and optionally `baseline_column`) of a grid DataFrame in place.
+
+    `by` is a column name or an array of region labels/codes; `window` is a
+    moving-window radius in cells (needs the `geometry` column).
+    """
+    lst = df["lst_celsius"].to_numpy(dtype="f8")
+    landcover = df["landcover_class"].to_numpy()
+
+    if window is not None:
+        from grid_io import geometry_bounds
+
+        row, col = grid_positions(*geometry_bounds(df["geometry"]))
+        baseline = window_baselines(lst, landcover, row, col, window)
+    else:
+        if by is None:
+            codes, n_regions = np.zeros(len(df), dtype=np.int64), 1
+        else:
+            labels = df[by] if isinstance(by, str) else by
+            codes, uniques = pd.factorize(np.asarray(labels))
+            n_regions = len(uniques)
+        per_region = region_baselines(lst, landcover, codes, n_regions, stat)
+        baseline = np.where(codes >= 0, per_region[np.maximum(codes, 0)], np.nan)
+
+    df[column] = uhi_intensity(lst, landcover, baseline)
+    if baseline_column:
+        df[baseline_column] = baseline
+    return baseline
+
+
+if __name__ == "__main__":
+    from grid_io import geometry_bounds, load_grid
+
+    df = load_grid(sys.argv[1] if len(sys.argv) > 1 else "delhi_grid_landcover_lighting_uhi_no2.csv")
+    lst = df["lst_celsius"].to_numpy(dtype="f8")
+    landcover = df["landcover_class"].to_numpy()
+    row, col = grid_positions(*geometry_bounds(df["geometry"]))
+    print(f"{len(df)} cells, grid {row.max() + 1} x {col.max() + 1}")
+
+    for size in (10, 5, 2):
+        codes = block_regions(row, col, size)
+        n_regions = int(codes.max()) + 1
+        start = time.perf_counter()
+        region_baselines(lst, landcover, codes, n_regions, "median")
+        print(f"median baselines for {n_regions} {size}x{size} blocks: "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms")
+    start = time.perf_counter()
+    window_baselines(lst, landcover, row, col, 5)
+    print(f"moving-window (11x11) baselines: {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,115 @@
+"""Logging setup and request-timing middleware for the API.
+
+Environment:
+    LOG_LEVEL          DEBUG / INFO (default) / WARNING ...
+    LOG_FORMAT         "text" (default) or "json" (one object per line)
+    LOG_SAMPLE_RATE    fraction of successful request logs and DEBUG records
+                       to keep (default 1.0); errors, warnings and slow
+                       requests are always kept
+    LOG_SLOW_MS        requests slower than this are always logged (default 1000)
+"""
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+from flask import g, request
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 1.0))
+LOG_SLOW_MS = float(os.environ.get("LOG_SLOW_MS", 1000))
+
+# Attributes every LogRecord has; anything else came in via `extra=`
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and key != "sample":
+                out[key] = value
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        extra = {k: v for k, v in vars(record).items() if k not in _RECORD_FIELDS and k != "sample"}
+        if extra:
+            line += " " + " ".join(f"{k}={v}" for k, v in extra.items())
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of DEBUG records and of records marked `sample=True`."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if self.rate >= 1.0:
+            return True
+        if record.levelno <= logging.DEBUG or getattr(record, "sample", False):
+            return random.random() < self.rate
+        return True
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, sample_rate=LOG_SAMPLE_RATE, force=False):
+    """Install the stdout handler on the root logger.
+
+    Called by the entry points (wsgi.py, `python database_connection.py`),
+    not on import. If the root logger already has handlers (an embedding
+    app, a test runner) they are left alone unless `force=True`.
+    """
+    root = logging.getLogger()
+    if root.handlers and not force:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    handler.addFilter(SamplingFilter(sample_rate))
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+
+
+request_log = logging.getLogger("usp.request")
+
+
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+
+def _log_request(response):
+    start = g.pop("request_start", None)
+    if start is None:
+        return response
+    ms = (time.perf_counter() - start) * 1000.0
+    response.headers["Server-Timing"] = f"app;dur={ms:.1f}"
+    level = logging.WARNING if response.status_code >= 500 or ms >= LOG_SLOW_MS else logging.INFO
+    request_log.log(level, "%s %s %s", request.method, request.path, response.status_code, extra={
+        "status": response.status_code,
+        "duration_ms": round(ms, 2),
+        "bytes": response.calculate_content_length(),
+        # Routine successes are sampled; errors and slow requests are not
+        "sample": level == logging.INFO,
+    })
+    return response
+
+
+def init_app(app):
+    app.before_request(_start_timer)
+    app.after_request(_log_request)
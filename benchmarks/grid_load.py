@@ -0,0 +1,72 @@
+"""Compare loading a grid dataset from CSV vs GeoParquet.
+
+For each CSV it writes a temporary GeoParquet copy (grid_io.write_grid), then
+times, best of N:
+
+- CSV: pandas.read_csv + json.loads of every geometry (what consumers do now)
+- Parquet, all columns, geometry decoded from WKB to GeoJSON dicts
+- Parquet, numeric columns + bbox only (memory-mapped, no geometry decoding)
+
+    python benchmarks/grid_load.py [grid.csv ...]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = os.path.join(ROOT, "Preprocessing data and scripts")
+sys.path.insert(0, SCRIPTS)
+
+import pandas as pd  # noqa: E402
+
+import grid_io  # noqa: E402
+
+DEFAULT_CSVS = [
+    os.path.join(SCRIPTS, "delhi_grid_landcover_lighting_uhi_no2.csv"),
+    os.path.join(SCRIPTS, "north_india_grid_landcover_lighting_uhi_no2_resumable.csv"),
+]
+NUMERIC = ["landcover_class", "lighting_radiance", "lst_celsius", "uhi_intensity", "no2", "bbox"]
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0
+
+
+def load_csv(path):
+    df = pd.read_csv(path)
+    df["geometry"] = [json.loads(g) for g in df["geometry"]]
+    return df
+
+
+def main(paths):
+    if grid_io.pq is None:
+        sys.exit("pyarrow is not installed")
+    print(f"{'dataset':<66}{'bytes':>12}{'load ms':>10}{'vs CSV':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in paths:
+            name = os.path.basename(path)
+            parquet = os.path.join(tmp, os.path.splitext(name)[0] + ".parquet")
+            grid_io.write_grid(pd.read_csv(path), parquet)
+            columns = [c for c in NUMERIC if c in grid_io.read_grid(parquet).column_names]
+
+            csv_ms = timed(lambda: load_csv(path))
+            cases = [
+                (f"{name} (CSV)", os.path.getsize(path), csv_ms),
+                ("  parquet, all columns + geometry", os.path.getsize(parquet),
+                 timed(lambda: grid_io.to_frame(grid_io.read_grid(parquet), geometry="dict"))),
+                ("  parquet, numeric + bbox (mmap)", os.path.getsize(parquet),
+                 timed(lambda: grid_io.bbox_arrays(grid_io.read_grid(parquet, columns)))),
+            ]
+            for label, size, ms in cases:
+                print(f"{label:<66}{size:>12,}{ms:>10.1f}{ms / csv_ms:>8.0%}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or DEFAULT_CSVS)
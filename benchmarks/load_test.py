@@ -0,0 +1,91 @@
+"""Concurrent load test of a running API, e.g. dev server vs wsgi.py.
+
+    python database_connection.py &    python benchmarks/load_test.py
+    python wsgi.py &                   python benchmarks/load_test.py
+    python benchmarks/load_test.py --url http://localhost:5000 -c 32 -d 30 \\
+        --path "/get_district_data?district=Delhi" --path /tiles/12/2927/1678.mvt
+
+Each of `-c` client threads keeps one HTTP/1.1 connection open and sends
+requests round-robin over the paths for `-d` seconds. Reports throughput,
+latency percentiles and errors; only the standard library is needed.
+"""
+import argparse
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = [
+    "/get_district_data?district=Delhi",
+    "/get_district_data?district=Delhi&format=compact",
+    "/db_stats",
+]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def client(url, paths, deadline, latencies, errors, sizes, lock):
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    mine, failed, received = [], 0, 0
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path, headers={"Accept-Encoding": "gzip"})
+            response = conn.getresponse()
+            body = response.read()
+            if response.status >= 400:
+                failed += 1
+                continue
+            received += len(body)
+            mine.append((time.perf_counter() - start) * 1000.0)
+        except (OSError, http.client.HTTPException):
+            failed += 1
+            conn.close()
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    conn.close()
+    with lock:
+        latencies.extend(mine)
+        errors[0] += failed
+        sizes[0] += received
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-d", "--duration", type=float, default=15.0, help="seconds (default 15)")
+    parser.add_argument("--path", action="append", help="request path (repeatable)")
+    args = parser.parse_args()
+    paths = args.path or DEFAULT_PATHS
+
+    latencies, errors, sizes, lock = [], [0], [0], threading.Lock()
+    start = time.perf_counter()
+    deadline = start + args.duration
+    threads = [
+        threading.Thread(target=client, args=(args.url, paths, deadline, latencies, errors, sizes, lock))
+        for _ in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{args.url}: {args.concurrency} clients, {elapsed:.1f}s, {len(paths)} paths")
+    print(f"  requests   {len(latencies)} ok, {errors[0]} errors")
+    print(f"  throughput {len(latencies) / elapsed:.1f} req/s, {sizes[0] / elapsed / 1e6:.2f} MB/s")
+    print(f"  latency    p50 {percentile(latencies, 0.50):.1f} ms  p95 {percentile(latencies, 0.95):.1f} ms"
+          f"  p99 {percentile(latencies, 0.99):.1f} ms  max {latencies[-1] if latencies else 0:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
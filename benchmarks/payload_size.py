@@ -0,0 +1,85 @@
+"""Compare district payload sizes and encode times: row JSON vs compact formats.
+
+Uses a shipped Delhi grid CSV shaped like the rows /get_district_data returns.
+
+    python benchmarks/payload_size.py [path/to/grid.csv]
+"""
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import compact_format  # noqa: E402
+
+DEFAULT_CSV = os.path.join(ROOT, "Preprocessing data and scripts", "delhi_grid_landcover_lighting_uhi_no2.csv")
+
+
+def _float(value):
+    return float(value) if value not in ("", None) else None
+
+
+def load_rows(path):
+    """CSV rows renamed to the testing_shapes columns the API returns."""
+    rows = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for i, r in enumerate(csv.DictReader(f)):
+            rows.append({
+                "gid": i + 1,
+                "landcove_1": r["landcover_name"],
+                "landcover_": r["landcover_class"],
+                "lighting_r": _float(r.get("lighting_radiance")),
+                "uhi_intens": _float(r.get("uhi_intensity")),
+                "lst_celsiu": _float(r.get("lst_celsius")),
+                "no2": _float(r.get("no2")),
+                "geometry": json.loads(r["geometry"]),
+                "location_name": "Delhi",
+            })
+    return rows
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return out, best * 1000.0
+
+
+def main(path):
+    rows = load_rows(path)
+    payload = {"grids": rows, "police_stations": []}
+    print(f"{len(rows)} cells from {os.path.basename(path)}\n")
+
+    cases = [("row JSON (default)", lambda: json.dumps(payload).encode("utf-8"))]
+
+    def compact(fmt):
+        def run():
+            out = compact_format.to_columnar(rows)
+            out["police_stations"] = []
+            body, _ = compact_format.serialize(out, fmt, lambda o: json.dumps(o, separators=(",", ":")))
+            return body
+        return run
+
+    cases.append(("columnar JSON", compact("compact")))
+    if compact_format.msgpack is not None:
+        cases.append(("columnar MessagePack", compact("msgpack")))
+
+    baseline = None
+    print(f"{'format':<24}{'bytes':>12}{'gzip':>12}{'brotli':>12}{'encode ms':>12}{'vs default':>12}")
+    for name, fn in cases:
+        body, ms = timed(fn)
+        gz = len(gzip.compress(body, compresslevel=6))
+        br = len(compact_format.brotli.compress(body)) if compact_format.brotli is not None else None
+        baseline = baseline or len(body)
+        print(f"{name:<24}{len(body):>12,}{gz:>12,}{(f'{br:,}' if br else '-'):>12}{ms:>12.1f}"
+              f"{len(body) / baseline:>11.1%}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CSV)
@@ -0,0 +1,395 @@
+"""Benchmark suite for the API and the extraction pipeline on synthetic grids.
+
+Synthetic grids of 1k / 10k / 100k cells are generated in the schema of
+`delhi_grid_landcover_lighting_uhi_no2.csv` (a fishnet of Delhi-sized cells
+with plausible landcover, lighting, LST, NO2 and UHI values), then:
+
+- api      /get_district_data (json, compact, stream=json), POST /score and
+           POST /rank (top 50 of the district)
+           through Flask's test client, cold (caches invalidated before
+           every request) and cached. `--backend memory` (default) answers
+           the SQL from the synthetic rows in memory, so it measures the
+           Python side only; `--backend postgis` uses the database from
+           DB_* settings (with `--load` it first bulk-loads each synthetic
+           grid into testing_shapes -- use a throwaway database).
+- extract  ee_extract.extract over the grid cells against fake_ee, with
+           `--ee-latency` seconds per request.
+
+For every case it reports p50/p95 latency (ms), throughput (per second),
+payload bytes and peak traced Python memory (MB). Results can be saved as a
+baseline and later runs compared against it:
+
+    python benchmarks/suite.py --save before
+    python benchmarks/suite.py --compare before
+    python benchmarks/suite.py --sizes 1000,10000 --only api
+    python benchmarks/suite.py --write-grids /tmp/grids   # just the CSVs
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = os.path.join(ROOT, "Preprocessing data and scripts")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, SCRIPTS)
+
+BASELINE_DIR = os.path.join(ROOT, "benchmarks", "baselines")
+DEFAULT_SIZES = [1000, 10000, 100000]
+# Changes beyond this fraction are flagged when comparing with a baseline
+REGRESSION_THRESHOLD = 0.20
+
+# Same origin and cell size as the Delhi grid
+ORIGIN = (76.84, 28.40)
+CELL = (0.0075, 0.00625)
+LANDCOVER_NAMES = {
+    0: "Water", 1: "Trees", 2: "Grass", 3: "Flooded vegetation",
+    4: "Crops", 5: "Shrub & scrub", 6: "Built area", 7: "Bare ground", 8: "Snow & ice",
+}
+LANDCOVER_SHARE = [0.02, 0.08, 0.05, 0.01, 0.30, 0.06, 0.45, 0.03, 0.0]
+
+
+def synthetic_grid(n, seed=0):
+    """DataFrame of `n` grid cells in the preprocessing CSV schema."""
+    from uhi import add_uhi
+
+    rng = np.random.default_rng(seed)
+    cols = math.ceil(math.sqrt(n))
+    idx = np.arange(n)
+    x0 = ORIGIN[0] + (idx % cols) * CELL[0]
+    y0 = ORIGIN[1] + (idx // cols) * CELL[1]
+    x1, y1 = x0 + CELL[0], y0 + CELL[1]
+
+    landcover = rng.choice(len(LANDCOVER_SHARE), size=n, p=LANDCOVER_SHARE)
+    built = landcover == 6
+    df = pd.DataFrame({
+        "landcover_class": landcover,
+        "landcover_name": [LANDCOVER_NAMES[c] for c in landcover],
+        "lighting_radiance": rng.lognormal(2.0, 0.8, n) * np.where(built, 2.0, 0.5),
+        "lst_celsius": rng.normal(30.0, 1.5, n) + np.where(built, 2.0, 0.0),
+        "uhi_intensity": np.nan,
+        "no2": rng.normal(7.5e-5, 1.5e-5, n).clip(1e-6),
+        "geometry": [
+            json.dumps({"geodesic": False, "type": "Polygon",
+                        "coordinates": [[[a, b], [c, b], [c, d], [a, d], [a, b]]]})
+            for a, b, c, d in zip(x0.tolist(), y0.tolist(), x1.tolist(), y1.tolist())
+        ],
+    })
+    add_uhi(df)
+    return df
+
+
+def _none(value):
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+def table_rows(df, district="Bench"):
+    """testing_shapes-style rows for the API queries (grid and numeric columns)."""
+    rows, numeric = [], []
+    for gid, r in enumerate(df.itertuples(index=False), start=1):
+        geometry = json.loads(r.geometry)
+        ring = geometry["coordinates"][0]
+        row = {
+            "gid": gid,
+            "landcove_1": r.landcover_name,
+            "landcover_": int(r.landcover_class),
+            "lighting_r": _none(r.lighting_radiance),
+            "uhi_intens": _none(r.uhi_intensity),
+            "lst_celsiu": _none(r.lst_celsius),
+            "no2": _none(r.no2),
+            "flood_frac": None,
+            "ps_dist_m": None,
+        }
+        numeric.append(dict(row, location_name=district,
+                            cx=(ring[0][0] + ring[2][0]) / 2, cy=(ring[0][1] + ring[2][1]) / 2))
+        rows.append(dict(row, geometry={"type": "MultiPolygon", "coordinates": [geometry["coordinates"]]},
+                         location_name=district))
+    return rows, numeric
+
+
+class MemoryCursor:
+    """Answers the API's queries from in-memory rows (stand-in for a PostGIS cursor)."""
+
+    itersize = 2000
+
+    def __init__(self, rows, numeric):
+        self._tables = {"grid": rows, "numeric": numeric}
+        self._result = []
+
+    def execute(self, sql, params=None):
+        if "ps_location_ascii" in sql:
+            self._result = []
+        elif "FROM district_grid;" in sql:
+            self._result = [{"name_key": r["location_name"].lower(), "name": r["location_name"], "gid": r["gid"]}
+                            for r in self._tables["numeric"]]
+        elif "to_regclass" in sql or "information_schema" in sql:
+            self._result = [{"present": True}]
+        elif "ST_Centroid" in sql:
+            self._result = self._tables["numeric"]
+        else:
+            self._result = self._tables["grid"]
+
+    def fetchall(self):
+        return list(self._result)
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def __iter__(self):
+        return iter(self._result)
+
+    def close(self):
+        pass
+
+
+def use_memory_backend(rows, numeric):
+    import db_pool
+
+    db_pool.cursor = lambda: MemoryCursor(rows, numeric)
+
+    @contextmanager
+    def streaming_cursor(itersize=db_pool.STREAM_ITERSIZE):
+        yield MemoryCursor(rows, numeric)
+
+    db_pool.streaming_cursor = streaming_cursor
+
+
+def summarize(latencies_ms, elapsed, nbytes=None, peak_bytes=None, unit="requests"):
+    lat = np.asarray(latencies_ms)
+    out = {
+        "p50_ms": round(float(np.percentile(lat, 50)), 3) if len(lat) else None,
+        "p95_ms": round(float(np.percentile(lat, 95)), 3) if len(lat) else None,
+        "throughput": round(len(lat) / elapsed, 2) if elapsed else None,
+        "unit": f"{unit}/s",
+    }
+    if nbytes is not None:
+        out["bytes"] = nbytes
+    if peak_bytes is not None:
+        out["peak_mb"] = round(peak_bytes / 1e6, 2)
+    return out
+
+
+def traced_peak(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_api(size, df, args):
+    import database_connection as api
+
+    if args.backend == "memory":
+        use_memory_backend(*table_rows(df, args.district))
+    elif args.load:
+        import bulk_load
+        import precompute
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "grid.csv")
+            df.to_csv(path, index=False)
+            precompute.run(bulk_load.load_steps(path, 5000), bulk_load.SWAPS)
+
+    client = api.app.test_client()
+    district = args.district
+    cases = {
+        "district_json": lambda: client.get(f"/get_district_data?district={district}"),
+        "district_compact": lambda: client.get(f"/get_district_data?district={district}&format=compact",
+                                               headers={"Accept-Encoding": "gzip"}),
+        "district_stream": lambda: client.get(f"/get_district_data?district={district}&stream=json"),
+        "score": lambda: client.post("/score", json={"district": district}),
+        "rank": lambda: client.post("/rank", json={"districts": [district], "k": 50}),
+    }
+    repeat = max(3, min(args.repeat, int(args.repeat * 1000 / size) or 3))
+    results = {}
+
+    def invalidate():
+        api.district_cache.invalidate()
+
+    for name, call in cases.items():
+        for mode in ("cold", "cached"):
+            if mode == "cached" and name == "district_stream":
+                continue  # streamed responses are never cached
+            call()  # warm-up (imports, police stations, first cache fill)
+            latencies, nbytes = [], 0
+            start = time.perf_counter()
+            for _ in range(repeat):
+                if mode == "cold":
+                    invalidate()
+                t = time.perf_counter()
+                response = call()
+                latencies.append((time.perf_counter() - t) * 1000.0)
+                if response.status_code != 200:
+                    raise SystemExit(f"❌ {name}: HTTP {response.status_code} {response.data[:200]!r}")
+                nbytes = len(response.data)
+            elapsed = time.perf_counter() - start
+
+            def once():
+                if mode == "cold":
+                    invalidate()
+                call()
+
+            results[f"api/{name}/{mode}/{size}"] = summarize(latencies, elapsed, nbytes, traced_peak(once))
+    return results
+
+
+def bench_extract(size, df, args):
+    import ee_extract
+    import fake_ee
+    from ee_extract import Band, extract, multiband_layer
+
+    fake_ee.configure(latency=args.ee_latency, jitter=args.ee_latency / 2)
+    features = fake_ee.FeatureCollection([
+        {"type": "Feature", "id": str(i), "geometry": json.loads(g), "properties": {}}
+        for i, g in enumerate(df["geometry"])
+    ]).toList(size)
+    bands = [
+        Band("landcover", fake_ee.ImageCollection("GOOGLE/DYNAMICWORLD/V1").select("label").mode(),
+             fake_ee.Reducer.mode(), 30),
+        Band("lighting", fake_ee.ImageCollection("NOAA/VIIRS").select("avg_rad").median(), fake_ee.Reducer.mean(), 500),
+        Band("lst", fake_ee.ImageCollection("MODIS/061/MOD11A2").select("LST_Day_1km").mean(),
+             fake_ee.Reducer.mean(), 1000),
+        Band("no2", fake_ee.ImageCollection("S5P").select("tropospheric_NO2_column_number_density").mean(),
+             fake_ee.Reducer.mean(), 1000),
+    ]
+    layers = [multiband_layer("cells", bands, ee_module=fake_ee)]
+
+    # Round-trip time of every (fake) EE request
+    request_ms = []
+    reduce_layer = ee_extract._reduce_layer
+
+    def timed_reduce(*a):
+        feats, seconds = reduce_layer(*a)
+        request_ms.append(seconds * 1000.0)
+        return feats, seconds
+
+    def run():
+        cells = 0
+        for batch in extract(features, size, layers, batch_size=args.batch_size, max_workers=args.workers,
+                             requests_per_second=0, retry_wait=0.1, ee_module=fake_ee):
+            cells += len(batch.cells()) if batch.ok else 0
+        return cells
+
+    ee_extract._reduce_layer = timed_reduce
+    try:
+        tracemalloc.start()
+        start = time.perf_counter()
+        cells = run()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        ee_extract._reduce_layer = reduce_layer
+
+    result = summarize(request_ms, elapsed, peak_bytes=peak)
+    result["cells_per_s"] = round(cells / elapsed, 1)
+    result["seconds"] = round(elapsed, 3)
+    return {f"extract/multiband/{size}": result}
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Print metrics that moved more than `threshold`; return the number of regressions."""
+    worse_if_higher = {"p50_ms", "p95_ms", "bytes", "peak_mb", "seconds"}
+    regressions = 0
+    missing = [case for case in results if case not in baseline]
+    if missing:
+        print(f"⚠️ No baseline for {len(missing)} case(s): {', '.join(missing)}")
+    for case, metrics in results.items():
+        old = baseline.get(case)
+        if not old:
+            continue
+        for key, value in metrics.items():
+            before = old.get(key)
+            if not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or not before:
+                continue
+            change = (value - before) / before
+            worse = change > threshold if key in worse_if_higher else change < -threshold
+            regressions += worse
+            if abs(change) > threshold:
+                print(f"{'❌' if worse else '✅'} {case} {key}: {before} -> {value} ({change:+.0%})")
+    return regressions
+
+
+def run_meta(args):
+    return {"host": platform.node(), "python": platform.python_version(), "machine": platform.platform(),
+            "cpus": os.cpu_count(), "backend": args.backend, "ee_latency": args.ee_latency}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="cells per synthetic grid")
+    parser.add_argument("--only", choices=["api", "extract"])
+    parser.add_argument("--backend", choices=["memory", "postgis"], default="memory")
+    parser.add_argument("--load", action="store_true", help="postgis: bulk-load each synthetic grid first")
+    parser.add_argument("--district", default="Delhi")
+    parser.add_argument("--repeat", type=int, default=20, help="requests per API case at 1k cells")
+    parser.add_argument("--ee-latency", type=float, default=0.02, help="seconds per fake EE request")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--save", metavar="NAME", help="save results as benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare with a saved baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative change flagged as a regression (default 0.2)")
+    parser.add_argument("--write-grids", metavar="DIR", help="only write the synthetic grid CSVs")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    results = {}
+    for size in sizes:
+        start = time.perf_counter()
+        df = synthetic_grid(size)
+        print(f"🧪 {size} cells generated in {time.perf_counter() - start:.1f}s")
+        if args.write_grids:
+            os.makedirs(args.write_grids, exist_ok=True)
+            path = os.path.join(args.write_grids, f"synthetic_grid_{size}.csv")
+            df.to_csv(path, index=False)
+            print(f"✅ {path}")
+            continue
+        if args.only in (None, "api"):
+            results.update(bench_api(size, df, args))
+        if args.only in (None, "extract"):
+            results.update(bench_extract(size, df, args))
+    if not results:
+        return
+
+    print(f"\n{'case':<36}{'p50 ms':>10}{'p95 ms':>10}{'per s':>10}{'bytes':>12}{'peak MB':>10}")
+    for case, m in results.items():
+        print(f"{case:<36}{m['p50_ms']:>10.2f}{m['p95_ms']:>10.2f}{m['throughput']:>10.1f}"
+              f"{m.get('bytes', ''):>12}{m.get('peak_mb', ''):>10}")
+
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json")) as f:
+            saved = json.load(f)
+        print(f"\nvs baseline {args.compare!r} (threshold {args.threshold:.0%}):")
+        # Timings only compare on the same host with the same settings
+        differs = {k: v for k, v in saved["meta"].items() if k in run_meta(args) and v != run_meta(args)[k]}
+        if differs:
+            print(f"⚠️ Baseline was run with {differs}; timings may not be comparable")
+        regressions = compare(results, saved["results"], args.threshold)
+        print(f"{regressions} regression(s)")
+        if regressions:
+            sys.exit(1)
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save}.json")
+        with open(path, "w") as f:
+            json.dump({
+                "meta": dict(run_meta(args), date=time.strftime("%Y-%m-%d %H:%M:%S")),
+                "results": results,
+            }, f, indent=2)
+        print(f"✅ Baseline saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
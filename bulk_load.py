@@ -0,0 +1,177 @@
+"""Load a preprocessing grid (CSV or GeoParquet) into the `testing_shapes` table.
+
+Usage:
+    python bulk_load.py "Preprocessing data and scripts/delhi_grid_landcover_lighting_uhi_no2.csv"
+    python bulk_load.py grid.parquet --chunk-rows 20000
+    python bulk_load.py grid.csv --no-refresh   # only replace testing_shapes
+
+Rows are streamed into a temporary staging table with `COPY` in chunks
+(never holding the whole file in memory), and the polygons are built by
+PostGIS (ST_GeomFromGeoJSON / ST_GeomFromWKB), not in Python. The new table
+gets its primary key, GiST index and ANALYZE only once all rows are in.
+
+The `precompute.py refresh` steps that depend on the grid gids are built
+from `testing_shapes_new` into their own `_new` tables, so the long
+transaction never locks a live table. precompute.run's short final
+transaction then renames testing_shapes_new and the derived tables into
+place together: the API keeps serving the old grid until that COMMIT, then
+sees the new grid and its lookup tables at once.
+"""
+import argparse
+import csv
+import io
+import math
+import os
+import sys
+
+import precompute
+from grid_store import GRID_SRID
+
+GRID_TABLE = precompute.GRID_TABLE
+NEW_TABLE = f"{GRID_TABLE}_new"
+
+# testing_shapes first, then precompute's derived tables, in the same transaction
+SWAPS = precompute.SWAPS
+
+# Grid file column -> testing_shapes column (the shapefile-truncated names the API reads)
+COLUMNS = {
+    "landcover_class": "landcover_",
+    "landcover_name": "landcove_1",
+    "lighting_radiance": "lighting_r",
+    "lst_celsius": "lst_celsiu",
+    "uhi_intensity": "uhi_intens",
+    "no2": "no2",
+    "flood_fraction": "flood_frac",
+}
+
+STAGING_SQL = """
+    CREATE TEMP TABLE grid_load_raw (
+        gid integer,
+        landcover_ integer,
+        landcove_1 text,
+        lighting_r double precision,
+        lst_celsiu double precision,
+        uhi_intens double precision,
+        no2 double precision,
+        flood_frac double precision,
+        geom_src text
+    ) ON COMMIT DROP;
+"""
+
+COPY_SQL = "COPY grid_load_raw FROM STDIN WITH (FORMAT csv)"
+
+TABLE_SQL = f"""
+    CREATE TABLE {NEW_TABLE} (
+        gid integer NOT NULL,
+        landcover_ integer,
+        landcove_1 varchar(32),
+        lighting_r double precision,
+        lst_celsiu double precision,
+        uhi_intens double precision,
+        no2 double precision,
+        flood_frac double precision,
+        ps_dist_m double precision,
+        geom geometry(MultiPolygon, {GRID_SRID})
+    );
+"""
+
+GEOMETRY_SQL = {
+    "geojson": f"ST_Multi(ST_SetSRID(ST_GeomFromGeoJSON(geom_src), {GRID_SRID}))",
+    "wkb": f"ST_Multi(ST_GeomFromWKB(decode(geom_src, 'hex'), {GRID_SRID}))",
+}
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _value(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value
+
+
+def csv_rows(path):
+    """(gid, mapped columns..., GeoJSON text) per CSV row; gid is the 1-based row number."""
+    with open(path, newline="", encoding="utf-8") as f:
+        for gid, r in enumerate(csv.DictReader(f), start=1):
+            yield [gid] + [r.get(col) or None for col in COLUMNS] + [r.get("geometry") or None]
+
+
+def parquet_rows(path, chunk_rows):
+    """Same as csv_rows for a GeoParquet file written by grid_io (WKB as hex)."""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Preprocessing data and scripts"))
+    from grid_io import pq
+
+    if pq is None:
+        sys.exit("pyarrow is not installed; load the CSV instead")
+    parquet = pq.ParquetFile(path, memory_map=True)
+    present = [c for c in list(COLUMNS) + ["geometry"] if c in parquet.schema_arrow.names]
+    gid = 0
+    for batch in parquet.iter_batches(batch_size=chunk_rows, columns=present):
+        data = batch.to_pydict()
+        for i in range(batch.num_rows):
+            gid += 1
+            geom = data["geometry"][i] if "geometry" in data else None
+            yield ([gid] + [_value(data[c][i]) if c in data else None for c in COLUMNS]
+                   + [geom.hex() if geom is not None else None])
+
+
+def load_step(path, chunk_rows):
+    """Build `testing_shapes_new` from `path`: COPY chunks, geometry, indexes, ANALYZE."""
+    geometry_format = "wkb" if path.endswith(".parquet") else "geojson"
+    rows = parquet_rows(path, chunk_rows) if geometry_format == "wkb" else csv_rows(path)
+
+    def step(cur):
+        cur.execute(STAGING_SQL)
+        total = 0
+        for chunk in _chunks(rows, chunk_rows):
+            buf = io.StringIO()
+            csv.writer(buf).writerows(chunk)
+            buf.seek(0)
+            cur.copy_expert(COPY_SQL, buf)
+            total += len(chunk)
+
+        cur.execute(f"DROP TABLE IF EXISTS {NEW_TABLE};")
+        cur.execute(TABLE_SQL)
+        cur.execute(f"""
+            INSERT INTO {NEW_TABLE}
+                (gid, landcover_, landcove_1, lighting_r, lst_celsiu, uhi_intens, no2, flood_frac, geom)
+            SELECT gid, landcover_, landcove_1, lighting_r, lst_celsiu, uhi_intens, no2, flood_frac,
+                   {GEOMETRY_SQL[geometry_format]}
+            FROM grid_load_raw
+            WHERE geom_src IS NOT NULL;
+        """)
+        loaded = cur.rowcount
+        precompute.index_grid(cur, NEW_TABLE)
+        skipped = total - loaded
+        return f"{loaded} cells" + (f" ({skipped} rows without geometry skipped)" if skipped else "")
+
+    return step
+
+
+def load_steps(path, chunk_rows, refresh=True):
+    """precompute.run steps: load testing_shapes_new, then (optionally) derive tables from it."""
+    steps = [("load", load_step(path, chunk_rows))]
+    if refresh:
+        steps += precompute.refresh_steps(NEW_TABLE)
+    return steps
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load a grid CSV/GeoParquet into testing_shapes.")
+    parser.add_argument("path")
+    parser.add_argument("--chunk-rows", type=int, default=5000, help="rows per COPY (default 5000)")
+    parser.add_argument("--no-refresh", action="store_true",
+                        help="do not rebuild district_grid, ps_dist_m and the other derived tables")
+    args = parser.parse_args()
+
+    refresh = not args.no_refresh
+    precompute.run(load_steps(args.path, args.chunk_rows, refresh), SWAPS if refresh else SWAPS[:1])
@@ -0,0 +1,168 @@
+"""Compact, columnar encoding of the district payload (opt-in).
+
+The default `/get_district_data` response is a list of row dicts, each
+repeating every key and a full GeoJSON polygon. The compact form is:
+
+    {
+      "format": "columnar-v1",
+      "count": n,
+      "columns": {"gid": [...], "lighting_r": [...], "landcove_1": [codes], ...},
+      "dictionaries": {"landcove_1": ["Crops", "Trees", ...]},
+      "geometry": {
+        "encoding": "bbox-delta",
+        "scale": 1000000,
+        "bbox": [dminx, dminy, dmaxx, dmaxy, ...],   # 4 ints per row
+        "polygons": {"17": {...GeoJSON...}}          # rows that are not rectangles
+      },
+      "police_stations": [...]
+    }
+
+Grid cells are axis-aligned rectangles, so each is sent as a bbox quantized
+to 1e-6 degrees and delta-encoded against the previous row; decode with a
+running sum and divide by `scale`. Rows whose geometry is not a rectangle
+get a 0 0 0 0 delta and their GeoJSON in `polygons`.
+
+It is served as JSON or, if `msgpack` is installed, MessagePack, and
+compressed with brotli (if installed) or gzip when the client accepts it.
+"""
+import gzip
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed for format=msgpack
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is used instead
+    brotli = None
+
+FORMAT_NAME = "columnar-v1"
+SCALE = 1_000_000
+
+COMPACT_JSON_MIMETYPE = "application/vnd.usp.columnar+json"
+MSGPACK_MIMETYPE = "application/x-msgpack"
+
+# Columns sent as dictionary codes instead of repeated strings
+DICTIONARY_COLUMNS = ("landcove_1", "location_name")
+SKIP_COLUMNS = ("geometry",)
+
+
+def _number(value):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def rectangle_bbox(geom):
+    """(minx, miny, maxx, maxy) if `geom` is a single axis-aligned rectangle, else None."""
+    if not geom:
+        return None
+    coords = geom.get("coordinates")
+    if geom.get("type") == "MultiPolygon":
+        if not coords or len(coords) != 1:
+            return None
+        coords = coords[0]
+    elif geom.get("type") != "Polygon":
+        return None
+    if not coords or len(coords) != 1:
+        return None
+    ring = coords[0]
+    if len(ring) not in (4, 5):
+        return None
+    xs = [p[0] for p in ring]
+    ys = [p[1] for p in ring]
+    minx, maxx, miny, maxy = min(xs), max(xs), min(ys), max(ys)
+    for x, y in ring:
+        if x not in (minx, maxx) or y not in (miny, maxy):
+            return None
+    return minx, miny, maxx, maxy
+
+
+def encode_geometry(geometries):
+    deltas = []
+    polygons = {}
+    prev = [0, 0, 0, 0]
+    for i, geom in enumerate(geometries):
+        bbox = rectangle_bbox(geom)
+        if bbox is None:
+            polygons[str(i)] = geom
+            deltas.extend((0, 0, 0, 0))
+            continue
+        q = [round(v * SCALE) for v in bbox]
+        deltas.extend(q[k] - prev[k] for k in range(4))
+        prev = q
+    return {"encoding": "bbox-delta", "scale": SCALE, "bbox": deltas, "polygons": polygons}
+
+
+def to_columnar(grid_rows):
+    """Row dicts (as from RealDictCursor) -> columnar dict with encoded geometry."""
+    keys = [k for k in (grid_rows[0].keys() if grid_rows else []) if k not in SKIP_COLUMNS]
+    columns = {}
+    dictionaries = {}
+    for key in keys:
+        values = [r.get(key) for r in grid_rows]
+        if key in DICTIONARY_COLUMNS:
+            vocab = {}
+            codes = [None if v is None else vocab.setdefault(v, len(vocab)) for v in values]
+            dictionaries[key] = list(vocab)
+            columns[key] = codes
+        elif key == "gid":
+            columns[key] = values
+        else:
+            columns[key] = [_number(v) for v in values]
+    return {
+        "format": FORMAT_NAME,
+        "count": len(grid_rows),
+        "columns": columns,
+        "dictionaries": dictionaries,
+        "geometry": encode_geometry([r.get("geometry") for r in grid_rows]),
+    }
+
+
+def _names(accept, mimetype):
+    """True if the Accept header lists `mimetype` itself (not via a wildcard) with q > 0."""
+    return any(value == mimetype and quality > 0 for value, quality in accept)
+
+
+def negotiate(args, accept_mimetypes):
+    """Pick 'json', 'compact' or 'msgpack' from ?format= or the Accept header (werkzeug Accept)."""
+    fmt = (args.get("format") or "").lower()
+    if fmt == "msgpack" and msgpack is None:
+        fmt = "compact"
+    if fmt in ("json", "compact", "msgpack"):
+        return fmt
+    if msgpack is not None and (_names(accept_mimetypes, "application/x-msgpack")
+                                or _names(accept_mimetypes, "application/msgpack")):
+        return "msgpack"
+    if _names(accept_mimetypes, COMPACT_JSON_MIMETYPE):
+        return "compact"
+    return "json"
+
+
+def choose_encoding(accept_encodings):
+    """Best of br/gzip by the client's quality values (werkzeug Accept), or None.
+
+    br wins ties; `br;q=0` or `gzip;q=0` rules that encoding out.
+    """
+    options = (["br"] if brotli is not None else []) + ["gzip"]
+    best = max(options, key=lambda e: accept_encodings[e])
+    return best if accept_encodings[best] > 0 else None
+
+
+def serialize(payload, fmt, json_dumps):
+    """Encode `payload` as bytes; returns (body, mimetype)."""
+    if fmt == "msgpack":
+        return msgpack.packb(payload, use_bin_type=True, default=str), MSGPACK_MIMETYPE
+    return json_dumps(payload).encode("utf-8"), COMPACT_JSON_MIMETYPE
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
@@ -1,24 +1,93 @@
-from flask import Flask, request, jsonify, render_template_string, send_from_directory
-import json
+from flask import Flask, Response, request, jsonify, render_template_string, send_from_directory, stream_with_context
+import logging
 import psycopg2
-import psycopg2.extras
+import psycopg2.errors
 from flask_cors import CORS
+import math
 import os
 import random
 
+import app_logging
+import compact_format
+import db_pool
+import district_stats
+import ranking
+import response_cache
+import scoring
+import tiles
+from grid_store import (BBOX_FIELDS, PYRAMID_LEVELS, GridStore, bbox_rows, district_query, district_rows,
+                        has_added_columns, has_district_grid, valid_level, without_added_columns)
+from response_cache import normalize_name
+
+log = logging.getLogger("usp.api")
+
 app = Flask(__name__, static_folder='frontend/build', static_url_path='')
 CORS(app)
+app_logging.init_app(app)
+
+# Database connections come from a per-process pool; each request checks one
+# out on first use and the teardown hook returns it (see db_pool.py).
+# Pooled connections use autocommit to avoid "InFailedSqlTransaction".
+db_pool.init_app(app)
+
+# Serialized district payloads, keyed by district name + data version
+district_cache = response_cache.ResponseCache(shared=response_cache.shared_tier_from_env())
+# Columnar copies of district grids for scoring, versioned with district_cache
+grid_store = GridStore(district_cache)
+# Vector tiles of the grid layer, see tiles.py
+tile_cache = tiles.make_cache()
+
+# Page size limits for /grid
+GRID_PAGE_DEFAULT = int(os.environ.get("GRID_PAGE_DEFAULT", 1000))
+GRID_PAGE_MAX = int(os.environ.get("GRID_PAGE_MAX", 5000))
+# Bytes buffered before each chunk of a streamed response is sent
+STREAM_CHUNK_BYTES = int(os.environ.get("STREAM_CHUNK_BYTES", 64 * 1024))
+STREAM_MIMETYPES = {'ndjson': 'application/x-ndjson', 'json': 'application/json'}
+# Points per /cells_at request
+CELLS_AT_MAX = int(os.environ.get("CELLS_AT_MAX", 10000))
+# Largest k for /rank
+RANK_K_MAX = int(os.environ.get("RANK_K_MAX", 1000))
+
+
+def cached_response(entry, mimetype='application/json'):
+    """Send a cached (body, etag) pair, or 304 if the client already has it."""
+    body, etag = entry
+    response = Response(body, mimetype=mimetype)
+    # make_etag() quotes the hash; Werkzeug keeps ETags unquoted
+    response.set_etag(etag.strip('"'))
+    return response.make_conditional(request)
+
+
+def parse_bbox(value):
+    """(minx, miny, maxx, maxy) from "minx,miny,maxx,maxy", or None if invalid."""
+    try:
+        minx, miny, maxx, maxy = (float(v) for v in (value or "").split(","))
+    except ValueError:
+        return None
+    if not (minx < maxx and miny < maxy):
+        return None
+    return minx, miny, maxx, maxy
 
-# Database connection
-conn = psycopg2.connect(
-    dbname="db_test",
-    user="postgres",
-    password="postgres",
-    host="localhost",
-    port="5432"
-)
-# Use autocommit to avoid long-running transactions causing "InFailedSqlTransaction"
-conn.autocommit = True
+
+def parse_weights(value):
+    """scoring.DEFAULT_WEIGHTS overridden by a {factor: number} object, or None if invalid."""
+    if value is None:
+        return dict(scoring.DEFAULT_WEIGHTS)
+    if not isinstance(value, dict):
+        return None
+    for w in value.values():
+        if isinstance(w, bool) or not isinstance(w, (int, float)) or not math.isfinite(w):
+            return None
+    return dict(scoring.DEFAULT_WEIGHTS, **value)
+
+
+def parse_level(value):
+    """Grid pyramid level from a request value (0 = finest), or None if invalid."""
+    try:
+        level = int(value or 0)
+    except (TypeError, ValueError):
+        return None
+    return level if valid_level(level) else None
 
 # Endpoint to get local names for coordinates
 @app.route("/get_local_names", methods=["POST"])
@@ -92,127 +161,439 @@ def index():
         return render_template_string(f.read())
 
 
+def district_cache_key(district, fmt='json', encoding=None, level=0):
+    return district_cache.key(district, f"{fmt}:{encoding or ''}:{level}")
+
+
+def build_district_payload(district, level=0):
+    cur = db_pool.cursor()
+    district_rows(cur, normalize_name(district), level=level)
+    grid_rows = cur.fetchall()
+
+    # Stations are loaded and their coordinates decoded once per data version
+    police_stations = grid_store.police_stations(db_pool.cursor)
+
+    log.debug("district %r: %d grid rows, %d police stations", district, len(grid_rows), len(police_stations))
+    return {
+        'grids': grid_rows,
+        'police_stations': police_stations
+    }
+
+
+def stream_district(district, level, mode):
+    """Generator of response chunks for a district, read through a server-side cursor.
+
+    `mode` "json" writes the usual {"grids": [...], "police_stations": [...]}
+    document incrementally; "ndjson" writes one grid row per line. The first
+    (empty) chunk comes out once the query has been declared, so callers can
+    prime the generator and still turn query errors into a status code.
+    """
+    dumps = lambda o: app.json.dumps(o, separators=(',', ':'))
+    police_stations = grid_store.police_stations(db_pool.cursor) if mode == 'json' else None
+    mapped = bool(level) or has_district_grid(db_pool.cursor())
+    sql, params = district_query(normalize_name(district), level=level, mapped=mapped)
+    # A failed query would abort the streaming transaction, so check the columns up front
+    if not level and not has_added_columns(db_pool.cursor()):
+        sql = without_added_columns(sql)
+
+    with db_pool.streaming_cursor() as cur:
+        cur.execute(sql, params)
+        yield b''
+        buf, size, count = [], 0, 0
+        if mode == 'json':
+            buf.append('{"grids":[')
+        for row in cur:
+            line = dumps(row)
+            if mode == 'ndjson':
+                line += '\n'
+            elif count:
+                line = ',' + line
+            buf.append(line)
+            size += len(line)
+            count += 1
+            if size >= STREAM_CHUNK_BYTES:
+                yield ''.join(buf).encode('utf-8')
+                buf, size = [], 0
+        if mode == 'json':
+            buf.append('],"police_stations":' + dumps(police_stations) + '}')
+        if buf:
+            yield ''.join(buf).encode('utf-8')
+    log.debug("district %r: streamed %d grid rows", district, count)
+
+
 @app.route("/get_district_data")
 def get_district_data():
-    import traceback
+    """Grid cells and police stations for a district.
+
+    Plain row-oriented JSON by default. `?format=compact` (or Accept:
+    application/vnd.usp.columnar+json) returns the columnar encoding from
+    compact_format.py, `?format=msgpack` the same as MessagePack; those are
+    gzip/brotli-compressed when the client accepts it.
+
+    `?level=k` (1..GRID_PYRAMID_LEVELS) returns the precomputed quadtree
+    rollup of 2^k x 2^k cells instead of the finest grid.
+
+    `?stream=json` sends the plain JSON document as it is read from a
+    server-side cursor (chunked, not cached), `?stream=ndjson` one grid row
+    per line without the police stations; memory stays flat and the first
+    bytes go out before the query has finished.
+    """
     district = request.args.get("district")
     if not district:
         return jsonify({"error": "No district provided"}), 400
+    level = parse_level(request.args.get("level"))
+    if level is None:
+        return jsonify({"error": f"level must be an integer from 0 to {PYRAMID_LEVELS}"}), 400
+
+    stream = request.args.get("stream")
+    if stream:
+        if stream not in STREAM_MIMETYPES:
+            return jsonify({"error": "stream must be one of: " + ", ".join(STREAM_MIMETYPES)}), 400
+        chunks = stream_district(district, level, stream)
+        try:
+            next(chunks)
+        except db_pool.PoolExhausted as e:
+            return jsonify({'error': 'database busy', 'message': str(e)}), 503
+        except Exception as e:
+            if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+                db_pool.mark_broken()
+            log.exception("get_district_data stream failed for %r", district)
+            return jsonify({'error': 'internal server error', 'message': str(e)}), 500
+        # The request context (and its connection) stays alive until the last chunk
+        return Response(stream_with_context(chunks), mimetype=STREAM_MIMETYPES[stream])
+
+    fmt = compact_format.negotiate(request.args, request.accept_mimetypes)
+    encoding = compact_format.choose_encoding(request.accept_encodings) if fmt != 'json' else None
+    cache_key = district_cache_key(district, fmt, encoding, level)
+    entry = district_cache.get(cache_key)
 
     try:
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        # Get grid data as before
-        cur.execute("""
-            WITH locations AS (
-                SELECT gid, name_1 AS name, geom FROM gadm41_ind_1
-                UNION ALL
-                SELECT gid, name_2 AS name, geom FROM gadm41_ind_2
-                UNION ALL
-                SELECT gid, name_3 AS name, geom FROM gadm41_ind_3
-            )
-            SELECT 
-                w.gid,
-                w.landcove_1,
-                w.landcover_,
-                w.lighting_r,
-                w.uhi_intens,
-                w.lst_celsiu,
-                w.no2,
-                ST_AsGeoJSON(w.geom)::json AS geometry,
-                l.name AS location_name
-            FROM testing_shapes w
-            JOIN locations l
-              ON ST_Intersects(w.geom, l.geom)
-            WHERE LOWER(l.name) = LOWER(%s);
-        """, (district,))
-        grid_rows = cur.fetchall()
-
-        # Get all police station data for Delhi (no district filter)
-        # Return lon/lat from the geometry column if available (transform to WGS84)
-        # Avoid calling ST_Transform on geometries with unknown SRID (SRID = 0)
-        cur.execute("""
-            SELECT name, district, x, y,
-                   CASE WHEN ST_SRID(geom) = 0 THEN NULL ELSE ST_X(ST_Transform(geom, 4326)) END AS lon,
-                   CASE WHEN ST_SRID(geom) = 0 THEN NULL ELSE ST_Y(ST_Transform(geom, 4326)) END AS lat
-            FROM ps_location_ascii;
-        """)
-        ps_rows = cur.fetchall()
-
-        print(f"✅ Query for district '{district}' returned {len(grid_rows)} grid rows and {len(ps_rows)} police stations", flush=True)
-        print("Police station raw rows:", flush=True)
-        for ps in ps_rows:
-            print(ps, flush=True)
-
-        # Format police station coordinates as [lng, lat] (convert x/y if needed)
-        import re
-        def parse_coord_str(coord_str):
-            if isinstance(coord_str, (float, int)):
-                return float(coord_str)
-            m = re.match(r"[\d]+\s+(\d+)\s+([\d\.]+)\s*([NSEW])", coord_str)
-            if not m:
-                return None
-            deg = float(m.group(1))
-            minu = float(m.group(2))
-            dir = m.group(3)
-            val = deg + minu / 60.0
-            if dir in ['S', 'W']:
-                val = -val
-            return val
-
-        def parse_coords(x, y):
-            lng = parse_coord_str(x)
-            lat = parse_coord_str(y)
-            return {'x': lng, 'y': lat}
-
-        police_stations = []
-        for row in ps_rows:
-            lon = row.get('lon') if isinstance(row, dict) else None
-            lat = row.get('lat') if isinstance(row, dict) else None
-            if lon is not None and lat is not None:
-                coords = {'x': float(lon), 'y': float(lat)}
+        if entry is None:
+            out = build_district_payload(district, level)
+            if fmt == 'json':
+                entry = district_cache.set(cache_key, app.json.dumps(out).encode('utf-8'))
             else:
-                coords = parse_coords(row['x'], row['y'])
-            police_stations.append({
-                'name': row['name'],
-                'district': row['district'],
-                'coords': coords
-            })
-
-        # If there are few or no police stations, append believable mock points
-        # so the frontend can render markers for testing/visualization.
-        # Use a bounding box around Delhi for mock points.
-        try:
-            min_lng, max_lng = 76.90, 77.35
-            min_lat, max_lat = 28.40, 28.90
-            desired_total = 50
-            existing = len([p for p in police_stations if p.get('coords') and isinstance(p['coords'].get('x'), (int, float))])
-            to_add = max(0, desired_total - existing)
-            for i in range(to_add):
-                lng = random.uniform(min_lng, max_lng)
-                lat = random.uniform(min_lat, max_lat)
-                police_stations.append({
-                    'name': f'PS MOCK {i+1}',
-                    'district': 'MOCK',
-                    'coords': {'x': lng, 'y': lat}
-                })
-            if to_add > 0:
-                print(f'Appended {to_add} mock police station points for visualization', flush=True)
-        except Exception:
-            pass
-
-        out = {
-            'grids': grid_rows,
-            'police_stations': police_stations
-        }
+                compact = compact_format.to_columnar(out['grids'])
+                compact['police_stations'] = out['police_stations']
+                body, _ = compact_format.serialize(
+                    compact, fmt, lambda o: app.json.dumps(o, separators=(',', ':')))
+                entry = district_cache.set(cache_key, compact_format.compress(body, encoding))
+    except db_pool.PoolExhausted as e:
+        return jsonify({'error': 'database busy', 'message': str(e)}), 503
+    except Exception as e:
+        if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+            db_pool.mark_broken()
+        log.exception("get_district_data failed for %r", district)
+        return jsonify({'error': 'internal server error', 'message': str(e)}), 500
+
+    mimetype = {'msgpack': compact_format.MSGPACK_MIMETYPE,
+                'compact': compact_format.COMPACT_JSON_MIMETYPE}.get(fmt, 'application/json')
+    response = cached_response(entry, mimetype)
+    if encoding and response.status_code == 200:
+        response.headers['Content-Encoding'] = encoding
+    # Every variant, the default JSON included, depends on both headers
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    return response
+
+@app.route("/grid")
+def grid_bbox():
+    """Grid cells whose bounding box overlaps `bbox`, for the visible map area.
+
+    Query parameters:
+        bbox      minx,miny,maxx,maxy in lon/lat (required)
+        fields    comma-separated columns (default: all; gid is always sent)
+        level     grid pyramid level, as in /get_district_data
+        simplify  geometry simplification tolerance in degrees (default 0 = off)
+        limit     page size (default GRID_PAGE_DEFAULT, at most GRID_PAGE_MAX)
+        after     gid to continue from (`next_after` of the previous page)
+
+    Response: {"cells": [...], "count": n, "next_after": gid or null}
+    """
+    bbox = parse_bbox(request.args.get("bbox"))
+    if bbox is None:
+        return jsonify({"error": "bbox must be minx,miny,maxx,maxy with min < max"}), 400
+    fields = [f for f in (request.args.get("fields") or ",".join(BBOX_FIELDS)).split(",") if f]
+    unknown = [f for f in fields if f != "gid" and f not in BBOX_FIELDS]
+    if unknown:
+        return jsonify({"error": f"unknown fields: {', '.join(unknown)}", "fields": ["gid", *BBOX_FIELDS]}), 400
+    level = parse_level(request.args.get("level"))
+    if level is None:
+        return jsonify({"error": f"level must be an integer from 0 to {PYRAMID_LEVELS}"}), 400
+    try:
+        simplify = max(0.0, float(request.args.get("simplify") or 0))
+        limit = min(GRID_PAGE_MAX, max(1, int(request.args.get("limit") or GRID_PAGE_DEFAULT)))
+        after = int(request.args.get("after") or 0)
+    except ValueError:
+        return jsonify({"error": "simplify, limit and after must be numbers"}), 400
+
+    try:
+        cur = db_pool.cursor()
+        # One extra row tells whether another page follows
+        bbox_rows(cur, bbox, fields, level=level, simplify=simplify, after=after, limit=limit + 1)
+        rows = cur.fetchall()
+    except psycopg2.errors.UndefinedTable:
+        if level:
+            return jsonify({'error': 'grid_pyramid has not been built; run python precompute.py build'}), 503
+        return jsonify({'error': 'testing_shapes has not been loaded; run python bulk_load.py <grid.csv>'}), 503
+    except db_pool.PoolExhausted as e:
+        return jsonify({'error': 'database busy', 'message': str(e)}), 503
+    except Exception as e:
+        if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+            db_pool.mark_broken()
+        log.exception("grid query failed for bbox %r", bbox)
+        return jsonify({'error': 'internal server error', 'message': str(e)}), 500
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify({
+        'cells': rows,
+        'count': len(rows),
+        'next_after': rows[-1]['gid'] if more else None,
+    })
+
+@app.route("/district_stats")
+def get_district_stats():
+    """Dashboard summary for a district, or for every district without `?district=`.
+
+    Averages (lighting_r, lst_celsiu, no2, uhi_intens over positive values),
+    priority cell counts and health (mean overall score x 100 under the
+    default weights) come from the `district_stats` table built by
+    precompute.py; see district_stats.py.
+
+    Response: {"district", "cells", "avg_lighting", ..., "health"} or
+    {"districts": [{"district", ...}, ...]}
+    """
+    district = request.args.get("district")
+    cache_key = district_cache.key(district or "*", "stats")
+    entry = district_cache.get(cache_key)
+    if entry is None:
         try:
-            print('Sending police_stations (sample 5):', json.dumps(police_stations[:5], default=str), flush=True)
-        except Exception:
-            print('Could not JSON-encode police_stations for debug output', flush=True)
-        return jsonify(out)
+            rows = district_stats.fetch_stats(db_pool.cursor(), normalize_name(district) if district else None)
+            if rows is None and district:
+                # Table not built yet: summarize the district's cached columns
+                grid = grid_store.get(db_pool.cursor, district)
+                index = grid_store.station_index(db_pool.cursor)
+                scores = scoring.overall_scores(grid, scoring.DEFAULT_WEIGHTS, index)
+                rows = [dict(district_stats.summarize(grid, scores), name=grid.location_name)] if len(grid) else []
+            elif rows is None:
+                return jsonify({'error': 'district_stats has not been built; run python precompute.py refresh'}), 503
+        except db_pool.PoolExhausted as e:
+            return jsonify({'error': 'database busy', 'message': str(e)}), 503
+        except Exception as e:
+            if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+                db_pool.mark_broken()
+            log.exception("district_stats failed for %r", district)
+            return jsonify({'error': 'internal server error', 'message': str(e)}), 500
+
+        records = [dict({k: v for k, v in r.items() if k != 'name'}, district=r['name']) for r in rows]
+        if district and not records:
+            return jsonify({'error': f'unknown district {district!r}'}), 404
+        out = records[0] if district else {'districts': records}
+        entry = district_cache.set(cache_key, app.json.dumps(out).encode('utf-8'))
+    return cached_response(entry)
+
+def load_regular_grid():
+    """(RegularGrid, None), or (None, error response) if it cannot be loaded."""
+    try:
+        return grid_store.regular_grid(db_pool.cursor), None
+    except psycopg2.errors.UndefinedTable:
+        return None, (jsonify({'error': 'grid_spec has not been built; run python precompute.py build'}), 503)
+    except db_pool.PoolExhausted as e:
+        return None, (jsonify({'error': 'database busy', 'message': str(e)}), 503)
+    except Exception as e:
+        if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+            db_pool.mark_broken()
+        log.exception("loading the regular grid failed")
+        return None, (jsonify({'error': 'internal server error', 'message': str(e)}), 500)
+
+@app.route("/grid_spec")
+def grid_spec():
+    """Origin, cell size and dimensions of the fishnet; cell (row, col) spans
+    origin + (col, row) * cell_size to origin + (col + 1, row + 1) * cell_size."""
+    grid, error = load_regular_grid()
+    if error:
+        return error
+    return jsonify(grid.spec())
+
+@app.route("/cell_at")
+def cell_at():
+    """The grid cell under a point: ?lng=77.2&lat=28.6 -> its attributes and polygon."""
+    try:
+        lng = float(request.args["lng"])
+        lat = float(request.args["lat"])
+    except (KeyError, ValueError):
+        return jsonify({'error': 'lng and lat must be numbers'}), 400
+    grid, error = load_regular_grid()
+    if error:
+        return error
+    cell = grid.lookup([lng], [lat], geometry=True)[0]
+    if cell is None:
+        return jsonify({'error': f'no grid cell at ({lng}, {lat})'}), 404
+    return jsonify(cell)
+
+@app.route("/cells_at", methods=["POST"])
+def cells_at():
+    """Batch /cell_at: {"points": [[lng, lat], ...], "geometry": false}.
+
+    Response: {"cells": [cell or null, ...]} in the order of the points.
+    """
+    data = request.get_json(silent=True) or {}
+    points = data.get("points")
+    if not isinstance(points, list) or not points:
+        return jsonify({'error': 'points must be a non-empty list of [lng, lat]'}), 400
+    if len(points) > CELLS_AT_MAX:
+        return jsonify({'error': f'at most {CELLS_AT_MAX} points per request'}), 400
+    try:
+        lng, lat = zip(*((float(p[0]), float(p[1])) for p in points))
+    except (TypeError, ValueError, IndexError):
+        return jsonify({'error': 'points must be a non-empty list of [lng, lat]'}), 400
+    grid, error = load_regular_grid()
+    if error:
+        return error
+    return jsonify({'cells': grid.lookup(lng, lat, geometry=bool(data.get("geometry")))})
+
+@app.route("/db_stats")
+def db_stats():
+    """Connection pool status plus pool-wait and query-latency counters."""
+    return jsonify({
+        'pool': db_pool.get_pool().status(),
+        'metrics': db_pool.metrics.snapshot()
+    })
+
+@app.route("/score", methods=["POST"])
+def score():
+    """Overall score for every grid cell of a district under the given weights.
+
+    Body: {"district": "Delhi", "weights": {"lighting_r": 0.18, ...}, "level": 0}
+    Missing weights fall back to scoring.DEFAULT_WEIGHTS; `level` picks a
+    grid pyramid level as in /get_district_data.
+
+    Response: {"district", "count", "health", "scores": {gid: score}}
+    (`health` as in /district_stats, under these weights)
+    """
+    data = request.get_json(silent=True) or {}
+    district = data.get("district")
+    if not district:
+        return jsonify({"error": "No district provided"}), 400
+    level = parse_level(data.get("level"))
+    if level is None:
+        return jsonify({"error": f"level must be an integer from 0 to {PYRAMID_LEVELS}"}), 400
+    weights = parse_weights(data.get("weights"))
+    if weights is None:
+        return jsonify({"error": "weights must be an object of {factor: number}"}), 400
+    try:
+        grid = grid_store.get(db_pool.cursor, district, level)
+        scores = scoring.overall_scores(grid, weights, grid_store.station_index(db_pool.cursor))
+    except db_pool.PoolExhausted as e:
+        return jsonify({'error': 'database busy', 'message': str(e)}), 503
     except Exception as e:
-        print('Error in get_district_data:', flush=True)
-        traceback.print_exc()
+        if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+            db_pool.mark_broken()
+        log.exception("score failed for %r", district)
         return jsonify({'error': 'internal server error', 'message': str(e)}), 500
+    return jsonify({
+        'district': district,
+        'count': len(grid),
+        'health': scoring.district_health(scores),
+        'scores': {str(g): round(float(v), 6) for g, v in zip(grid.gid.tolist(), scores)}
+    })
+
+@app.route("/rank", methods=["POST"])
+def rank():
+    """Best or worst scored cells across one, several or all districts.
+
+    Body: {"districts": ["Delhi", ...], "weights": {...}, "k": 10, "order": "top", "level": 0}
+    Leave out `districts` (or use "district": "Delhi") to rank the whole
+    grid; `order` is "top" (highest scores) or "bottom" (lowest). Weights
+    work as in /score; cells without any scored factor are not ranked.
+    `level` ranks the grid pyramid blocks of that level, as /score does.
+
+    Response: {"order", "k", "level", "districts", "candidates",
+               "cells": [{"gid", "score", "name", "lng", "lat"}, ...]}
+    (`name` is the most specific area containing the cell)
+    """
+    data = request.get_json(silent=True) or {}
+    districts = data.get("districts") or ([data["district"]] if data.get("district") else None)
+    if districts is not None and (not isinstance(districts, list)
+                                  or not all(isinstance(d, str) and d.strip() for d in districts)):
+        return jsonify({"error": "districts must be a list of names"}), 400
+    order = data.get("order", "top")
+    if order not in ranking.ORDERS:
+        return jsonify({"error": f"order must be one of {', '.join(ranking.ORDERS)}"}), 400
+    try:
+        k = int(data.get("k", 10))
+    except (TypeError, ValueError):
+        k = -1
+    if not 1 <= k <= RANK_K_MAX:
+        return jsonify({"error": f"k must be an integer from 1 to {RANK_K_MAX}"}), 400
+    level = parse_level(data.get("level"))
+    if level is None:
+        return jsonify({"error": f"level must be an integer from 0 to {PYRAMID_LEVELS}"}), 400
+    weights = parse_weights(data.get("weights"))
+    if weights is None:
+        return jsonify({"error": "weights must be an object of {factor: number}"}), 400
+    try:
+        index = grid_store.shared(f"rank_index:{level}", lambda: ranking.RankIndex.load(
+            db_pool.cursor(), grid_store.station_index(db_pool.cursor), level))
+        candidates, cells = index.rank(weights, k, order, districts)
+    except KeyError as e:
+        return jsonify({'error': f'unknown district {e.args[0]!r}'}), 404
+    except psycopg2.errors.UndefinedTable:
+        table = "grid_pyramid" if level else "district_grid"
+        return jsonify({'error': f'{table} has not been built; run python precompute.py build'}), 503
+    except db_pool.PoolExhausted as e:
+        return jsonify({'error': 'database busy', 'message': str(e)}), 503
+    except Exception as e:
+        if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+            db_pool.mark_broken()
+        log.exception("rank failed for %r", districts)
+        return jsonify({'error': 'internal server error', 'message': str(e)}), 500
+    return jsonify({
+        'order': order,
+        'k': k,
+        'level': level,
+        'districts': districts or '*',
+        'candidates': candidates,
+        'cells': cells,
+    })
+
+@app.route("/tiles/<int:z>/<int:x>/<int:y>.mvt")
+def grid_tile(z, x, y):
+    """Vector tile of grid cells (layer "grid") with the scoring attributes."""
+    if not tiles.valid_tile(z, x, y):
+        return jsonify({"error": "tile out of range"}), 404
+    cache_key = tile_cache.key("tiles", f"{z}/{x}/{y}")
+    entry = tile_cache.get(cache_key)
+    if entry is None:
+        try:
+            entry = tile_cache.set(cache_key, tiles.render_tile(db_pool.cursor(), z, x, y))
+        except psycopg2.errors.UndefinedTable:
+            # Zoomed-out tiles read grid_pyramid
+            return jsonify({'error': 'grid_pyramid has not been built; run python precompute.py build'}), 503
+        except psycopg2.errors.UndefinedFunction as e:
+            return jsonify({'error': 'vector tiles need PostGIS 3 or newer', 'message': str(e)}), 503
+        except db_pool.PoolExhausted as e:
+            return jsonify({'error': 'database busy', 'message': str(e)}), 503
+        except Exception as e:
+            if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+                db_pool.mark_broken()
+            log.exception("tile %d/%d/%d failed", z, x, y)
+            return jsonify({'error': 'internal server error', 'message': str(e)}), 500
+    if not entry[0]:
+        return Response(status=204)
+    return cached_response(entry, tiles.MVT_MIMETYPE)
+
+@app.route("/cache/invalidate", methods=["POST"])
+def invalidate_cache():
+    """Drop cached district payloads and tiles; call after loading new data."""
+    version = district_cache.invalidate()
+    tile_cache.invalidate()
+    return jsonify({'version': version})
+
+@app.route("/cache/stats")
+def cache_stats():
+    return jsonify({'district': district_cache.stats(), 'tiles': tile_cache.stats()})
 
 if __name__ == "__main__":
-    app.run(port=5000, debug=True)
+    app_logging.configure_logging()
+    app.run(port=5000, debug=os.environ.get("FLASK_DEBUG") == "1", threaded=True)
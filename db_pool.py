@@ -0,0 +1,303 @@
+"""Pooled PostgreSQL connections for the Flask API.
+
+Each request checks a connection out of a process-wide pool on first use
+(`get_conn()` / `cursor()`) and the app teardown hook hands it back. The pool
+is created lazily and re-created after a fork, so every worker of a
+multi-process WSGI server gets its own connections.
+
+Connection settings come from DB_NAME, DB_USER, DB_PASSWORD, DB_HOST and
+DB_PORT (defaults match the local development database).
+"""
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extras
+import psycopg2.pool
+from flask import g
+
+DB_SETTINGS = {
+    "dbname": os.environ.get("DB_NAME", "db_test"),
+    "user": os.environ.get("DB_USER", "postgres"),
+    "password": os.environ.get("DB_PASSWORD", "postgres"),
+    "host": os.environ.get("DB_HOST", "localhost"),
+    "port": os.environ.get("DB_PORT", "5432"),
+}
+
+POOL_MIN = int(os.environ.get("DB_POOL_MIN", 1))
+POOL_MAX = int(os.environ.get("DB_POOL_MAX", 10))
+# How long a request waits for a free connection before giving up (seconds)
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+# Connections idle for longer than this get a `SELECT 1` before being handed out
+HEALTH_CHECK_AFTER = float(os.environ.get("DB_HEALTH_CHECK_AFTER", 30))
+# Rows per round-trip for server-side (streaming) cursors
+STREAM_ITERSIZE = int(os.environ.get("DB_STREAM_ITERSIZE", 2000))
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class PoolMetrics:
+    """Running counters for pool waits and query latency (all times in ms)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.wait_total_ms = 0.0
+            self.wait_max_ms = 0.0
+            self.timeouts = 0
+            self.reconnects = 0
+            self.queries = 0
+            self.query_total_ms = 0.0
+            self.query_max_ms = 0.0
+            self.query_errors = 0
+
+    def record_wait(self, ms):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total_ms += ms
+            self.wait_max_ms = max(self.wait_max_ms, ms)
+
+    def record_query(self, ms, failed=False):
+        with self._lock:
+            self.queries += 1
+            self.query_total_ms += ms
+            self.query_max_ms = max(self.query_max_ms, ms)
+            if failed:
+                self.query_errors += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def record_reconnect(self):
+        with self._lock:
+            self.reconnects += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "wait_avg_ms": self.wait_total_ms / self.checkouts if self.checkouts else 0.0,
+                "wait_max_ms": self.wait_max_ms,
+                "timeouts": self.timeouts,
+                "reconnects": self.reconnects,
+                "queries": self.queries,
+                "query_avg_ms": self.query_total_ms / self.queries if self.queries else 0.0,
+                "query_max_ms": self.query_max_ms,
+                "query_errors": self.query_errors,
+            }
+
+
+metrics = PoolMetrics()
+
+
+class TimedCursor(psycopg2.extras.RealDictCursor):
+    """RealDictCursor that records how long each execute() takes."""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        failed = False
+        try:
+            return super().execute(query, vars)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            metrics.record_query((time.perf_counter() - start) * 1000.0, failed)
+
+
+class ConnectionPool:
+    """Bounded, blocking wrapper around psycopg2's ThreadedConnectionPool.
+
+    psycopg2 raises as soon as the pool is empty; here callers wait up to
+    `timeout` seconds for a connection instead, which is what we want when
+    more request threads than connections are running.
+    """
+
+    def __init__(self, minconn=POOL_MIN, maxconn=POOL_MAX, timeout=POOL_TIMEOUT, **settings):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.settings = settings or DB_SETTINGS
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        # Idle connection -> when it was returned; weak keys, so a closed and
+        # collected connection never lends its timestamp to a new one
+        self._idle_since = weakref.WeakKeyDictionary()
+        self._pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, **self.settings)
+        # Register the connections the pool opened up front as idle
+        warm = [self._pool.getconn() for _ in range(minconn)]
+        for conn in warm:
+            self._pool.putconn(conn)
+            self._idle_since[conn] = time.monotonic()
+
+    def getconn(self):
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            metrics.record_timeout()
+            raise PoolExhausted(f"no database connection available after {self.timeout}s")
+        metrics.record_wait((time.perf_counter() - start) * 1000.0)
+        try:
+            conn = self._pool.getconn()
+            with self._lock:
+                last = self._idle_since.pop(conn, None)
+            if not self._is_healthy(conn, last):
+                metrics.record_reconnect()
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+                with self._lock:
+                    self._idle_since.pop(conn, None)
+            conn.autocommit = True
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+        return conn
+
+    def putconn(self, conn, broken=False):
+        try:
+            self._pool.putconn(conn, close=broken or conn.closed != 0)
+            # psycopg2 closes connections beyond `minconn` instead of keeping them
+            if not conn.closed:
+                with self._lock:
+                    self._idle_since[conn] = time.monotonic()
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def _is_healthy(self, conn, last=None):
+        """False if `conn` is closed or, after HEALTH_CHECK_AFTER idle seconds, fails `SELECT 1`."""
+        if conn.closed:
+            return False
+        if last is not None and time.monotonic() - last < HEALTH_CHECK_AFTER:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def closeall(self):
+        self._pool.closeall()
+
+    def status(self):
+        with self._lock:
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "in_use": self._in_use,
+                "idle": sum(1 for conn in list(self._idle_since) if not conn.closed),
+            }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return this process's pool, creating it on first use (or after fork)."""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(POOL_MIN, POOL_MAX, **DB_SETTINGS)
+                _pool_pid = pid
+    return _pool
+
+
+def close_pool():
+    """Close this process's pool, e.g. in a server's master before forking workers."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = _pool_pid = None
+
+
+@contextmanager
+def connection():
+    """Check a connection out for the duration of a `with` block."""
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        pool.putconn(conn, broken=broken)
+
+
+def get_conn():
+    """Return the connection bound to the current request, checking one out if needed."""
+    if "db_conn" not in g:
+        g.db_conn = get_pool().getconn()
+        g.db_broken = False
+    return g.db_conn
+
+
+def cursor():
+    """Dict cursor on the request's connection that records query latency."""
+    return get_conn().cursor(cursor_factory=TimedCursor)
+
+
+@contextmanager
+def streaming_cursor(itersize=STREAM_ITERSIZE):
+    """Server-side (named) cursor on the request's connection.
+
+    Rows are fetched `itersize` at a time while iterating, so the full result
+    never sits in Python memory. Named cursors need a transaction, so the
+    connection leaves autocommit for the duration and is rolled back (it
+    only reads) before going back to autocommit.
+    """
+    conn = get_conn()
+    conn.autocommit = False
+    cur = conn.cursor(name="usp_stream", cursor_factory=TimedCursor)
+    cur.itersize = itersize
+    try:
+        yield cur
+    finally:
+        try:
+            if not cur.closed:
+                cur.close()
+            conn.rollback()
+            conn.autocommit = True
+        except psycopg2.Error:
+            mark_broken()
+
+
+def mark_broken():
+    """Flag the request's connection so it is closed rather than reused."""
+    if "db_conn" in g:
+        g.db_broken = True
+
+
+def release_conn(exc=None):
+    """Teardown hook: return the request's connection to the pool."""
+    conn = g.pop("db_conn", None)
+    if conn is None:
+        return
+    broken = g.pop("db_broken", False) or isinstance(
+        exc, (psycopg2.OperationalError, psycopg2.InterfaceError)
+    )
+    get_pool().putconn(conn, broken=broken)
+
+
+def init_app(app):
+    app.teardown_appcontext(release_conn)
@@ -0,0 +1,125 @@
+"""Per-district summary statistics for the dashboard's stats panel.
+
+One small record per district: average lighting, LST, NO2 and UHI (over
+cells where the value is present and positive), the number of priority
+cells (UHI above HIGH_UHI, NO2 above HIGH_NO2, lighting below
+LOW_LIGHTING) and the district health, i.e. the mean overall score of the
+scored cells on a 0-100 scale under scoring.DEFAULT_WEIGHTS.
+
+`precompute.py build`/`refresh` (and so every bulk_load.py run) materializes
+them for every district into `district_stats` (built as `district_stats_new`
+from the new `district_grid_new`, then swapped in with it), so `/district_stats` is a
+primary-key read, or one small scan for all districts at once. Until the
+table exists the API computes a single district's record from its cached
+columns instead.
+"""
+import numpy as np
+import psycopg2.errors
+import psycopg2.extras
+
+import scoring
+from grid_store import NUMERIC_COLUMNS, DistrictGrid
+from police_stations import StationIndex, fetch_police_stations
+
+STATS_TABLE = "district_stats"
+
+# Priority thresholds (same as the map legends)
+HIGH_UHI = 2.0
+HIGH_NO2 = 0.00012
+LOW_LIGHTING = 5.0
+
+FIELDS = ["cells", "avg_lighting", "avg_lst", "avg_no2", "avg_uhi",
+          "high_uhi", "high_no2", "low_lighting", "health"]
+
+# Every district's numeric columns, one district after another
+ALL_DISTRICTS_SQL = f"""
+            SELECT {NUMERIC_COLUMNS},
+                d.name_key,
+                d.name AS location_name
+            FROM {{mapping}} d
+            JOIN {{grid}} w ON w.gid = d.gid
+            ORDER BY d.name_key;
+"""
+
+STATS_SQL = f"SELECT name, {', '.join(FIELDS)} FROM {STATS_TABLE}"
+
+
+def _positive_mean(values):
+    values = values[values > 0]
+    return float(values.mean()) if len(values) else None
+
+
+def summarize(grid, scores):
+    """Stats record for one DistrictGrid and its overall scores."""
+    return {
+        "cells": len(grid),
+        "avg_lighting": _positive_mean(grid.lighting),
+        "avg_lst": _positive_mean(grid.lst),
+        "avg_no2": _positive_mean(grid.no2),
+        "avg_uhi": _positive_mean(grid.uhi),
+        "high_uhi": int(np.count_nonzero(grid.uhi > HIGH_UHI)),
+        "high_no2": int(np.count_nonzero(grid.no2 > HIGH_NO2)),
+        "low_lighting": int(np.count_nonzero(grid.lighting < LOW_LIGHTING)),
+        "health": scoring.district_health(scores),
+    }
+
+
+def fetch_stats(cur, district=None):
+    """Rows of `district_stats` for one district (or all), None if the table is missing."""
+    try:
+        if district:
+            cur.execute(STATS_SQL + " WHERE name_key = LOWER(%s);", (district,))
+        else:
+            cur.execute(STATS_SQL + " ORDER BY name;")
+    except psycopg2.errors.UndefinedTable:
+        return None
+    return cur.fetchall()
+
+
+def build_stats_table(cur, mapping="district_grid", grid="testing_shapes"):
+    """Summarize every district of `mapping` over `grid` into `district_stats_new`."""
+    conn = cur.connection
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as dict_cur:
+        index = StationIndex(fetch_police_stations(dict_cur, mocks=False))
+
+    records = []
+
+    def flush(name_key, rows):
+        grid = DistrictGrid.from_rows(rows)
+        stats = summarize(grid, scoring.overall_scores(grid, scoring.DEFAULT_WEIGHTS, index))
+        records.append((name_key, grid.location_name) + tuple(stats[f] for f in FIELDS))
+
+    # Server-side cursor: one district's rows in memory at a time
+    with conn.cursor("district_stats_rows", cursor_factory=psycopg2.extras.RealDictCursor) as rows_cur:
+        rows_cur.itersize = 5000
+        rows_cur.execute(ALL_DISTRICTS_SQL.format(mapping=mapping, grid=grid))
+        current, rows = None, []
+        for row in rows_cur:
+            if row["name_key"] != current and rows:
+                flush(current, rows)
+                rows = []
+            current = row["name_key"]
+            rows.append(row)
+        if rows:
+            flush(current, rows)
+
+    cur.execute(f"DROP TABLE IF EXISTS {STATS_TABLE}_new;")
+    cur.execute(f"""
+        CREATE TABLE {STATS_TABLE}_new (
+            name_key text PRIMARY KEY,
+            name text,
+            cells integer,
+            avg_lighting double precision,
+            avg_lst double precision,
+            avg_no2 double precision,
+            avg_uhi double precision,
+            high_uhi integer,
+            high_no2 integer,
+            low_lighting integer,
+            health integer
+        );
+    """)
+    psycopg2.extras.execute_values(
+        cur, f"INSERT INTO {STATS_TABLE}_new (name_key, name, {', '.join(FIELDS)}) VALUES %s", records)
+    cur.execute(f"ANALYZE {STATS_TABLE}_new;")
+    return f"{len(records)} districts"
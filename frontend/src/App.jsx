@@ -13,14 +13,16 @@ export default function App() {
     no2: 0.22,
     uhi_intens: 0.18,
     landcove_1: 0.1,
-    police_station: 0.1
+    police_station: 0.1,
+    flood_frac: 0
   });
   const [selectedAttr, setSelectedAttr] = useState(null);
   const [showOverall, setShowOverall] = useState(false);
   const [stats, setStats] = useState({});
   const [top10, setTop10] = useState([]);
-  const [top10Names, setTop10Names] = useState([]);
   const [highlightGid, setHighlightGid] = useState(null);
+  // Grid pyramid level: 0 = finest cells, k = blocks of 2^k x 2^k cells
+  const [level, setLevel] = useState(0);
 
   useEffect(() => {
     loadDistrict(district);
@@ -31,7 +33,7 @@ export default function App() {
     if (!d) return;
     try {
       console.log('📍 Loading district:', d);
-      const res = await fetch(`http://localhost:5000/get_district_data?district=${encodeURIComponent(d)}`);
+      const res = await fetch(`http://localhost:5000/get_district_data?district=${encodeURIComponent(d)}&level=${level}`);
       const json = await res.json();
       console.log('Backend /get_district_data response (sample):', { gridsCount: Array.isArray(json.grids) ? json.grids.length : 0, policeStationsCount: Array.isArray(json.police_stations) ? json.police_stations.length : 0 });
       // Expect { grids, police_stations }
@@ -53,10 +55,11 @@ export default function App() {
           console.warn('Failed to fetch mock places', e);
         }
       }
-      const withScores = computeScores(arr, weights, json.police_stations);
+      const [{ scores = {}, health }] = await Promise.all([fetchScores(d, weights), loadStats(d)]);
+      const withScores = applyScores(arr, scores);
       setData(withScores);
-      calculateStats(withScores);
-      calculateTop10(withScores);
+      setStats(prev => ({ ...prev, districtHealth: health || 0 }));
+      fetchTop10(d, weights);
       setShowOverall(false);
     } catch (err) {
       console.error('❌ Failed to load district', err);
@@ -64,179 +67,65 @@ export default function App() {
     }
   }
 
-  function normalizeWeights(w) {
-    const vals = Object.values(w).map(v => parseFloat(v) || 0);
-    const sum = vals.reduce((a, b) => a + b, 0);
-    if (sum === 0) return w;
-    const keys = Object.keys(w);
-    const out = {};
-    keys.forEach((k, i) => { out[k] = vals[i] / sum; });
-    return out;
+  // Scores come from the backend (/score), which holds the canonical formula
+  // and returns only gid -> score (plus the district health under these
+  // weights), so re-weighting is one small round-trip.
+  async function fetchScores(d, wts) {
+    const res = await fetch('http://localhost:5000/score', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ district: d, weights: wts, level })
+    });
+    const json = await res.json();
+    return json && json.scores ? json : {};
   }
 
-  function computeScores(items, wts, policeStations) {
-    const W = normalizeWeights(wts);
+  function applyScores(items, scores) {
     return items.map(item => {
-      const props = item;
-      let score = 0;
-      let totalWeight = 0;
-
-      if (props.lighting_r) {
-        score += (1 - Math.min(parseFloat(props.lighting_r) / 25, 1)) * W.lighting_r;
-        totalWeight += W.lighting_r;
-      }
-      if (props.lst_celsiu) {
-        score += (1 - Math.min((parseFloat(props.lst_celsiu) - 20) / 15, 1)) * W.lst_celsiu;
-        totalWeight += W.lst_celsiu;
-      }
-      if (props.no2) {
-        score += (1 - Math.min(parseFloat(props.no2) / 0.00015, 1)) * W.no2;
-        totalWeight += W.no2;
-      }
-      if (props.uhi_intens !== undefined && props.uhi_intens !== null) {
-        score += (1 - Math.min(parseFloat(props.uhi_intens) / 3, 1)) * W.uhi_intens;
-        totalWeight += W.uhi_intens;
-      }
-      if (props.landcove_1) {
-        let boost = 0;
-        if (props.landcove_1 === 'Trees' || props.landcove_1 === 'Crops') boost = 1;
-        else if (props.landcove_1 === 'Water') boost = 0.8;
-        else boost = 0.3;
-        score += boost * W.landcove_1;
-        totalWeight += W.landcove_1;
-      }
-      // Police station proximity: score higher if grid centroid is close to any police station
-      if (policeStations && policeStations.length > 0 && props.geometry) {
-        let centroid = [0, 0];
-        try {
-          const geom = typeof props.geometry === 'string' ? JSON.parse(props.geometry) : props.geometry;
-          if (geom && geom.type === 'Polygon' && geom.coordinates && geom.coordinates[0]) {
-            const ring = geom.coordinates[0];
-            let x = 0, y = 0;
-            ring.forEach(([lng, lat]) => { x += lng; y += lat; });
-            x /= ring.length; y /= ring.length;
-            centroid = [x, y];
-          } else if (geom && geom.type === 'MultiPolygon' && geom.coordinates && geom.coordinates[0] && geom.coordinates[0][0]) {
-            const ring = geom.coordinates[0][0];
-            let x = 0, y = 0;
-            ring.forEach(([lng, lat]) => { x += lng; y += lat; });
-            x /= ring.length; y /= ring.length;
-            centroid = [x, y];
-          }
-        } catch (e) {}
-        // Find closest police station (approximate, since x/y are not decimal lng/lat)
-        let minDist = Infinity;
-        policeStations.forEach(ps => {
-          // If ps.coords.x/y are decimal, parse them; else skip
-          let psLng = null, psLat = null;
-          if (ps.coords && typeof ps.coords.x === 'number' && typeof ps.coords.y === 'number') {
-            psLng = ps.coords.x; psLat = ps.coords.y;
-          }
-          // If x/y are strings, skip for now
-          if (psLng !== null && psLat !== null) {
-            const dist = Math.sqrt(Math.pow(centroid[0] - psLng, 2) + Math.pow(centroid[1] - psLat, 2));
-            if (dist < minDist) minDist = dist;
-          }
-        });
-        // If we found a valid distance, score higher for closer
-        if (minDist !== Infinity) {
-          // Example: within 2km gets full score, 5km gets half, >10km gets zero
-          let proximityScore = 0;
-          if (minDist < 0.02) proximityScore = 1;
-          else if (minDist < 0.05) proximityScore = 0.5;
-          else proximityScore = 0;
-          score += proximityScore * W.police_station;
-          totalWeight += W.police_station;
-        }
-      }
-      const finalScore = totalWeight === 0 ? 0 : score / totalWeight;
-      return { ...item, _overall_score: finalScore };
+      const s = scores[String(item.gid)];
+      return { ...item, _overall_score: typeof s === 'number' ? s : 0 };
     });
   }
 
-  async function calculateTop10(items) {
-    const arr = (items || []).slice().filter(i => typeof i._overall_score === 'number');
-    arr.sort((a, b) => b._overall_score - a._overall_score);
-    const top = arr.slice(0, 10);
-    setTop10(top);
-
-    // Get centroid coordinates for each grid
-    const coords = top.map(t => {
-      // If geometry is Polygon or MultiPolygon, get centroid
-      let centroid = [0, 0];
-      try {
-        const geom = typeof t.geometry === 'string' ? JSON.parse(t.geometry) : t.geometry;
-        if (geom && geom.type === 'Polygon' && geom.coordinates && geom.coordinates[0]) {
-          // Simple centroid calculation for first ring
-          const ring = geom.coordinates[0];
-          let x = 0, y = 0;
-          ring.forEach(([lng, lat]) => { x += lng; y += lat; });
-          x /= ring.length; y /= ring.length;
-          centroid = [x, y];
-        } else if (geom && geom.type === 'MultiPolygon' && geom.coordinates && geom.coordinates[0] && geom.coordinates[0][0]) {
-          const ring = geom.coordinates[0][0];
-          let x = 0, y = 0;
-          ring.forEach(([lng, lat]) => { x += lng; y += lat; });
-          x /= ring.length; y /= ring.length;
-          centroid = [x, y];
-        }
-      } catch (e) {}
-      return centroid;
-    });
-
-    // Fetch local names from backend using the dedicated endpoint
+  // Ranking (and area names) come from /rank, which partially selects the
+  // best K cells server-side instead of sorting the whole district here
+  async function fetchTop10(d, wts) {
     try {
-      const res = await fetch('http://localhost:5000/get_local_names', {
+      const res = await fetch('http://localhost:5000/rank', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ coords })
+        body: JSON.stringify({ districts: [d], weights: wts, k: 10, order: 'top', level })
       });
-      const names = await res.json();
-      // Backend returns an array of objects like [{name: 'Dwarka'}, ...]
-      setTop10Names(Array.isArray(names) ? names.map(n => (n && n.name) || null) : []);
+      const json = await res.json();
+      const cells = Array.isArray(json.cells) ? json.cells : [];
+      setTop10(cells.map(c => ({ gid: c.gid, location_name: c.name, _overall_score: c.score })));
     } catch (e) {
-      console.warn('Failed to fetch local names', e);
-      setTop10Names([]);
+      console.warn('Failed to fetch ranking', e);
+      setTop10([]);
     }
   }
 
-  function calculateStats(items) {
-    if (!items || items.length === 0) return;
-    const lighting = items.map(i => parseFloat(i.lighting_r) || 0).filter(v => v > 0);
-    const lst = items.map(i => parseFloat(i.lst_celsiu) || 0).filter(v => v > 0);
-    const no2 = items.map(i => parseFloat(i.no2) || 0).filter(v => v > 0);
-    const uhi = items.map(i => parseFloat(i.uhi_intens) || 0).filter(v => v > 0);
-
-    // District health: average of all grid overall scores (0-100 scale)
-    const overallScores = items.map(i => typeof i._overall_score === 'number' ? i._overall_score : 0).filter(v => v > 0);
-    console.log('calculateStats — items count:', items.length);
-    console.log('calculateStats — lighting samples/length:', lighting.slice(0,5), lighting.length);
-    console.log('calculateStats — lst samples/length:', lst.slice(0,5), lst.length);
-    console.log('calculateStats — no2 samples/length:', no2.slice(0,5), no2.length);
-    console.log('calculateStats — uhi samples/length:', uhi.slice(0,5), uhi.length);
-    console.log('calculateStats — overallScores (first 10):', overallScores.slice(0, 10));
-    const avgOverallScore = overallScores.length > 0 ? overallScores.reduce((a, b) => a + b, 0) / overallScores.length : 0;
-    const districtHealth = Math.round(avgOverallScore * 100);
-
-    // Priority areas: count grids with high concern in each category
-    const highUhi = items.filter(i => parseFloat(i.uhi_intens) > 2).length;
-    const highNo2 = items.filter(i => parseFloat(i.no2) > 0.00012).length;
-    const lowLighting = items.filter(i => parseFloat(i.lighting_r) < 5).length;
-
-    console.log('calculateStats — avgOverallScore:', avgOverallScore, 'districtHealth:', districtHealth);
-    console.log('calculateStats — priority counts: highUhi=', highUhi, 'highNo2=', highNo2, 'lowLighting=', lowLighting);
-
-    setStats({
-      avgLighting: lighting.length ? (lighting.reduce((a, b) => a + b, 0) / lighting.length).toFixed(2) : 'N/A',
-      avgLst: lst.length ? (lst.reduce((a, b) => a + b, 0) / lst.length).toFixed(2) : 'N/A',
-      avgNo2: no2.length ? (no2.reduce((a, b) => a + b, 0) / no2.length).toFixed(5) : 'N/A',
-      avgUhi: uhi.length ? (uhi.reduce((a, b) => a + b, 0) / uhi.length).toFixed(2) : 'N/A',
-      totalFeatures: items.length,
-      districtHealth,
-      highUhi,
-      highNo2,
-      lowLighting
-    });
+  // Averages and priority counts come precomputed from /district_stats
+  async function loadStats(d) {
+    const fixed = (v, digits) => (typeof v === 'number' ? v.toFixed(digits) : 'N/A');
+    try {
+      const res = await fetch(`http://localhost:5000/district_stats?district=${encodeURIComponent(d)}`);
+      if (!res.ok) return;
+      const s = await res.json();
+      setStats(prev => ({
+        ...prev,
+        avgLighting: fixed(s.avg_lighting, 2),
+        avgLst: fixed(s.avg_lst, 2),
+        avgNo2: fixed(s.avg_no2, 5),
+        avgUhi: fixed(s.avg_uhi, 2),
+        totalFeatures: s.cells,
+        highUhi: s.high_uhi,
+        highNo2: s.high_no2,
+        lowLighting: s.low_lighting
+      }));
+    } catch (e) {
+      console.warn('Failed to fetch district stats', e);
+    }
   }
 
   function onAttrChange(e) {
@@ -254,12 +143,19 @@ export default function App() {
     setWeights(prev => ({ ...prev, [attr]: parseFloat(value) }));
   }
 
-  function applyWeights() {
-    const newData = computeScores(data, weights);
+  async function applyWeights() {
+    let result;
+    try {
+      result = await fetchScores(district, weights);
+    } catch (err) {
+      console.error('❌ Failed to fetch scores', err);
+      return;
+    }
+    const newData = applyScores(data, result.scores || {});
     setData(newData);
-    // Recalculate stats so the dashboard reflects the newly weighted scores
-    calculateStats(newData);
-    calculateTop10(newData);
+    // District health depends on the weights; the other stats do not
+    setStats(prev => ({ ...prev, districtHealth: result.health || 0 }));
+    fetchTop10(district, weights);
   }
 
   return (
@@ -294,6 +190,13 @@ export default function App() {
             onChange={e => setDistrict(e.target.value)}
             placeholder="Delhi"
           />
+          <select value={level} onChange={e => setLevel(parseInt(e.target.value, 10))}>
+            <option value={0}>Finest cells</option>
+            <option value={1}>2×2 blocks</option>
+            <option value={2}>4×4 blocks</option>
+            <option value={3}>8×8 blocks</option>
+            <option value={4}>16×16 blocks</option>
+          </select>
           <button onClick={() => loadDistrict(district)}>Load</button>
 
           <div className="viz-by">
@@ -302,6 +205,7 @@ export default function App() {
             <label><input type="checkbox" name="attr" value="lst_celsiu" checked={selectedAttr === 'lst_celsiu'} onChange={onAttrChange} /> LST (°C)</label>
             <label><input type="checkbox" name="attr" value="no2" checked={selectedAttr === 'no2'} onChange={onAttrChange} /> NO₂</label>
             <label><input type="checkbox" name="attr" value="uhi_intens" checked={selectedAttr === 'uhi_intens'} onChange={onAttrChange} /> UHI Intensity</label>
+            <label><input type="checkbox" name="attr" value="flood_frac" checked={selectedAttr === 'flood_frac'} onChange={onAttrChange} /> Flooding</label>
           </div>
           <div style={{ marginTop: 10 }}>
             <b style={{ color: '#00d4aa' }}>Weighting</b>
@@ -311,6 +215,7 @@ export default function App() {
               <div>NO₂: <input type="range" min="0" max="1" step="0.01" value={weights.no2} onChange={e=>onWeightChange('no2', e.target.value)} /> {weights.no2}</div>
               <div>UHI: <input type="range" min="0" max="1" step="0.01" value={weights.uhi_intens} onChange={e=>onWeightChange('uhi_intens', e.target.value)} /> {weights.uhi_intens}</div>
               <div>Landcover: <input type="range" min="0" max="1" step="0.01" value={weights.landcove_1} onChange={e=>onWeightChange('landcove_1', e.target.value)} /> {weights.landcove_1}</div>
+              <div>Flooding: <input type="range" min="0" max="1" step="0.01" value={weights.flood_frac} onChange={e=>onWeightChange('flood_frac', e.target.value)} /> {weights.flood_frac}</div>
               <button style={{ marginTop: 6 }} onClick={applyWeights}>Apply Weights</button>
             </div>
           </div>
@@ -351,7 +256,7 @@ export default function App() {
               onClick={() => { setHighlightGid(prev => (prev === t.gid ? null : t.gid)); }}
             >
               <div style={{ color: '#b0e0e0', fontSize: 12 }}>
-                {idx + 1}. {top10Names[idx] ? top10Names[idx] : (t.location_name || t.gid)}
+                {idx + 1}. {t.location_name || t.gid}
               </div>
               <div style={{ color: '#00d4aa', fontWeight: 'bold', fontSize: 12 }}>{(t._overall_score*100).toFixed(1)}%</div>
             </div>
@@ -37,6 +37,14 @@ function getLegendItems(attr) {
         { color: '#FD8D3C', label: '0-1.0', range: 'Moderate' },
         { color: '#FED976', label: '< 0', range: 'Low' }
       ];
+    case 'flood_frac':
+      return [
+        { color: '#08306B', label: '> 50%', range: 'Severe' },
+        { color: '#2171B5', label: '25-50%', range: 'High' },
+        { color: '#6BAED6', label: '10-25%', range: 'Moderate' },
+        { color: '#C6DBEF', label: '0-10%', range: 'Low' },
+        { color: '#F7FBFF', label: '0%', range: 'None' }
+      ];
     case 'overall':
     default:
       return [
@@ -55,6 +63,7 @@ function getAttrLabel(attr) {
     case 'lst_celsiu': return '🌡️ Land Surface Temp';
     case 'no2': return '💨 NO₂ Concentration';
     case 'uhi_intens': return '🔥 UHI Intensity';
+    case 'flood_frac': return '💧 Flooded Fraction';
     case 'overall': return '📊 Overall Rating';
     default: return 'Legend';
   }
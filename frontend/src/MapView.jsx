@@ -16,28 +16,13 @@ function getColor(value, attr) {
       return v > 0.00015 ? '#800026' : v > 0.00012 ? '#BD0026' : v > 0.0001 ? '#E31A1C' : v > 0.00008 ? '#FD8D3C' : '#FED976';
     case 'uhi_intens':
       return v > 2 ? '#800026' : v > 1 ? '#E31A1C' : v > 0 ? '#FD8D3C' : '#FED976';
+    case 'flood_frac':
+      return v > 0.5 ? '#08306B' : v > 0.25 ? '#2171B5' : v > 0.1 ? '#6BAED6' : v > 0 ? '#C6DBEF' : '#F7FBFF';
     default:
       return '#555555';
   }
 }
 
-function calculateOverallScore(props) {
-  const weights = { lighting_r: 0.2, lst_celsiu: 0.25, no2: 0.25, uhi_intens: 0.2, landcove_1: 0.1 };
-  let score = 0; let totalWeight = 0;
-  if (props.lighting_r) { score += (1 - Math.min(props.lighting_r / 25, 1)) * weights.lighting_r; totalWeight += weights.lighting_r; }
-  if (props.lst_celsiu) { score += (1 - Math.min((props.lst_celsiu - 20) / 15, 1)) * weights.lst_celsiu; totalWeight += weights.lst_celsiu; }
-  if (props.no2) { score += (1 - Math.min(props.no2 / 0.00015, 1)) * weights.no2; totalWeight += weights.no2; }
-  if (props.uhi_intens !== undefined) { score += (1 - Math.min(props.uhi_intens / 3, 1)) * weights.uhi_intens; totalWeight += weights.uhi_intens; }
-  if (props.landcove_1) {
-    let boost = 0;
-    if (props.landcove_1 === 'Trees' || props.landcove_1 === 'Crops') boost = 1;
-    else if (props.landcove_1 === 'Water') boost = 0.8;
-    else boost = 0.3;
-    score += boost * weights.landcove_1; totalWeight += weights.landcove_1;
-  }
-  return totalWeight === 0 ? 0 : score / totalWeight;
-}
-
 function getOverallColor(score) {
   return score > 0.8 ? '#006837' : score > 0.6 ? '#31a354' : score > 0.4 ? '#addd8e' : score > 0.2 ? '#fdae61' : '#d73027';
 }
@@ -85,8 +70,8 @@ function GeoJsonLayer({ data, selectedAttr, showOverall, highlightGid, policeSta
           geometry: typeof item.geometry === 'string' ? JSON.parse(item.geometry) : item.geometry,
           properties: item
         };
-        // Prefer precomputed overall score from the backend/app; fallback to local calc
-        feature.properties._overall_score = (item && typeof item._overall_score === 'number') ? item._overall_score : calculateOverallScore(item);
+        // Overall score is computed by the backend (/score) and merged in by App
+        feature.properties._overall_score = (item && typeof item._overall_score === 'number') ? item._overall_score : 0;
         return feature;
       });
 
@@ -108,6 +93,14 @@ function GeoJsonLayer({ data, selectedAttr, showOverall, highlightGid, policeSta
         };
       }
 
+      // Police station proximity: the backend precomputes ps_dist_m (metres to
+      // the nearest station); only fall back to a client-side search without it
+      const precomputedDist = feature.properties.ps_dist_m;
+      if (selectedAttr === 'police_station' && typeof precomputedDist === 'number') {
+        const fillColor = precomputedDist < 500 ? '#1a9850' : precomputedDist < 2000 ? '#fee08b' : '#d73027';
+        return { color: '#00d4aa', weight: 0.5, opacity: 0.3, fillColor, fillOpacity: 0.7 };
+      }
+
       // If visualizing police station proximity, compute distance to nearest station
       if (selectedAttr === 'police_station' && Array.isArray(policeStations) && policeStations.length > 0) {
         // compute centroid
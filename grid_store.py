@@ -0,0 +1,331 @@
+"""District grid queries and in-memory columnar copies of the grid attributes.
+
+`district_rows()` runs the per-district grid query for any column list, using
+the precomputed `district_grid` mapping when it exists. With `level` > 0 it
+returns the coarser cells of `grid_pyramid` instead: quadtree blocks of
+2^level x 2^level fishnet cells with mean/mode rollups (see precompute.py),
+so a state-wide view is a few hundred rows instead of thousands.
+`district_query()` returns the same query as (sql, params), for callers that
+run it on a server-side cursor and stream the rows.
+`bbox_rows()` is the viewport query behind `/grid`: cells overlapping a
+bounding box, only the requested columns, paged by gid. `GridStore` keeps
+the numeric attributes of recently used districts as NumPy arrays so that
+scoring and other per-cell computations never go back to the database or
+loop over dict rows, and the whole fishnet as a `RegularGrid` (dense
+(row, col) arrays, see regular_grid.py) for constant-time point lookups.
+
+`ps_dist_m` and `flood_frac` are added to testing_shapes by
+`precompute.py migrate`; until then `execute_grid()` runs the same queries
+with those columns selected as NULL.
+"""
+import os
+import re
+
+import numpy as np
+import psycopg2.errors
+
+from police_stations import StationIndex, fetch_police_stations
+from regular_grid import RegularGrid
+from response_cache import LRUCache, normalize_name
+
+# testing_shapes is stored in WGS84 (it comes from Earth Engine GeoJSON)
+GRID_SRID = 4326
+
+# Quadtree levels built by precompute.py; level 0 is testing_shapes itself
+PYRAMID_LEVELS = int(os.environ.get("GRID_PYRAMID_LEVELS", 4))
+
+GRID_COLUMNS = """
+                w.gid,
+                w.landcove_1,
+                w.landcover_,
+                w.lighting_r,
+                w.uhi_intens,
+                w.lst_celsiu,
+                w.no2,
+                w.flood_frac,
+                w.ps_dist_m,
+                ST_AsGeoJSON(w.geom)::json AS geometry"""
+
+# Numeric attributes as doubles plus the centroid, for the columnar store
+NUMERIC_COLUMNS = """
+                w.gid,
+                w.landcove_1,
+                CAST(w.lighting_r AS double precision) AS lighting_r,
+                CAST(w.lst_celsiu AS double precision) AS lst_celsiu,
+                CAST(w.no2 AS double precision) AS no2,
+                CAST(w.uhi_intens AS double precision) AS uhi_intens,
+                w.flood_frac,
+                w.ps_dist_m,
+                ST_X(ST_Centroid(w.geom)) AS cx,
+                ST_Y(ST_Centroid(w.geom)) AS cy"""
+
+DISTRICT_GRID_SQL = """
+            SELECT {columns},
+                d.name AS location_name
+            FROM district_grid d
+            JOIN testing_shapes w ON w.gid = d.gid
+            WHERE d.name_key = LOWER(%s);
+"""
+
+DISTRICT_GRID_SPATIAL_SQL = """
+            WITH locations AS (
+                SELECT gid, name_1 AS name, geom FROM gadm41_ind_1
+                UNION ALL
+                SELECT gid, name_2 AS name, geom FROM gadm41_ind_2
+                UNION ALL
+                SELECT gid, name_3 AS name, geom FROM gadm41_ind_3
+            )
+            SELECT {columns},
+                l.name AS location_name
+            FROM testing_shapes w
+            JOIN locations l
+              ON ST_Intersects(w.geom, l.geom)
+            WHERE LOWER(l.name) = LOWER(%s);
+"""
+
+
+# Pyramid blocks covering any of the district's cells. The pyramid table is
+# aliased `w` so the same column lists work at every level.
+PYRAMID_SQL = """
+            WITH blocks AS (
+                SELECT c.cell_row >> %(level)s AS block_row,
+                       c.cell_col >> %(level)s AS block_col,
+                       MIN(d.name) AS location_name
+                FROM district_grid d
+                JOIN grid_cells c ON c.gid = d.gid
+                WHERE d.name_key = LOWER(%(district)s)
+                GROUP BY 1, 2
+            )
+            SELECT {columns},
+                b.location_name
+            FROM blocks b
+            JOIN grid_pyramid w
+              ON w.level = %(level)s AND w.block_row = b.block_row AND w.block_col = b.block_col;
+"""
+
+
+# Columns /grid can project, by name
+BBOX_FIELDS = {
+    "landcove_1": "w.landcove_1",
+    "landcover_": "w.landcover_",
+    "lighting_r": "w.lighting_r",
+    "lst_celsiu": "w.lst_celsiu",
+    "no2": "w.no2",
+    "uhi_intens": "w.uhi_intens",
+    "flood_frac": "w.flood_frac",
+    "ps_dist_m": "w.ps_dist_m",
+    "geometry": "ST_AsGeoJSON({geom}, 6)::json AS geometry",
+}
+
+# Cells whose bbox overlaps the query box (GiST `&&`), paged by gid
+BBOX_SQL = """
+            SELECT {columns}
+            FROM {source} w
+            WHERE w.geom && ST_MakeEnvelope(%(minx)s, %(miny)s, %(maxx)s, %(maxy)s, {srid}){level_filter}
+              AND w.gid > %(after)s
+            ORDER BY w.gid
+            LIMIT %(limit)s;
+"""
+
+
+# testing_shapes columns added by precompute.py migrate, as they appear in the SELECT lists
+ADDED_COLUMN_RE = re.compile(r"(?<![\w(])w\.(flood_frac|ps_dist_m)\b")
+
+GRID_SPEC_SQL = "SELECT origin_x, origin_y, dx, dy, n_rows, n_cols FROM grid_spec;"
+
+# Every cell with its fishnet position, for the dense RegularGrid arrays
+REGULAR_GRID_SQL = """
+            SELECT c.cell_row,
+                c.cell_col,
+                w.gid,
+                w.landcove_1,
+                CAST(w.lighting_r AS double precision) AS lighting_r,
+                CAST(w.lst_celsiu AS double precision) AS lst_celsiu,
+                CAST(w.no2 AS double precision) AS no2,
+                CAST(w.uhi_intens AS double precision) AS uhi_intens,
+                w.flood_frac,
+                w.ps_dist_m
+            FROM grid_cells c
+            JOIN testing_shapes w ON w.gid = c.gid;
+"""
+
+
+def without_added_columns(sql):
+    """`sql` with the migrated columns selected as NULL, for a database that predates them."""
+    return ADDED_COLUMN_RE.sub(r"NULL::double precision AS \1", sql)
+
+
+def has_added_columns(cur):
+    """True once testing_shapes has every column precompute.py migrate adds."""
+    cur.execute("""
+        SELECT COUNT(*) = 2 AS present FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'testing_shapes'
+          AND column_name IN ('flood_frac', 'ps_dist_m');
+    """)
+    return cur.fetchone()["present"]
+
+
+def execute_grid(cur, sql, params=None):
+    """Execute a testing_shapes query, without the migrated columns if they do not exist yet."""
+    try:
+        cur.execute(sql, params)
+    except psycopg2.errors.UndefinedColumn:
+        cur.execute(without_added_columns(sql), params)
+
+
+def has_district_grid(cur):
+    """True once precompute.py has built the district_grid mapping."""
+    cur.execute("SELECT to_regclass('district_grid') IS NOT NULL AS present;")
+    return cur.fetchone()["present"]
+
+
+def district_query(district, columns=GRID_COLUMNS, level=0, mapped=True):
+    """(sql, params) for the grid cells of `district`; `mapped` = use district_grid."""
+    if level:
+        return PYRAMID_SQL.format(columns=columns), {"district": district, "level": level}
+    sql = DISTRICT_GRID_SQL if mapped else DISTRICT_GRID_SPATIAL_SQL
+    return sql.format(columns=columns), (district,)
+
+
+def valid_level(level):
+    return 0 <= level <= PYRAMID_LEVELS
+
+
+def district_rows(cur, district, columns=GRID_COLUMNS, level=0):
+    """Execute the grid query for `district` on `cur`; the caller fetches."""
+    # Grid cells for the district come from the precomputed district_grid
+    # mapping (see precompute.py); fall back to the spatial join if it
+    # has not been built yet.
+    try:
+        execute_grid(cur, *district_query(district, columns, level))
+    except psycopg2.errors.UndefinedTable:
+        if level:
+            raise
+        execute_grid(cur, *district_query(district, columns, mapped=False))
+
+
+def bbox_columns(fields, simplify=0.0):
+    """SELECT list for `fields` (gid always first); geometry optionally simplified."""
+    geom = "ST_SimplifyPreserveTopology(w.geom, %(simplify)s)" if simplify else "w.geom"
+    return ",\n                ".join(
+        ["w.gid"] + [BBOX_FIELDS[f].format(geom=geom) for f in fields if f != "gid"])
+
+
+def bbox_rows(cur, bbox, fields, level=0, simplify=0.0, after=0, limit=1000):
+    """Execute the viewport query on `cur`; the caller fetches (up to `limit` rows)."""
+    minx, miny, maxx, maxy = bbox
+    sql = BBOX_SQL.format(
+        columns=bbox_columns(fields, simplify),
+        source="grid_pyramid" if level else "testing_shapes",
+        level_filter=" AND w.level = %(level)s" if level else "",
+        srid=GRID_SRID,
+    )
+    execute_grid(cur, sql, {"minx": minx, "miny": miny, "maxx": maxx, "maxy": maxy, "level": level,
+                      "simplify": simplify, "after": after, "limit": limit})
+
+
+def _floats(rows, key):
+    return np.array([np.nan if r[key] is None else r[key] for r in rows], dtype=np.float64)
+
+
+class DistrictGrid:
+    """Column arrays for one district's grid cells (NaN where a value is missing)."""
+
+    def __init__(self, gid, landcover, lighting, lst, no2, uhi, cx, cy, ps_dist_m=None,
+                 location_name=None, flood=None):
+        self.gid = gid
+        self.landcover = landcover
+        self.lighting = lighting
+        self.lst = lst
+        self.no2 = no2
+        self.uhi = uhi
+        self.cx = cx
+        self.cy = cy
+        # Precomputed nearest police station distance (metres), see precompute.py
+        self.ps_dist_m = ps_dist_m if ps_dist_m is not None else np.full(len(gid), np.nan)
+        # Flooded pixel fraction from the waterlogging mask (see flood_zonal.py)
+        self.flood = flood if flood is not None else np.full(len(gid), np.nan)
+        self.location_name = location_name
+
+    @classmethod
+    def from_rows(cls, rows):
+        # The spatial fallback can return a cell once per matching location
+        seen = set()
+        unique = []
+        for r in rows:
+            if r["gid"] not in seen:
+                seen.add(r["gid"])
+                unique.append(r)
+        return cls(
+            gid=np.array([r["gid"] for r in unique], dtype=np.int64),
+            landcover=np.array([r["landcove_1"] or "" for r in unique], dtype=object),
+            lighting=_floats(unique, "lighting_r"),
+            lst=_floats(unique, "lst_celsiu"),
+            no2=_floats(unique, "no2"),
+            uhi=_floats(unique, "uhi_intens"),
+            cx=_floats(unique, "cx"),
+            cy=_floats(unique, "cy"),
+            ps_dist_m=_floats(unique, "ps_dist_m"),
+            location_name=unique[0]["location_name"] if unique else None,
+            flood=_floats(unique, "flood_frac"),
+        )
+
+    def __len__(self):
+        return len(self.gid)
+
+
+class GridStore:
+    """LRU of district name -> DistrictGrid, versioned with the response cache."""
+
+    def __init__(self, cache, maxsize=16):
+        self.cache = cache
+        self.grids = LRUCache(maxsize=maxsize, ttl=cache.local.ttl)
+
+    def get(self, cur_factory, district, level=0):
+        key = self.cache.key(district, f"columns:{level}")
+        grid = self.grids.get(key)
+        if grid is None:
+            cur = cur_factory()
+            district_rows(cur, normalize_name(district), NUMERIC_COLUMNS, level)
+            grid = DistrictGrid.from_rows(cur.fetchall())
+            self.grids.set(key, grid)
+        return grid
+
+    def regular_grid(self, cur_factory):
+        """The whole fishnet as dense arrays (needs precompute.py's grid_cells/grid_spec)."""
+        key = self.cache.key("*", "regular_grid")
+        grid = self.grids.get(key)
+        if grid is None:
+            cur = cur_factory()
+            cur.execute(GRID_SPEC_SQL)
+            spec = cur.fetchone()
+            execute_grid(cur, REGULAR_GRID_SQL)
+            grid = RegularGrid.from_rows(spec, cur.fetchall())
+            self.grids.set(key, grid)
+        return grid
+
+    def shared(self, name, build):
+        """Whole-grid structure cached next to the district grids; `build()` makes it."""
+        key = self.cache.key("*", name)
+        value = self.grids.get(key)
+        if value is None:
+            value = build()
+            self.grids.set(key, value)
+        return value
+
+    def police_stations(self, cur_factory):
+        key = self.cache.key("*", "police_stations")
+        stations = self.grids.get(key)
+        if stations is None:
+            stations = fetch_police_stations(cur_factory())
+            self.grids.set(key, stations)
+        return stations
+
+    def station_index(self, cur_factory):
+        """KD-tree over the real stations (no mocks), for cells without a precomputed distance."""
+        key = self.cache.key("*", "station_index")
+        index = self.grids.get(key)
+        if index is None:
+            index = StationIndex(fetch_police_stations(cur_factory(), mocks=False))
+            self.grids.set(key, index)
+        return index
@@ -0,0 +1,11 @@
+"""Settings for `gunicorn wsgi:app`; `python wsgi.py` applies the same ones itself."""
+import wsgi
+
+bind = wsgi.BIND
+workers = wsgi.WORKERS
+threads = wsgi.THREADS
+worker_class = "gthread"
+timeout = wsgi.TIMEOUT
+preload_app = True
+when_ready = wsgi.when_ready
+post_fork = wsgi.post_fork
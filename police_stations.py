@@ -0,0 +1,145 @@
+"""Police station locations for the district payload and proximity scoring."""
+import math
+import random
+import re
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # scipy is optional; StationIndex falls back to NumPy
+    cKDTree = None
+
+PS_SQL = """
+            SELECT name, district, x, y,
+                   CASE WHEN ST_SRID(geom) = 0 THEN NULL ELSE ST_X(ST_Transform(geom, 4326)) END AS lon,
+                   CASE WHEN ST_SRID(geom) = 0 THEN NULL ELSE ST_Y(ST_Transform(geom, 4326)) END AS lat
+            FROM ps_location_ascii;
+"""
+
+# Degrees/minutes strings such as "28 38 12.5 N"
+COORD_RE = re.compile(r"[\d]+\s+(\d+)\s+([\d\.]+)\s*([NSEW])")
+
+# Bounding box around Delhi for mock points
+MOCK_BBOX = (76.90, 28.40, 77.35, 28.90)
+MOCK_TOTAL = 50
+
+
+def parse_coord_str(coord_str):
+    if isinstance(coord_str, (float, int)):
+        return float(coord_str)
+    if not coord_str:
+        return None
+    m = COORD_RE.match(coord_str)
+    if not m:
+        return None
+    deg = float(m.group(1))
+    minu = float(m.group(2))
+    dir = m.group(3)
+    val = deg + minu / 60.0
+    if dir in ['S', 'W']:
+        val = -val
+    return val
+
+
+def parse_coords(x, y):
+    lng = parse_coord_str(x)
+    lat = parse_coord_str(y)
+    return {'x': lng, 'y': lat}
+
+
+def to_station(row):
+    # Prefer lon/lat from the geometry column (transformed to WGS84)
+    lon = row.get('lon')
+    lat = row.get('lat')
+    if lon is not None and lat is not None:
+        coords = {'x': float(lon), 'y': float(lat)}
+    else:
+        coords = parse_coords(row['x'], row['y'])
+    return {
+        'name': row['name'],
+        'district': row['district'],
+        'coords': coords
+    }
+
+
+def has_numeric_coords(station):
+    coords = station.get('coords')
+    return bool(coords) and isinstance(coords.get('x'), (int, float)) and isinstance(coords.get('y'), (int, float))
+
+
+def add_mock_stations(stations, total=MOCK_TOTAL, seed=0):
+    """Pad with believable mock points so the frontend has markers to render.
+
+    The generator is seeded so every response sees the same mock stations.
+    They are map markers only; scoring never measures distance to them.
+    """
+    rng = random.Random(seed)
+    min_lng, min_lat, max_lng, max_lat = MOCK_BBOX
+    existing = len([p for p in stations if has_numeric_coords(p)])
+    to_add = max(0, total - existing)
+    for i in range(to_add):
+        stations.append({
+            'name': f'PS MOCK {i+1}',
+            'district': 'MOCK',
+            'coords': {'x': rng.uniform(min_lng, max_lng), 'y': rng.uniform(min_lat, max_lat)}
+        })
+    return to_add
+
+
+def fetch_police_stations(cur, mocks=True):
+    """All stations (no district filter) with decoded coords, padded with mocks for the map.
+
+    Scoring passes mocks=False: proximity is only measured to real stations,
+    the same set precompute.py uses for ps_dist_m.
+    """
+    cur.execute(PS_SQL)
+    stations = [to_station(row) for row in cur.fetchall()]
+    if mocks:
+        add_mock_stations(stations)
+    return stations
+
+
+# Metres per degree for the local equirectangular projection used by StationIndex
+M_PER_DEG_LAT = 110540.0
+M_PER_DEG_LNG = 111320.0
+
+
+class StationIndex:
+    """Nearest-station lookups in metres over stations with numeric coords.
+
+    Points are projected to a local equirectangular plane (accurate to well
+    under 1% over a city or state) and indexed with a KD-tree when scipy is
+    installed; otherwise queries fall back to chunked brute force in NumPy.
+    """
+
+    def __init__(self, stations):
+        pts = [(s['coords']['x'], s['coords']['y']) for s in stations if has_numeric_coords(s)]
+        lnglat = np.array(pts, dtype=np.float64).reshape(-1, 2)
+        self.lat0 = float(lnglat[:, 1].mean()) if len(lnglat) else 0.0
+        self.points = self._project(lnglat[:, 0], lnglat[:, 1])
+        self.tree = cKDTree(self.points) if cKDTree is not None and len(self.points) else None
+
+    def _project(self, lng, lat):
+        kx = M_PER_DEG_LNG * math.cos(math.radians(self.lat0))
+        return np.column_stack([lng * kx, lat * M_PER_DEG_LAT])
+
+    def __len__(self):
+        return len(self.points)
+
+    def nearest_distance(self, lng, lat):
+        """Distance in metres from each (lng, lat) to the closest station (inf if none)."""
+        lng = np.asarray(lng, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        if len(self.points) == 0:
+            return np.full(lng.shape, np.inf)
+        q = self._project(lng, lat)
+        if self.tree is not None:
+            dist, _ = self.tree.query(q)
+            return dist
+        best = np.full(len(q), np.inf)
+        for start in range(0, len(self.points), 256):
+            chunk = self.points[start:start + 256]
+            d = np.hypot(q[:, None, 0] - chunk[None, :, 0], q[:, None, 1] - chunk[None, :, 1])
+            best = np.minimum(best, d.min(axis=1))
+        return best
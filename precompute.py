@@ -0,0 +1,348 @@
+"""Build step for lookup tables the API reads instead of doing spatial joins.
+
+Usage:
+    python precompute.py build     # create indexes + district_grid (first run)
+    python precompute.py refresh   # rebuild after shapes or stations change
+    python precompute.py migrate   # only add missing testing_shapes columns
+
+`district_grid` maps every GADM level 1/2/3 name (lower-cased) to the
+`testing_shapes` grid cells it intersects, so `/get_district_data` becomes a
+primary-key lookup rather than an ST_Intersects join over three tables.
+
+`testing_shapes.ps_dist_m` holds the distance in metres from each cell's
+centroid to the nearest real (non-mock) police station, computed with the
+same StationIndex the API falls back to for cells without it.
+`testing_shapes.flood_frac` (flooded pixel fraction, from flood_zonal.py via
+bulk_load.py) is added empty if missing.
+
+`grid_cells` gives each cell its (row, col) on the regular fishnet (whose
+origin, cell size and dimensions go to the one-row `grid_spec`), and
+`grid_pyramid` rolls the grid up into quadtree blocks of 2^k x 2^k cells for
+k = 1..GRID_PYRAMID_LEVELS: mean of the numeric attributes, mode of the
+landcover, bounding box as geometry. Both are set-based GROUP BYs run once
+per load, so `?level=k` requests only read precomputed rows.
+
+`district_stats` holds the dashboard summary of every district (averages,
+priority counts, health; see district_stats.py).
+
+A run has three transactions. The migration adds missing testing_shapes
+columns (and only then takes a lock). The build writes every table as
+`<table>_new` next to the live one, so API reads are never blocked while the
+spatial joins run; ps_dist_m is filled in on `testing_shapes_new`, a copy of
+the grid. The swap then renames all `_new` tables in one short transaction,
+so readers move from the old tables to the new ones (and distances) together.
+"""
+import os
+import sys
+import time
+
+import psycopg2
+import psycopg2.extras
+
+import district_stats
+import response_cache
+from db_pool import DB_SETTINGS
+from grid_store import GRID_SRID, PYRAMID_LEVELS
+from police_stations import StationIndex, fetch_police_stations
+
+GADM_LEVELS = [
+    ("gadm41_ind_1", "name_1"),
+    ("gadm41_ind_2", "name_2"),
+    ("gadm41_ind_3", "name_3"),
+]
+
+GRID_TABLE = "testing_shapes"
+DISTRICT_GRID_TABLE = "district_grid"
+
+# testing_shapes columns newer than the original shapefile import
+# (bulk_load.py creates them), added by migrate()
+ADDED_COLUMNS = {
+    "flood_frac": "double precision",
+    "ps_dist_m": "double precision",
+}
+
+# Tables a build writes as <table>_new, with the index suffixes to carry over, in swap order
+SWAPS = [
+    (GRID_TABLE, ("pkey", "geom_idx")),
+    (DISTRICT_GRID_TABLE, ("pkey",)),
+    ("grid_cells", ("pkey",)),
+    ("grid_spec", ()),
+    ("grid_pyramid", ("pkey", "geom_idx")),
+    (district_stats.STATS_TABLE, ("pkey",)),
+]
+
+# Cells per nearest-station batch in build_police_distance
+PS_DIST_CHUNK = 20000
+
+# Pyramid gids are level * STRIDE^2 + block_row * STRIDE + block_col
+PYRAMID_GID_STRIDE = 10000
+
+# Longest the migration and the swap wait for their ACCESS EXCLUSIVE locks;
+# queued behind a slow reader they would block every later query
+LOCK_TIMEOUT = os.environ.get("PRECOMPUTE_LOCK_TIMEOUT", "10s")
+
+
+def create_indexes(cur):
+    """Expression indexes on lower(name) and GiST indexes used by the build join."""
+    for table, col in GADM_LEVELS:
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_lower_{col}_idx ON {table} (LOWER({col}));")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_geom_idx ON {table} USING GIST (geom);")
+    cur.execute("CREATE INDEX IF NOT EXISTS testing_shapes_geom_idx ON testing_shapes USING GIST (geom);")
+
+
+def index_grid(cur, table):
+    """Primary key, GiST index and statistics for a freshly filled grid table."""
+    # Indexes after the bulk insert: one sort per index instead of per-row upkeep
+    cur.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (gid);")
+    cur.execute(f"CREATE INDEX {table}_geom_idx ON {table} USING GIST (geom);")
+    cur.execute(f"ANALYZE {table};")
+
+
+def copy_grid(cur):
+    """testing_shapes_new as a copy of the live grid, for the refresh steps to rewrite."""
+    cur.execute(f"DROP TABLE IF EXISTS {GRID_TABLE}_new;")
+    # Columns only: a serial default would tie the copy to the old table's sequence
+    cur.execute(f"CREATE TABLE {GRID_TABLE}_new (LIKE {GRID_TABLE});")
+    cur.execute(f"INSERT INTO {GRID_TABLE}_new SELECT * FROM {GRID_TABLE};")
+    copied = cur.rowcount
+    index_grid(cur, f"{GRID_TABLE}_new")
+    return f"{copied} cells"
+
+
+def build_district_grid(cur, grid="testing_shapes"):
+    """Materialize the district -> `grid` gid mapping as district_grid_new."""
+    locations = "\n                UNION ALL\n".join(
+        f"                SELECT {col} AS name, geom FROM {table}" for table, col in GADM_LEVELS
+    )
+    cur.execute(f"DROP TABLE IF EXISTS {DISTRICT_GRID_TABLE}_new;")
+    cur.execute(f"""
+        CREATE TABLE {DISTRICT_GRID_TABLE}_new AS
+        WITH locations AS (
+{locations}
+        )
+        SELECT DISTINCT ON (LOWER(l.name), w.gid)
+            LOWER(l.name) AS name_key,
+            l.name AS name,
+            w.gid
+        FROM {grid} w
+        JOIN locations l
+          ON ST_Intersects(w.geom, l.geom)
+        WHERE l.name IS NOT NULL;
+    """)
+    cur.execute(f"ALTER TABLE {DISTRICT_GRID_TABLE}_new ADD PRIMARY KEY (name_key, gid);")
+    cur.execute(f"ANALYZE {DISTRICT_GRID_TABLE}_new;")
+    cur.execute(f"SELECT COUNT(*) AS n, COUNT(DISTINCT name_key) AS names FROM {DISTRICT_GRID_TABLE}_new;")
+    return cur.fetchone()
+
+
+def migrate(cur):
+    """Add ADDED_COLUMNS to testing_shapes where missing; no lock when there is nothing to add."""
+    cur.execute("SELECT to_regclass('testing_shapes') IS NOT NULL;")
+    if not cur.fetchone()[0]:
+        return "no testing_shapes table yet"
+    cur.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'testing_shapes';
+    """)
+    present = {row[0] for row in cur.fetchall()}
+    missing = [name for name in ADDED_COLUMNS if name not in present]
+    if missing:
+        cur.execute("SET LOCAL lock_timeout = %s;", (LOCK_TIMEOUT,))
+    for name in missing:
+        cur.execute(f"ALTER TABLE testing_shapes ADD COLUMN IF NOT EXISTS {name} {ADDED_COLUMNS[name]};")
+    return f"added {', '.join(missing)}" if missing else None
+
+
+def build_police_distance(cur, grid="testing_shapes"):
+    """Nearest police station distance (metres) per `grid` cell, with the API's StationIndex."""
+    # Real stations only, decoded exactly as the API decodes them, so a cell
+    # scores the same whether or not its distance was precomputed
+    with cur.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as dict_cur:
+        index = StationIndex(fetch_police_stations(dict_cur, mocks=False))
+    if len(index) == 0:
+        cur.execute(f"UPDATE {grid} SET ps_dist_m = NULL;")
+        return "no stations with coordinates"
+    cur.execute(f"SELECT gid, ST_X(ST_Centroid(geom)), ST_Y(ST_Centroid(geom)) FROM {grid} WHERE geom IS NOT NULL;")
+    cells = cur.fetchall()
+    # Qualified: never drops a real table of that name on the search_path
+    cur.execute("DROP TABLE IF EXISTS pg_temp.ps_dist;")
+    cur.execute("CREATE TEMP TABLE ps_dist (gid integer PRIMARY KEY, dist double precision) ON COMMIT DROP;")
+    for start in range(0, len(cells), PS_DIST_CHUNK):
+        chunk = cells[start:start + PS_DIST_CHUNK]
+        dist = index.nearest_distance([c[1] for c in chunk], [c[2] for c in chunk])
+        psycopg2.extras.execute_values(
+            cur, "INSERT INTO ps_dist (gid, dist) VALUES %s", list(zip([c[0] for c in chunk], dist.tolist())),
+            page_size=5000)
+    cur.execute(f"UPDATE {grid} w SET ps_dist_m = d.dist FROM ps_dist d WHERE w.gid = d.gid;")
+    return f"{cur.rowcount} cells, {len(index)} stations"
+
+
+def _swap_in(cur, table, indexes=("pkey",)):
+    """Replace `table` by `table`_new (statistics carry over with the rename)."""
+    cur.execute(f"DROP TABLE IF EXISTS {table};")
+    cur.execute(f"ALTER TABLE {table}_new RENAME TO {table};")
+    for suffix in indexes:
+        cur.execute(f"ALTER INDEX {table}_new_{suffix} RENAME TO {table}_{suffix};")
+
+
+def swap_all(cur, swaps=SWAPS):
+    """Swap in every table of `swaps` whose _new version was built; returns their names."""
+    cur.execute("SET LOCAL lock_timeout = %s;", (LOCK_TIMEOUT,))
+    swapped = []
+    for table, indexes in swaps:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (f"{table}_new",))
+        if cur.fetchone()[0]:
+            _swap_in(cur, table, indexes)
+            swapped.append(table)
+    return swapped
+
+
+def build_grid_cells(cur, grid="testing_shapes"):
+    """(row, col) of every `grid` cell, from its bounds on the fishnet, plus grid_spec (as _new)."""
+    cur.execute("DROP TABLE IF EXISTS grid_cells_new;")
+    cur.execute("DROP TABLE IF EXISTS grid_spec_new;")
+    cur.execute("DROP TABLE IF EXISTS pg_temp.grid_bounds;")
+    cur.execute(f"""
+        CREATE TEMP TABLE grid_bounds ON COMMIT DROP AS
+        SELECT gid,
+               ST_XMin(geom) AS x0, ST_YMin(geom) AS y0,
+               ST_XMax(geom) - ST_XMin(geom) AS w,
+               ST_YMax(geom) - ST_YMin(geom) AS h
+        FROM {grid}
+        WHERE geom IS NOT NULL;
+    """)
+    # Origin = lower-left corner of the fishnet; cell size = median cell extent
+    cur.execute("""
+        CREATE TABLE grid_spec_new AS
+        SELECT MIN(x0) AS origin_x, MIN(y0) AS origin_y,
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY w) AS dx,
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY h) AS dy,
+               0 AS n_rows, 0 AS n_cols
+        FROM grid_bounds;
+    """)
+    cur.execute("""
+        CREATE TABLE grid_cells_new AS
+        SELECT b.gid,
+               ROUND((b.y0 - s.origin_y) / s.dy)::integer AS cell_row,
+               ROUND((b.x0 - s.origin_x) / s.dx)::integer AS cell_col
+        FROM grid_bounds b, grid_spec_new s;
+    """)
+    cur.execute("""
+        UPDATE grid_spec_new
+        SET n_rows = (SELECT MAX(cell_row) + 1 FROM grid_cells_new),
+            n_cols = (SELECT MAX(cell_col) + 1 FROM grid_cells_new);
+    """)
+    cur.execute("ALTER TABLE grid_cells_new ADD PRIMARY KEY (gid);")
+    cur.execute("ANALYZE grid_cells_new;")
+    cur.execute("SELECT n_rows AS rows, n_cols AS cols FROM grid_spec_new;")
+    return cur.fetchone()
+
+
+def build_grid_pyramid(cur, grid="testing_shapes", levels=PYRAMID_LEVELS):
+    """Quadtree rollups of `grid` for levels 1..`levels` (as grid_pyramid_new)."""
+    # Gids are stable across rebuilds and disjoint from each other and from the
+    # base grid gids only while the level-1 blocks fit in PYRAMID_GID_STRIDE per axis
+    cur.execute("SELECT n_rows, n_cols FROM grid_spec_new;")
+    n_rows, n_cols = cur.fetchone()
+    if max(n_rows, n_cols) > 2 * PYRAMID_GID_STRIDE:
+        raise RuntimeError(f"grid is {n_rows} x {n_cols} cells; pyramid gids only encode "
+                           f"{PYRAMID_GID_STRIDE} blocks per axis at level 1")
+    cur.execute(f"SELECT COALESCE(MAX(gid), 0) FROM {grid};")
+    if cur.fetchone()[0] >= PYRAMID_GID_STRIDE ** 2:
+        raise RuntimeError(f"{grid} gids reach {PYRAMID_GID_STRIDE ** 2}, where pyramid gids start")
+    cur.execute("DROP TABLE IF EXISTS grid_pyramid_new;")
+    cur.execute(f"""
+        CREATE TABLE grid_pyramid_new AS
+        SELECT l.level * {PYRAMID_GID_STRIDE ** 2} + (c.cell_row >> l.level) * {PYRAMID_GID_STRIDE}
+                   + (c.cell_col >> l.level) AS gid,
+               l.level::smallint AS level,
+               c.cell_row >> l.level AS block_row,
+               c.cell_col >> l.level AS block_col,
+               COUNT(*)::integer AS n_cells,
+               mode() WITHIN GROUP (ORDER BY w.landcove_1) AS landcove_1,
+               mode() WITHIN GROUP (ORDER BY w.landcover_) AS landcover_,
+               AVG(CAST(w.lighting_r AS double precision)) AS lighting_r,
+               AVG(CAST(w.lst_celsiu AS double precision)) AS lst_celsiu,
+               AVG(CAST(w.no2 AS double precision)) AS no2,
+               AVG(CAST(w.uhi_intens AS double precision)) AS uhi_intens,
+               AVG(w.flood_frac) AS flood_frac,
+               AVG(w.ps_dist_m) AS ps_dist_m,
+               ST_Multi(ST_SetSRID(ST_Extent(w.geom)::geometry, {GRID_SRID})) AS geom
+        FROM {grid} w
+        JOIN grid_cells_new c ON c.gid = w.gid
+        CROSS JOIN generate_series(1, %s) AS l(level)
+        GROUP BY l.level, c.cell_row >> l.level, c.cell_col >> l.level;
+    """, (levels,))
+    cur.execute("ALTER TABLE grid_pyramid_new ADD PRIMARY KEY (level, block_row, block_col);")
+    cur.execute("CREATE INDEX grid_pyramid_new_geom_idx ON grid_pyramid_new USING GIST (geom);")
+    cur.execute("ANALYZE grid_pyramid_new;")
+    cur.execute("SELECT level, COUNT(*) FROM grid_pyramid_new GROUP BY level ORDER BY level;")
+    return ", ".join(f"level {lvl}: {n}" for lvl, n in cur.fetchall())
+
+
+def build_district_stats(cur, grid="testing_shapes"):
+    """Per-district dashboard summary, from district_grid_new and the refreshed `grid` columns."""
+    return district_stats.build_stats_table(cur, mapping=f"{DISTRICT_GRID_TABLE}_new", grid=grid)
+
+
+def _timed(name, step, cur):
+    start = time.perf_counter()
+    result = step(cur)
+    took = time.perf_counter() - start
+    print(f"✅ {name} done in {took:.1f}s" + (f" -> {result}" if result else ""))
+
+
+def run(steps, swaps=SWAPS):
+    conn = psycopg2.connect(**DB_SETTINGS)
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                _timed("migrate", migrate, cur)
+        # Long transaction: only *_new tables
+        with conn:
+            with conn.cursor() as cur:
+                for name, step in steps:
+                    _timed(name, step, cur)
+        # Short transaction: readers move to all new tables at COMMIT
+        with conn:
+            with conn.cursor() as cur:
+                _timed("swap", lambda c: ", ".join(swap_all(c, swaps)), cur)
+    finally:
+        conn.close()
+    # Cached district payloads were built from the old mapping
+    tier = response_cache.shared_tier_from_env()
+    if tier is not None:
+        print(f"✅ Cache data version is now {tier.bump_version()}")
+
+
+def refresh_steps(grid=f"{GRID_TABLE}_new"):
+    """The steps that derive tables from the grid gids, reading `grid`.
+
+    `grid` is testing_shapes_new: a copy of the live grid for `refresh`, the
+    loaded file for bulk_load.py. ps_dist_m is rewritten there, so no step
+    writes the live grid table.
+    """
+    return [
+        ("district_grid", lambda cur: build_district_grid(cur, grid)),
+        ("police_distance", lambda cur: build_police_distance(cur, grid)),
+        ("grid_cells", lambda cur: build_grid_cells(cur, grid)),
+        ("grid_pyramid", lambda cur: build_grid_pyramid(cur, grid)),
+        ("district_stats", lambda cur: build_district_stats(cur, grid)),
+    ]
+
+
+REFRESH_STEPS = [("grid_copy", copy_grid)] + refresh_steps()
+
+COMMANDS = {
+    "build": [("indexes", create_indexes)] + REFRESH_STEPS,
+    "refresh": REFRESH_STEPS,
+    "migrate": [],
+}
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "build"
+    if cmd not in COMMANDS:
+        print(f"usage: python precompute.py [{'|'.join(COMMANDS)}]")
+        sys.exit(2)
+    run(COMMANDS[cmd])
@@ -0,0 +1,144 @@
+"""Top-K / bottom-K cells by overall score, across any set of districts.
+
+`RankIndex` holds every grid cell once with its scoring components
+(scoring.components) already evaluated: a factors x cells matrix of
+`value * present` and one of `present`. The overall score of any subset
+under any weights is then two matrix-vector products, the same weighted
+mean as scoring.overall_scores, and the best or worst K cells are picked
+with np.argpartition (O(n)) before sorting only those K. District
+membership comes from `district_grid`; each cell is named after the most
+specific GADM area containing it (the one with the fewest cells).
+
+With `level` > 0 the index holds the grid_pyramid blocks of that level
+instead, and a district's blocks are those covering any of its cells (as in
+grid_store.PYRAMID_SQL), so the gids match what /score and the map use.
+"""
+from collections import defaultdict
+
+import numpy as np
+
+import scoring
+from grid_store import NUMERIC_COLUMNS, DistrictGrid, execute_grid
+from response_cache import normalize_name
+
+# Every grid cell once, in gid order
+ALL_CELLS_SQL = f"""
+            SELECT {NUMERIC_COLUMNS},
+                NULL AS location_name
+            FROM testing_shapes w
+            WHERE w.geom IS NOT NULL
+            ORDER BY w.gid;
+"""
+
+MEMBERS_SQL = "SELECT name_key, name, gid FROM district_grid;"
+
+# Every pyramid block of one level, in gid order
+ALL_BLOCKS_SQL = f"""
+            SELECT {NUMERIC_COLUMNS},
+                NULL AS location_name
+            FROM grid_pyramid w
+            WHERE w.level = %(level)s
+            ORDER BY w.gid;
+"""
+
+# Blocks covering each district's cells
+BLOCK_MEMBERS_SQL = """
+            SELECT DISTINCT d.name_key, d.name, w.gid
+            FROM district_grid d
+            JOIN grid_cells c ON c.gid = d.gid
+            JOIN grid_pyramid w
+              ON w.level = %(level)s
+             AND w.block_row = c.cell_row >> %(level)s
+             AND w.block_col = c.cell_col >> %(level)s;
+"""
+
+ORDERS = ("top", "bottom")
+
+
+class RankIndex:
+    """Precomputed score components of every cell, plus district membership."""
+
+    def __init__(self, grid, members, station_index=None):
+        components = scoring.components(grid, station_index)
+        self.factors = list(components)
+        self.present = np.array([components[f][1] for f in self.factors], dtype=np.float64)
+        self.weighted = np.array([np.where(components[f][1], components[f][0], 0.0) for f in self.factors])
+        self.gid = grid.gid
+        self.cx = grid.cx
+        self.cy = grid.cy
+
+        # name_key -> (name, cell positions)
+        by_key = defaultdict(list)
+        names = {}
+        for r in members:
+            by_key[r["name_key"]].append(r["gid"])
+            names[r["name_key"]] = r["name"]
+        order = np.argsort(self.gid)
+        self.districts = {}
+        for key, gids in by_key.items():
+            gids = np.asarray(gids, dtype=np.int64)
+            pos = order[np.searchsorted(self.gid, gids, sorter=order)]
+            self.districts[key] = (names[key], pos[self.gid[pos] == gids])
+
+        # Largest areas first, so the most specific one names the cell
+        self.name = np.full(len(self.gid), None, dtype=object)
+        for name, pos in sorted(self.districts.values(), key=lambda d: -len(d[1])):
+            self.name[pos] = name
+
+    @classmethod
+    def load(cls, cur, station_index=None, level=0):
+        if level:
+            cur.execute(ALL_BLOCKS_SQL, {"level": level})
+            grid = DistrictGrid.from_rows(cur.fetchall())
+            cur.execute(BLOCK_MEMBERS_SQL, {"level": level})
+        else:
+            execute_grid(cur, ALL_CELLS_SQL)
+            grid = DistrictGrid.from_rows(cur.fetchall())
+            cur.execute(MEMBERS_SQL)
+        return cls(grid, cur.fetchall(), station_index)
+
+    def __len__(self):
+        return len(self.gid)
+
+    def positions(self, districts=None):
+        """Cell positions in any of `districts` (names), all cells for None; KeyError if unknown."""
+        if not districts:
+            return np.arange(len(self.gid))
+        # Same key as /get_district_data, so a name that works there works here
+        keys = [normalize_name(d) for d in districts]
+        unknown = [d for d, key in zip(districts, keys) if key not in self.districts]
+        if unknown:
+            raise KeyError(unknown[0])
+        parts = [self.districts[key][1] for key in keys]
+        return np.unique(np.concatenate(parts))
+
+    def scores(self, weights, pos):
+        """(overall score, scored) for the cells at `pos`, as in scoring.overall_scores."""
+        W = scoring.normalize_weights(weights)
+        w = np.array([W.get(f, 0.0) for f in self.factors])
+        num = w @ self.weighted[:, pos]
+        den = w @ self.present[:, pos]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(den == 0, 0.0, num / den), den > 0
+
+    def rank(self, weights, k, order="top", districts=None):
+        """(candidates, cells): the K best (`top`) or worst (`bottom`) scored cells."""
+        pos = self.positions(districts)
+        score, scored = self.scores(weights, pos)
+        pos, score = pos[scored], score[scored]
+        key = -score if order == "top" else score
+        k = min(k, len(pos))
+        pick = np.argpartition(key, k - 1)[:k] if 0 < k < len(pos) else np.arange(k)
+        # Sort just the K picked, ties by gid
+        pick = pick[np.lexsort((self.gid[pos[pick]], key[pick]))]
+        cells = [
+            {
+                "gid": int(self.gid[p]),
+                "score": round(float(s), 6),
+                "name": self.name[p],
+                "lng": None if np.isnan(self.cx[p]) else float(self.cx[p]),
+                "lat": None if np.isnan(self.cy[p]) else float(self.cy[p]),
+            }
+            for p, s in zip(pos[pick], score[pick])
+        ]
+        return len(pos), cells
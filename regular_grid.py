@@ -0,0 +1,98 @@
+"""Implicit (row, col) addressing of the fishnet grid.
+
+Every testing_shapes cell is an axis-aligned rectangle on one fishnet, so
+the grid is fully described by its origin (lower-left corner), cell size and
+dimensions -- the `grid_spec` row that precompute.py writes next to
+`grid_cells`. `RegularGrid` keeps the cell attributes as dense rows x cols
+arrays: finding the cell under a point is a subtraction and a division per
+axis, whatever the grid size, and a cell's polygon is rebuilt from its
+(row, col) on demand instead of being stored or shipped.
+"""
+import numpy as np
+
+# testing_shapes column -> dense array
+NUMERIC_FIELDS = ("lighting_r", "lst_celsiu", "no2", "uhi_intens", "flood_frac", "ps_dist_m")
+
+
+class RegularGrid:
+    """Dense per-cell arrays over a rows x cols fishnet (gid 0 = no cell)."""
+
+    def __init__(self, origin_x, origin_y, dx, dy, n_rows, n_cols):
+        self.origin_x = float(origin_x)
+        self.origin_y = float(origin_y)
+        self.dx = float(dx)
+        self.dy = float(dy)
+        self.shape = (int(n_rows), int(n_cols))
+        self.gid = np.zeros(self.shape, dtype=np.int64)
+        self.values = {name: np.full(self.shape, np.nan) for name in NUMERIC_FIELDS}
+        # Landcover names are dictionary-coded: code -1 = unknown
+        self.landcover = np.full(self.shape, -1, dtype=np.int16)
+        self.landcover_names = []
+
+    @classmethod
+    def from_rows(cls, spec, rows):
+        grid = cls(spec["origin_x"], spec["origin_y"], spec["dx"], spec["dy"], spec["n_rows"], spec["n_cols"])
+        names = {}
+        for r in rows:
+            i, j = r["cell_row"], r["cell_col"]
+            grid.gid[i, j] = r["gid"]
+            for name in NUMERIC_FIELDS:
+                if r.get(name) is not None:
+                    grid.values[name][i, j] = r[name]
+            if r.get("landcove_1"):
+                grid.landcover[i, j] = names.setdefault(r["landcove_1"], len(names))
+        grid.landcover_names = list(names)
+        return grid
+
+    def spec(self):
+        return {
+            "origin": [self.origin_x, self.origin_y],
+            "cell_size": [self.dx, self.dy],
+            "rows": self.shape[0],
+            "cols": self.shape[1],
+            "cells": int(np.count_nonzero(self.gid)),
+        }
+
+    def locate(self, lng, lat):
+        """(row, col, found) arrays for points; `found` is False outside the grid or on empty cells."""
+        lng = np.asarray(lng, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        with np.errstate(invalid="ignore"):
+            col = np.floor((lng - self.origin_x) / self.dx)
+            row = np.floor((lat - self.origin_y) / self.dy)
+            inside = (row >= 0) & (row < self.shape[0]) & (col >= 0) & (col < self.shape[1])
+        row = np.where(inside, row, 0).astype(np.int64)
+        col = np.where(inside, col, 0).astype(np.int64)
+        found = inside & (self.gid[row, col] != 0)
+        return row, col, found
+
+    def geometry(self, row, col):
+        """GeoJSON polygon of cell (row, col), rebuilt from the grid spec."""
+        x0 = self.origin_x + col * self.dx
+        y0 = self.origin_y + row * self.dy
+        x1, y1 = x0 + self.dx, y0 + self.dy
+        return {"type": "Polygon", "coordinates": [[[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]]}
+
+    def cell(self, row, col, geometry=True):
+        """Attributes of cell (row, col) as the API returns them, or None if empty."""
+        gid = int(self.gid[row, col])
+        if not gid:
+            return None
+        code = int(self.landcover[row, col])
+        out = {"gid": gid, "row": int(row), "col": int(col),
+               "landcove_1": self.landcover_names[code] if code >= 0 else None}
+        for name in NUMERIC_FIELDS:
+            value = self.values[name][row, col]
+            out[name] = None if np.isnan(value) else float(value)
+        if geometry:
+            out["geometry"] = self.geometry(int(row), int(col))
+        return out
+
+    def lookup(self, lng, lat, geometry=False):
+        """Cell dict (or None) for every point."""
+        row, col, found = self.locate(lng, lat)
+        return [self.cell(i, j, geometry) if ok else None for i, j, ok in zip(row, col, found)]
+
+    @property
+    def nbytes(self):
+        return self.gid.nbytes + self.landcover.nbytes + sum(v.nbytes for v in self.values.values())
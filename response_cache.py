@@ -0,0 +1,255 @@
+"""Response cache for district payloads.
+
+Serialized responses are kept in an in-process LRU (with TTL) and, when
+configured, in a shared tier that all workers see:
+
+    RESPONSE_CACHE_DIR=/var/cache/usp        local disk tier
+    RESPONSE_CACHE_REDIS_URL=redis://...     Redis (or compatible) tier
+
+Keys combine the normalized district name with a data version. Invalidating
+bumps the version, so every worker stops serving old entries at once (each
+worker re-reads the shared version at most every RESPONSE_CACHE_VERSION_TTL
+seconds). Redis entries expire on their own; the disk tier keeps one
+directory per version and deletes the older ones when the version is
+bumped. Invalidate after loading new data with
+`POST /cache/invalidate` or:
+
+    python response_cache.py invalidate
+"""
+import hashlib
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 64))
+CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", 3600))
+CACHE_DIR = os.environ.get("RESPONSE_CACHE_DIR")
+CACHE_REDIS_URL = os.environ.get("RESPONSE_CACHE_REDIS_URL")
+# Seconds a worker trusts its last read of the shared data version
+VERSION_TTL = float(os.environ.get("RESPONSE_CACHE_VERSION_TTL", 1.0))
+
+
+def normalize_name(name):
+    return " ".join(name.split()).lower()
+
+
+def make_etag(body):
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+class LRUCache:
+    """Thread-safe LRU of key -> (expires_at, value)."""
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskTier:
+    """One file per entry under `path/v-<version>/`; the data version lives in `path/VERSION`."""
+
+    def __init__(self, path, ttl=CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        os.makedirs(path, exist_ok=True)
+
+    def _dir(self, version):
+        return os.path.join(self.path, f"v-{version}")
+
+    def _file(self, key):
+        # Keys start with the data version (see ResponseCache.key)
+        version = key.split(":", 1)[0]
+        return os.path.join(self._dir(version), hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+    def get(self, key):
+        path = self._file(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, key, body):
+        # A worker that has not seen a bump yet must not refill an old version's directory
+        if key.split(":", 1)[0] != self.get_version():
+            return
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+
+    def get_version(self):
+        try:
+            with open(os.path.join(self.path, "VERSION"), encoding="utf-8") as f:
+                return f.read().strip() or "0"
+        except OSError:
+            return "0"
+
+    def bump_version(self):
+        version = uuid.uuid4().hex[:12]
+        tmp = os.path.join(self.path, f"VERSION.{version}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp, os.path.join(self.path, "VERSION"))
+        self.purge(keep=version)
+        return version
+
+    def purge(self, keep):
+        """Delete the entries of every version other than `keep`."""
+        for name in os.listdir(self.path):
+            if name.startswith("v-") and name != f"v-{keep}":
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+
+class RedisTier:
+    """Entries as plain keys with an expiry; version kept under `<prefix>version`."""
+
+    def __init__(self, url, ttl=CACHE_TTL, prefix="usp:district:"):
+        import redis  # optional dependency, only needed for this tier
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, body):
+        self.client.set(self.prefix + key, body, ex=self.ttl)
+
+    def get_version(self):
+        value = self.client.get(self.prefix + "version")
+        return value.decode("ascii") if value else "0"
+
+    def bump_version(self):
+        return str(self.client.incr(self.prefix + "version"))
+
+
+def shared_tier_from_env():
+    if CACHE_REDIS_URL:
+        return RedisTier(CACHE_REDIS_URL)
+    if CACHE_DIR:
+        return DiskTier(CACHE_DIR)
+    return None
+
+
+class ResponseCache:
+    """Two-level cache of serialized responses: (body bytes, etag)."""
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL, shared=None):
+        self.local = LRUCache(maxsize, ttl)
+        self.shared = shared
+        self._local_version = "0"
+        # (read at, version) of the last shared version lookup
+        self._shared_version = (float("-inf"), "0")
+        self.hits = 0
+        self.misses = 0
+
+    def version(self):
+        if self.shared is not None:
+            read_at, version = self._shared_version
+            if time.monotonic() - read_at < VERSION_TTL:
+                return version
+            try:
+                version = self.shared.get_version()
+            except Exception:
+                return self._local_version
+            self._shared_version = (time.monotonic(), version)
+            return version
+        return self._local_version
+
+    def key(self, name, variant=""):
+        return f"{self.version()}:{normalize_name(name)}:{variant}"
+
+    def get(self, key):
+        entry = self.local.get(key)
+        if entry is None and self.shared is not None:
+            try:
+                body = self.shared.get(key)
+            except Exception:
+                body = None
+            if body is not None:
+                entry = (body, make_etag(body))
+                self.local.set(key, entry)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def set(self, key, body):
+        entry = (body, make_etag(body))
+        self.local.set(key, entry)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, body)
+            except Exception:
+                pass
+        return entry
+
+    def invalidate(self):
+        """Drop everything cached for the current data version."""
+        self.local.clear()
+        if self.shared is not None:
+            version = self.shared.bump_version()
+            self._shared_version = (time.monotonic(), version)
+            return version
+        self._local_version = str(int(self._local_version) + 1)
+        return self._local_version
+
+    def stats(self):
+        return {
+            "version": self.version(),
+            "entries": len(self.local),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": type(self.shared).__name__ if self.shared is not None else None,
+        }
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["invalidate"]:
+        print("usage: python response_cache.py invalidate")
+        sys.exit(2)
+    tier = shared_tier_from_env()
+    if tier is None:
+        print("No shared tier configured (RESPONSE_CACHE_DIR / RESPONSE_CACHE_REDIS_URL);"
+              " use POST /cache/invalidate on the running API instead.")
+        sys.exit(1)
+    print(f"✅ Cache data version is now {tier.bump_version()}")
@@ -0,0 +1,103 @@
+"""Overall grid-cell score, computed with NumPy over a DistrictGrid.
+
+This is the single implementation of the scoring formula; the frontend asks
+`/score` for gid -> score instead of re-deriving it per cell in JavaScript.
+Each factor maps to 0..1 (higher is better) and only counts towards the
+weighted mean for cells where the factor is present.
+"""
+import numpy as np
+
+
+DEFAULT_WEIGHTS = {
+    'lighting_r': 0.18,
+    'lst_celsiu': 0.22,
+    'no2': 0.22,
+    'uhi_intens': 0.18,
+    'landcove_1': 0.1,
+    'police_station': 0.1,
+    # Opt-in: only cells with flood data (bulk_load.py + flood_zonal.py) have it
+    'flood_frac': 0.0,
+}
+
+LANDCOVER_BOOST = {'Trees': 1.0, 'Crops': 1.0, 'Water': 0.8}
+LANDCOVER_DEFAULT_BOOST = 0.3
+
+# Flooded fraction at or above this scores 0
+FLOOD_FULL = 0.5
+
+# Nearest-station distance (metres) -> proximity score
+PS_NEAR_M = 2000
+PS_MID_M = 5000
+
+
+def normalize_weights(weights):
+    w = {k: float(weights.get(k, 0) or 0) for k in DEFAULT_WEIGHTS}
+    total = sum(w.values())
+    if total == 0:
+        return w
+    return {k: v / total for k, v in w.items()}
+
+
+def _present(values):
+    # Mirrors the old client check: missing or zero values are skipped
+    return ~np.isnan(values) & (values != 0)
+
+
+def nearest_station_distance(grid, station_index=None):
+    """Metres from each cell to the closest station.
+
+    Uses the precomputed `ps_dist_m` column and only queries the in-memory
+    station index for cells that lack it. Returns None if neither is available.
+    """
+    dist = grid.ps_dist_m.copy()
+    missing = np.isnan(dist)
+    if missing.any():
+        if station_index is None or len(station_index) == 0:
+            return None if missing.all() else dist
+        dist[missing] = station_index.nearest_distance(grid.cx[missing], grid.cy[missing])
+    return dist
+
+
+def components(grid, station_index=None):
+    """Per-factor (score, present) arrays for every cell of `grid`."""
+    out = {
+        'lighting_r': (1 - np.minimum(grid.lighting / 25, 1), _present(grid.lighting)),
+        'lst_celsiu': (1 - np.minimum((grid.lst - 20) / 15, 1), _present(grid.lst)),
+        'no2': (1 - np.minimum(grid.no2 / 0.00015, 1), _present(grid.no2)),
+        'uhi_intens': (1 - np.minimum(grid.uhi / 3, 1), ~np.isnan(grid.uhi)),
+        # 0 is a real value here (no flooding), so only NaN counts as missing
+        'flood_frac': (1 - np.minimum(grid.flood / FLOOD_FULL, 1), ~np.isnan(grid.flood)),
+    }
+
+    lc = grid.landcover
+    boost = np.full(len(grid), LANDCOVER_DEFAULT_BOOST)
+    for name, value in LANDCOVER_BOOST.items():
+        boost[lc == name] = value
+    out['landcove_1'] = (boost, lc != "")
+
+    dist = nearest_station_distance(grid, station_index)
+    if dist is not None:
+        proximity = np.where(dist < PS_NEAR_M, 1.0, np.where(dist < PS_MID_M, 0.5, 0.0))
+        out['police_station'] = (proximity, np.isfinite(dist))
+    return out
+
+
+def overall_scores(grid, weights, station_index=None):
+    """Weighted mean of the present factors, per cell (0 where none apply)."""
+    W = normalize_weights(weights)
+    score = np.zeros(len(grid))
+    total = np.zeros(len(grid))
+    for name, (values, present) in components(grid, station_index).items():
+        w = W.get(name, 0.0)
+        score += np.where(present, values * w, 0.0)
+        total += np.where(present, w, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(total == 0, 0.0, score / total)
+
+
+def district_health(scores):
+    """Mean score of the scored (non-zero) cells on a 0-100 scale, 0 if there are none."""
+    scores = np.asarray(scores, dtype=np.float64)
+    scored = scores[scores > 0]
+    # floor(x + 0.5) rounds halves up, like the dashboard's Math.round
+    return int(np.floor(scored.mean() * 100 + 0.5)) if len(scored) else 0
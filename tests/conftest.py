@@ -0,0 +1,85 @@
+"""Shared fixtures: the API with its database replaced by canned query results."""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "Preprocessing data and scripts"))
+
+
+class FakeCursor:
+    """Answers queries from `responses`: (SQL substring, rows or exception) pairs, first match wins."""
+
+    def __init__(self, responses, log, params):
+        self.responses = responses
+        self.log = log
+        self.params = params
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        self.log.append(sql)
+        self.params.append(params)
+        for pattern, result in self.responses:
+            if pattern in sql:
+                if isinstance(result, Exception):
+                    raise result
+                self._rows = list(result)
+                return
+        self._rows = []
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def close(self):
+        pass
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.responses = []
+        self.queries = []
+        self.params = []  # parallel to `queries`
+        self.broken = 0
+
+    def on(self, pattern, result):
+        """Answer queries containing `pattern` with `result` (rows, or an exception to raise)."""
+        self.responses.insert(0, (pattern, result))
+
+    def cursor(self):
+        return FakeCursor(self.responses, self.queries, self.params)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    import db_pool
+
+    fake = FakeDatabase()
+    monkeypatch.setattr(db_pool, "cursor", fake.cursor)
+
+    def mark_broken():
+        fake.broken += 1
+
+    monkeypatch.setattr(db_pool, "mark_broken", mark_broken)
+    return fake
+
+
+@pytest.fixture
+def api(db):
+    import database_connection
+
+    database_connection.district_cache.invalidate()
+    database_connection.tile_cache.invalidate()
+    return database_connection
+
+
+@pytest.fixture
+def client(api):
+    return api.app.test_client()
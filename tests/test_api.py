@@ -0,0 +1,380 @@
+import importlib
+
+STATS_ROW = {"name": "Delhi", "cells": 3, "avg_lighting": 4.0, "avg_lst": 31.0, "avg_no2": 0.0001,
+             "avg_uhi": 1.5, "high_uhi": 1, "high_no2": 0, "low_lighting": 2, "health": 61}
+
+
+def test_etag_round_trip_returns_304(client, db):
+    db.on("FROM district_stats", [STATS_ROW])
+    first = client.get("/district_stats?district=Delhi")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    again = client.get("/district_stats?district=Delhi", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert again.data == b""
+
+    other = client.get("/district_stats?district=Delhi", headers={"If-None-Match": '"stale"'})
+    assert other.status_code == 200
+
+
+def numeric_row(gid, **values):
+    row = {"gid": gid, "landcove_1": "Trees", "lighting_r": 10.0, "lst_celsiu": 30.0, "no2": 0.0001,
+           "uhi_intens": 1.0, "flood_frac": None, "ps_dist_m": 1500.0, "cx": 77.2, "cy": 28.6,
+           "location_name": "Delhi"}
+    row.update(values)
+    return row
+
+
+def test_score_returns_scores_for_valid_weights(client, db):
+    db.on("FROM district_grid d", [numeric_row(1), numeric_row(2, lighting_r=30.0)])
+    response = client.post("/score", json={"district": "Delhi", "weights": {"no2": 0.5}})
+    assert response.status_code == 200
+    assert set(response.json["scores"]) == {"1", "2"}
+
+
+def test_score_rejects_weights_that_are_not_an_object_of_numbers(client, db):
+    for weights in ([1, 2], "heavy", {"no2": "high"}, {"no2": True}):
+        response = client.post("/score", json={"district": "Delhi", "weights": weights})
+        assert response.status_code == 400, weights
+        assert "weights" in response.json["error"]
+    assert db.queries == []
+
+
+def test_score_database_error_is_json_500_and_marks_connection_broken(client, db):
+    import psycopg2
+
+    db.on("FROM district_grid d", psycopg2.OperationalError("server closed the connection"))
+    response = client.post("/score", json={"district": "Delhi"})
+    assert response.status_code == 500
+    assert response.json["error"] == "internal server error"
+    assert db.broken == 1
+
+
+def legacy_database(db):
+    """testing_shapes from before `precompute.py migrate`: no ps_dist_m / flood_frac."""
+    import psycopg2.errors
+
+    db.on("FROM district_grid d", [numeric_row(1, ps_dist_m=None), numeric_row(2, ps_dist_m=None)])
+    db.on("w.ps_dist_m", psycopg2.errors.UndefinedColumn('column w.ps_dist_m does not exist'))
+    db.on("information_schema.columns", [{"present": False}])
+    db.on("to_regclass('district_grid')", [{"present": True}])
+
+
+def test_grid_queries_work_before_the_columns_are_migrated(client, db):
+    legacy_database(db)
+    assert client.post("/score", json={"district": "Delhi"}).status_code == 200
+    assert client.get("/get_district_data?district=Delhi").status_code == 200
+    retried = [sql for sql in db.queries if "NULL::double precision AS ps_dist_m" in sql]
+    assert retried and all("NULL::double precision AS flood_frac" in sql for sql in retried)
+
+
+def test_streamed_district_skips_missing_columns_up_front(client, db, monkeypatch):
+    from contextlib import contextmanager
+
+    import db_pool
+
+    @contextmanager
+    def streaming_cursor(itersize=None):
+        yield db.cursor()
+
+    monkeypatch.setattr(db_pool, "streaming_cursor", streaming_cursor)
+    legacy_database(db)
+    response = client.get("/get_district_data?district=Delhi&stream=ndjson")
+    assert response.status_code == 200
+    assert len(response.data.splitlines()) == 2
+    assert not any("w.ps_dist_m" in sql for sql in db.queries)
+
+
+def test_scoring_ignores_mock_police_stations(api, db):
+    db.on("FROM ps_location_ascii", [{"name": "PS A", "district": "Delhi", "x": None, "y": None,
+                                      "lon": 77.2, "lat": 28.6}])
+    # The map still gets mock markers, the scorer only the real station
+    assert len(api.grid_store.police_stations(db.cursor)) > 1
+    assert len(api.grid_store.station_index(db.cursor)) == 1
+
+
+def test_tiles_without_pyramid_or_postgis3_are_503(client, db):
+    import psycopg2.errors
+
+    db.on("FROM grid_pyramid", psycopg2.errors.UndefinedTable('relation "grid_pyramid" does not exist'))
+    response = client.get("/tiles/8/182/107.mvt")
+    assert response.status_code == 503
+    assert "precompute.py build" in response.json["error"]
+
+    db.on("FROM testing_shapes", psycopg2.errors.UndefinedFunction("function st_asmvt does not exist"))
+    response = client.get("/tiles/14/11700/6740.mvt")
+    assert response.status_code == 503
+    assert "PostGIS 3" in response.json["error"]
+
+
+def test_tile_database_error_marks_connection_broken(client, db):
+    import psycopg2
+
+    db.on("ST_AsMVT", psycopg2.OperationalError("server closed the connection"))
+    response = client.get("/tiles/14/11700/6740.mvt")
+    assert response.status_code == 500
+    assert db.broken == 1
+
+
+def test_importing_the_app_leaves_logging_alone(api):
+    import logging
+
+    import app_logging
+
+    root = logging.getLogger()
+    existing = logging.NullHandler()
+    saved = root.handlers[:]
+    root.handlers[:] = [existing]
+    try:
+        importlib.reload(api)
+        app_logging.configure_logging()
+        assert root.handlers == [existing]
+        app_logging.configure_logging(force=True)
+        assert root.handlers != [existing]
+    finally:
+        root.handlers[:] = saved
+
+
+def test_rank_rejects_bad_weights_before_touching_the_database(client, db):
+    for weights in ([1, 2], "heavy", {"no2": "high"}):
+        response = client.post("/rank", json={"weights": weights})
+        assert response.status_code == 400, weights
+        assert "weights" in response.json["error"]
+    assert db.queries == []
+
+
+def test_rank_internal_errors_are_500_not_invalid_weights(client, db, monkeypatch):
+    import ranking
+
+    def broken(*args, **kwargs):
+        raise TypeError("bug in the ranking code")
+
+    db.on("FROM ps_location_ascii", [])
+    monkeypatch.setattr(ranking.RankIndex, "load", broken)
+    response = client.post("/rank", json={"weights": {"no2": 0.5}})
+    assert response.status_code == 500
+
+
+def test_rank_at_a_pyramid_level_uses_block_gids(client, db):
+    db.on("FROM ps_location_ascii", [])
+    db.on("FROM grid_pyramid w\n            WHERE w.level", [numeric_row(200010001), numeric_row(200010002, lighting_r=30.0)])
+    db.on("SELECT DISTINCT d.name_key", [{"name_key": "delhi", "name": "Delhi", "gid": 200010001},
+                                          {"name_key": "delhi", "name": "Delhi", "gid": 200010002}])
+    response = client.post("/rank", json={"districts": ["Delhi"], "k": 5, "level": 2})
+    assert response.status_code == 200
+    assert response.json["level"] == 2
+    assert {c["gid"] for c in response.json["cells"]} == {200010001, 200010002}
+    assert not any("FROM testing_shapes" in q for q in db.queries)
+
+    assert client.post("/rank", json={"level": 99}).status_code == 400
+
+
+def regular_grid_database(db):
+    """A 2 x 2 fishnet of 0.5 degree cells from (77, 28) with cell (1, 1) empty."""
+    db.on("FROM grid_spec", [{"origin_x": 77.0, "origin_y": 28.0, "dx": 0.5, "dy": 0.5, "n_rows": 2, "n_cols": 2}])
+    db.on("FROM grid_cells c", [dict(numeric_row(1 + i * 2 + j, lighting_r=float(j)), cell_row=i, cell_col=j)
+                                for i, j in ((0, 0), (0, 1), (1, 0))])
+
+
+def test_cell_at_returns_the_cell_under_the_point_with_its_polygon(client, db):
+    regular_grid_database(db)
+    response = client.get("/cell_at?lng=77.5&lat=28.25")
+    assert response.status_code == 200
+    assert (response.json["gid"], response.json["row"], response.json["col"]) == (2, 0, 1)
+    assert response.json["lighting_r"] == 1.0
+    assert response.json["geometry"]["coordinates"][0][0] == [77.5, 28.0]
+
+    assert client.get("/cell_at?lng=77.75&lat=28.75").status_code == 404  # empty cell
+    assert client.get("/cell_at?lng=78.0&lat=28.25").status_code == 404  # on the outer edge
+    assert client.get("/cell_at?lng=east&lat=28.25").status_code == 400
+    assert client.get("/cell_at?lat=28.25").status_code == 400
+
+
+def test_cells_at_answers_points_in_order_and_loads_the_grid_once(client, db):
+    regular_grid_database(db)
+    points = [[77.1, 28.1], [77.75, 28.75], [76.0, 28.0], [77.25, 28.5]]
+    response = client.post("/cells_at", json={"points": points})
+    assert response.status_code == 200
+    cells = response.json["cells"]
+    assert [c and c["gid"] for c in cells] == [1, None, None, 3]
+    assert "geometry" not in cells[0]
+
+    response = client.post("/cells_at", json={"points": points[:1], "geometry": True})
+    assert response.json["cells"][0]["geometry"]["type"] == "Polygon"
+    assert sum("FROM grid_spec" in q for q in db.queries) == 1
+
+
+def test_cells_at_rejects_bad_points_before_touching_the_database(client, db, api, monkeypatch):
+    for body in ({}, {"points": []}, {"points": "77,28"}, {"points": [[77.1]]}, {"points": [["a", 28]]}):
+        assert client.post("/cells_at", json=body).status_code == 400, body
+    monkeypatch.setattr(api, "CELLS_AT_MAX", 2)
+    assert client.post("/cells_at", json={"points": [[77.1, 28.1]] * 3}).status_code == 400
+    assert db.queries == []
+
+
+def test_point_lookups_without_grid_spec_are_503(client, db):
+    import psycopg2.errors
+
+    db.on("FROM grid_spec", psycopg2.errors.UndefinedTable('relation "grid_spec" does not exist'))
+    for response in (client.get("/cell_at?lng=77.1&lat=28.1"),
+                     client.post("/cells_at", json={"points": [[77.1, 28.1]]}),
+                     client.get("/grid_spec")):
+        assert response.status_code == 503
+        assert "precompute.py build" in response.json["error"]
+    assert db.broken == 0
+
+
+def grid_query(db):
+    """(sql, params) of the /grid viewport query."""
+    return next((q, p) for q, p in zip(db.queries, db.params) if "ST_MakeEnvelope" in q)
+
+
+def test_grid_rejects_bad_bbox_fields_and_paging_before_querying(client, db):
+    for query in ("", "bbox=77,28,78", "bbox=77,28,78,x", "bbox=78,28,77,29", "bbox=77,29,78,28",
+                  "bbox=77,28,77,29", "bbox=77,28,78,29&fields=no2,password", "bbox=77,28,78,29&level=99",
+                  "bbox=77,28,78,29&level=-1", "bbox=77,28,78,29&limit=ten", "bbox=77,28,78,29&after=1.5",
+                  "bbox=77,28,78,29&simplify=fine"):
+        response = client.get(f"/grid?{query}")
+        assert response.status_code == 400, query
+        assert "error" in response.json
+    assert db.queries == []
+
+
+def test_grid_projects_only_the_requested_fields(client, db):
+    db.on("ST_MakeEnvelope", [{"gid": 1, "no2": 0.0001}])
+    response = client.get("/grid?bbox=77,28,78,29&fields=no2")
+    assert response.json["cells"] == [{"gid": 1, "no2": 0.0001}]
+    sql, params = grid_query(db)
+    assert "w.no2" in sql and "w.lighting_r" not in sql and "ST_AsGeoJSON" not in sql
+    assert sql.index("w.gid") < sql.index("w.no2")
+    assert (params["minx"], params["miny"], params["maxx"], params["maxy"]) == (77.0, 28.0, 78.0, 29.0)
+
+    db.queries.clear()
+    db.params.clear()
+    client.get("/grid?bbox=77,28,78,29&fields=geometry&simplify=0.001")
+    sql, params = grid_query(db)
+    assert "ST_SimplifyPreserveTopology(w.geom, %(simplify)s)" in sql and params["simplify"] == 0.001
+    # Without fields every column is sent
+    db.queries.clear()
+    db.params.clear()
+    client.get("/grid?bbox=77,28,78,29")
+    sql, _ = grid_query(db)
+    assert all(f"w.{name}" in sql for name in ("landcove_1", "lighting_r", "no2", "flood_frac", "ps_dist_m"))
+
+
+def test_grid_pages_by_gid_with_one_extra_row(client, db, api):
+    db.on("ST_MakeEnvelope", [{"gid": g} for g in (4, 7, 9)])
+    response = client.get("/grid?bbox=77,28,78,29&fields=gid&limit=2&after=3")
+    assert response.json == {"cells": [{"gid": 4}, {"gid": 7}], "count": 2, "next_after": 7}
+    _, params = grid_query(db)
+    assert (params["after"], params["limit"]) == (3, 3)
+
+    # The last page has no next_after
+    db.on("ST_MakeEnvelope", [{"gid": 9}])
+    response = client.get("/grid?bbox=77,28,78,29&fields=gid&limit=2&after=7")
+    assert response.json == {"cells": [{"gid": 9}], "count": 1, "next_after": None}
+
+    # limit is clamped to 1..GRID_PAGE_MAX
+    db.params.clear()
+    db.queries.clear()
+    client.get(f"/grid?bbox=77,28,78,29&limit={api.GRID_PAGE_MAX * 10}")
+    assert grid_query(db)[1]["limit"] == api.GRID_PAGE_MAX + 1
+    db.params.clear()
+    db.queries.clear()
+    client.get("/grid?bbox=77,28,78,29&limit=0")
+    assert grid_query(db)[1]["limit"] == 2
+
+
+def test_grid_level_reads_the_pyramid(client, db):
+    db.on("ST_MakeEnvelope", [])
+    client.get("/grid?bbox=77,28,78,29&level=2")
+    sql, params = grid_query(db)
+    assert "FROM grid_pyramid w" in sql and "w.level = %(level)s" in sql and params["level"] == 2
+
+    db.queries.clear()
+    db.params.clear()
+    client.get("/grid?bbox=77,28,78,29")
+    sql, _ = grid_query(db)
+    assert "FROM testing_shapes w" in sql and "w.level" not in sql
+
+
+def test_grid_without_its_table_is_503(client, db):
+    import psycopg2.errors
+
+    db.on("FROM grid_pyramid", psycopg2.errors.UndefinedTable('relation "grid_pyramid" does not exist'))
+    response = client.get("/grid?bbox=77,28,78,29&level=2")
+    assert response.status_code == 503
+    assert response.json["error"] == "grid_pyramid has not been built; run python precompute.py build"
+
+    db.on("FROM testing_shapes", psycopg2.errors.UndefinedTable('relation "testing_shapes" does not exist'))
+    response = client.get("/grid?bbox=77,28,78,29")
+    assert response.status_code == 503
+    assert "bulk_load.py" in response.json["error"]
+    assert db.broken == 0
+
+
+def test_rank_matches_district_names_like_get_district_data(client, db):
+    db.on("FROM ps_location_ascii", [])
+    db.on("WHERE w.geom IS NOT NULL", [numeric_row(1), numeric_row(2, lighting_r=30.0), numeric_row(3)])
+    db.on("FROM district_grid;", [{"name_key": "new delhi", "name": "New Delhi", "gid": 1},
+                                  {"name_key": "new delhi", "name": "New Delhi", "gid": 2}])
+    response = client.post("/rank", json={"districts": ["  New\tDelhi "], "k": 5})
+    assert response.status_code == 200
+    assert {c["gid"] for c in response.json["cells"]} == {1, 2}
+
+    response = client.post("/rank", json={"districts": ["Old Delhi"], "k": 5})
+    assert response.status_code == 404
+
+
+def grid_row(gid, name="Delhi"):
+    return {"gid": gid, "landcove_1": "Trees", "landcover_": 10, "lighting_r": 3.0, "uhi_intens": None,
+            "lst_celsiu": 31.0, "no2": 0.0001, "flood_frac": None, "ps_dist_m": 900.0,
+            "geometry": {"type": "MultiPolygon", "coordinates": []}, "location_name": name}
+
+
+def test_district_data_is_a_district_grid_lookup(client, db):
+    db.on("FROM ps_location_ascii", [])
+    db.on("FROM district_grid d", [grid_row(1), grid_row(2)])
+    response = client.get("/get_district_data?district=%20New%20%20Delhi")
+    assert response.status_code == 200
+    assert [r["gid"] for r in response.json["grids"]] == [1, 2]
+
+    lookup, params = next((q, p) for q, p in zip(db.queries, db.params) if "FROM district_grid d" in q)
+    assert "WHERE d.name_key = LOWER(%s)" in lookup and params == ("new delhi",)
+    assert not any("ST_Intersects" in q for q in db.queries)
+
+
+def test_district_data_falls_back_to_the_spatial_join_without_district_grid(client, db):
+    import psycopg2.errors
+
+    db.on("FROM ps_location_ascii", [])
+    db.on("FROM testing_shapes w\n            JOIN locations l", [grid_row(5)])
+    db.on("FROM district_grid d", psycopg2.errors.UndefinedTable('relation "district_grid" does not exist'))
+    response = client.get("/get_district_data?district=Delhi")
+    assert response.status_code == 200
+    assert [r["gid"] for r in response.json["grids"]] == [5]
+    spatial = [q for q in db.queries if "ST_Intersects(w.geom, l.geom)" in q]
+    assert len(spatial) == 1 and "WHERE LOWER(l.name) = LOWER(%s)" in spatial[0]
+    assert db.broken == 0
+
+
+def test_streamed_district_data_checks_for_district_grid_first(client, db, monkeypatch):
+    from contextlib import contextmanager
+
+    import db_pool
+
+    @contextmanager
+    def streaming_cursor(itersize=None):
+        yield db.cursor()
+
+    monkeypatch.setattr(db_pool, "streaming_cursor", streaming_cursor)
+    db.on("information_schema.columns", [{"present": True}])
+    db.on("FROM testing_shapes w\n            JOIN locations l", [grid_row(5)])
+    db.on("to_regclass('district_grid')", [{"present": False}])
+    response = client.get("/get_district_data?district=Delhi&stream=ndjson")
+    assert response.status_code == 200
+    assert len(response.data.splitlines()) == 1
+    # A failing lookup would abort the streaming transaction, so it is never tried
+    assert not any("FROM district_grid d" in q for q in db.queries)
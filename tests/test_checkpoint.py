@@ -0,0 +1,99 @@
+"""CheckpointStore: resume from the cursor, crash windows, skipped batches."""
+import csv
+import json
+
+import pytest
+
+import checkpoint
+from checkpoint import CheckpointStore, import_legacy_progress
+
+FIELDS = ["cell", "value"]
+
+
+def rows(start, end):
+    return [{"cell": i, "value": i * 10} for i in range(start, end)]
+
+
+def read(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return [int(r["cell"]) for r in csv.DictReader(f)]
+
+
+def test_resume_continues_after_the_last_committed_batch(tmp_path):
+    store = CheckpointStore(str(tmp_path), FIELDS)
+    store.write_batch(0, 25, rows(0, 25))
+    store.write_batch(25, 50, rows(25, 50))
+
+    resumed = CheckpointStore(str(tmp_path), FIELDS)
+    assert resumed.next_index == 50
+    resumed.write_batch(50, 60, rows(50, 60))
+    resumed.consolidate(str(tmp_path / "out.csv"))
+    assert read(tmp_path / "out.csv") == list(range(60))
+
+
+def test_crash_between_part_and_cursor_redoes_that_batch(tmp_path, monkeypatch):
+    store = CheckpointStore(str(tmp_path), FIELDS)
+    store.write_batch(0, 25, rows(0, 25))
+
+    def crash():
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(store, "_write_cursor", crash)
+    with pytest.raises(KeyboardInterrupt):
+        store.write_batch(25, 50, rows(25, 50))
+    assert len(store._parts()) == 2  # the part made it to disk, the cursor did not
+
+    resumed = CheckpointStore(str(tmp_path), FIELDS)
+    assert resumed.next_index == 25
+    assert [(s, e) for s, e, _ in resumed._parts()] == [(0, 25)]
+    assert resumed.row_count() == 25
+
+
+def test_crash_while_writing_a_part_leaves_no_part(tmp_path, monkeypatch):
+    store = CheckpointStore(str(tmp_path), FIELDS)
+    store.write_batch(0, 25, rows(0, 25))
+
+    real = checkpoint._atomic_write
+
+    def torn(path, write):
+        def half(f):
+            f.write("cell,value\n25,")
+            raise OSError("disk full")
+        real(path, half)
+
+    monkeypatch.setattr(checkpoint, "_atomic_write", torn)
+    with pytest.raises(OSError):
+        store.write_batch(25, 50, rows(25, 50))
+    monkeypatch.setattr(checkpoint, "_atomic_write", real)
+
+    resumed = CheckpointStore(str(tmp_path), FIELDS)
+    assert resumed.next_index == 25
+    resumed.consolidate(str(tmp_path / "out.csv"))
+    assert read(tmp_path / "out.csv") == list(range(25))
+
+
+def test_skipped_batches_are_retried_and_consolidated_in_grid_order(tmp_path):
+    store = CheckpointStore(str(tmp_path), FIELDS)
+    store.write_batch(0, 25, rows(0, 25))
+    store.skip_batch(25, 50)
+    store.write_batch(50, 75, rows(50, 75))
+
+    resumed = CheckpointStore(str(tmp_path), FIELDS)
+    assert resumed.next_index == 75 and resumed.skipped == [(25, 50)]
+    resumed.write_batch(25, 40, rows(25, 40))
+    assert resumed.skipped == [(40, 50)]
+    resumed.write_batch(40, 50, rows(40, 50))
+    assert resumed.skipped == []
+    assert json.loads((tmp_path / "cursor.json").read_text()) == {"next_index": 75, "skipped": []}
+
+    resumed.consolidate(str(tmp_path / "out.csv"))
+    assert read(tmp_path / "out.csv") == list(range(75))
+
+
+def test_legacy_progress_file_becomes_the_first_part(tmp_path):
+    progress = tmp_path / "progress.json"
+    progress.write_text(json.dumps({"last_batch_index": 3, "results": rows(0, 3)}), encoding="utf-8")
+    store = CheckpointStore(str(tmp_path / "ckpt"), FIELDS)
+    assert import_legacy_progress(store, str(progress))
+    assert store.next_index == 3
+    assert not import_legacy_progress(store, str(progress))
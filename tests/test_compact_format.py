@@ -0,0 +1,113 @@
+"""Compact district payload: negotiation, size/latency against row JSON, and decoding."""
+import gzip
+import json
+import os
+import sys
+import time
+
+import pytest
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_accept_header
+from werkzeug.datastructures import MIMEAccept
+
+import compact_format
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+import payload_size  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def rows():
+    return payload_size.load_rows(payload_size.DEFAULT_CSV)
+
+
+def best_ms(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return out, best * 1000.0
+
+
+def compact_body(rows):
+    out = compact_format.to_columnar(rows)
+    out["police_stations"] = []
+    body, _ = compact_format.serialize(out, "compact", lambda o: json.dumps(o, separators=(",", ":")))
+    return body
+
+
+def decode(payload):
+    """Rows back from the columnar form (as a client would)."""
+    cols, dicts, geom = payload["columns"], payload["dictionaries"], payload["geometry"]
+    out, running = [], [0, 0, 0, 0]
+    for i in range(payload["count"]):
+        row = {k: (dicts[k][v[i]] if k in dicts and v[i] is not None else v[i]) for k, v in cols.items()}
+        delta = geom["bbox"][4 * i:4 * i + 4]
+        if str(i) in geom["polygons"]:
+            row["geometry"] = geom["polygons"][str(i)]
+        else:
+            running = [a + b for a, b in zip(running, delta)]
+            row["bbox"] = [v / geom["scale"] for v in running]
+        out.append(row)
+    return out
+
+
+def test_compact_payload_is_smaller_and_not_slower_than_row_json(rows):
+    payload = {"grids": rows, "police_stations": []}
+    row_json, json_ms = best_ms(lambda: json.dumps(payload).encode("utf-8"))
+    compact, compact_ms = best_ms(lambda: compact_body(rows))
+
+    assert len(compact) < 0.25 * len(row_json)
+    assert len(gzip.compress(compact)) < 0.6 * len(gzip.compress(row_json))
+    # Columnar encoding does less work than repeating every key per row
+    assert compact_ms < 2 * json_ms + 20
+
+
+def test_compact_payload_decodes_to_the_same_cells(rows):
+    decoded = decode(json.loads(compact_body(rows)))
+    assert len(decoded) == len(rows)
+    for original, row in zip(rows, decoded):
+        assert row["gid"] == original["gid"]
+        assert row["landcove_1"] == original["landcove_1"]
+        assert row["lighting_r"] == original["lighting_r"]
+        bbox = compact_format.rectangle_bbox(original["geometry"])
+        if bbox is None:
+            assert row["geometry"] == original["geometry"]
+        else:
+            assert row["bbox"] == pytest.approx(bbox, abs=1e-6)
+
+
+def test_choose_encoding_honours_quality_values():
+    parse = lambda value: parse_accept_header(value)
+    assert compact_format.choose_encoding(parse("gzip, deflate")) == "gzip"
+    assert compact_format.choose_encoding(parse("br;q=0, gzip")) == "gzip"
+    assert compact_format.choose_encoding(parse("gzip;q=0")) is None
+    assert compact_format.choose_encoding(parse("")) is None
+    if compact_format.brotli is not None:
+        assert compact_format.choose_encoding(parse("gzip, br")) == "br"
+        assert compact_format.choose_encoding(parse("gzip;q=1, br;q=0.5")) == "gzip"
+
+
+def test_negotiate_ignores_wildcards_and_q0():
+    accept = lambda value: parse_accept_header(value, MIMEAccept)
+    assert compact_format.negotiate(MultiDict(), accept("*/*")) == "json"
+    assert compact_format.negotiate(MultiDict(), accept(compact_format.COMPACT_JSON_MIMETYPE)) == "compact"
+    assert compact_format.negotiate(MultiDict(), accept(compact_format.COMPACT_JSON_MIMETYPE + ";q=0")) == "json"
+    assert compact_format.negotiate(MultiDict({"format": "compact"}), accept("*/*")) == "compact"
+
+
+def test_district_responses_vary_on_accept_and_encoding(client, db):
+    geometry = {"type": "MultiPolygon", "coordinates": [[[[77.0, 28.0], [77.1, 28.0], [77.1, 28.1], [77.0, 28.1],
+                                                          [77.0, 28.0]]]]}
+    db.on("FROM district_grid d", [{"gid": 1, "landcove_1": "Trees", "lighting_r": 3.0, "geometry": geometry,
+                                    "location_name": "Delhi"}])
+    plain = client.get("/get_district_data?district=Delhi")
+    assert plain.status_code == 200
+    assert plain.headers["Vary"] == "Accept, Accept-Encoding"
+
+    compact = client.get("/get_district_data?district=Delhi&format=compact",
+                         headers={"Accept-Encoding": "br;q=0, gzip"})
+    assert compact.headers["Content-Encoding"] == "gzip"
+    assert compact.headers["Vary"] == "Accept, Accept-Encoding"
+    assert json.loads(gzip.decompress(compact.data))["count"] == 1
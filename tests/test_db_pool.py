@@ -0,0 +1,150 @@
+"""ConnectionPool against a fake psycopg2 pool: checkout, exhaustion, broken connections, health checks."""
+import os
+
+import psycopg2
+import pytest
+from flask import Flask
+
+import db_pool
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self.closed = 0
+        self.autocommit = False
+        self.dead = False  # the server went away: SELECT 1 fails
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        self.conn.pool.pings += 1
+        if self.conn.dead:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeThreadedPool:
+    """psycopg2.pool.ThreadedConnectionPool: keeps up to `minconn` idle connections."""
+
+    def __init__(self, minconn, maxconn, **settings):
+        self.minconn = minconn
+        self.opened = 0
+        self.pings = 0
+        self.idle = [self._connect() for _ in range(minconn)]
+
+    def _connect(self):
+        self.opened += 1
+        return FakeConnection(self)
+
+    def getconn(self):
+        return self.idle.pop() if self.idle else self._connect()
+
+    def putconn(self, conn, close=False):
+        if close or len(self.idle) >= self.minconn:
+            conn.close()
+        elif not conn.closed:
+            self.idle.append(conn)
+
+    def closeall(self):
+        for conn in self.idle:
+            conn.close()
+
+
+@pytest.fixture
+def make_pool(monkeypatch):
+    monkeypatch.setattr(db_pool.psycopg2.pool, "ThreadedConnectionPool", FakeThreadedPool)
+    db_pool.metrics.reset()
+
+    def make(minconn=1, maxconn=2, timeout=0.05):
+        return db_pool.ConnectionPool(minconn, maxconn, timeout, dbname="fake")
+
+    return make
+
+
+def test_checkout_and_return_reuse_the_connection(make_pool):
+    pool = make_pool()
+    assert pool.status() == {"min": 1, "max": 2, "in_use": 0, "idle": 1}
+
+    conn = pool.getconn()
+    assert conn.autocommit
+    assert pool.status()["in_use"] == 1 and pool.status()["idle"] == 0
+    pool.putconn(conn)
+    assert pool.status() == {"min": 1, "max": 2, "in_use": 0, "idle": 1}
+
+    assert pool.getconn() is conn
+    assert pool._pool.opened == 1
+    # Just returned: no SELECT 1 before handing it out again
+    assert pool._pool.pings == 0
+
+
+def test_exhausted_pool_times_out(make_pool):
+    pool = make_pool(maxconn=2)
+    held = [pool.getconn(), pool.getconn()]
+    with pytest.raises(db_pool.PoolExhausted):
+        pool.getconn()
+    assert db_pool.metrics.snapshot()["timeouts"] == 1
+
+    pool.putconn(held.pop())
+    assert pool.getconn() is not None
+    assert pool.status()["in_use"] == 2
+
+
+def test_exhausted_pool_is_503_database_busy(client, db):
+    db.on("FROM district_stats", db_pool.PoolExhausted("no database connection available after 10s"))
+    response = client.get("/district_stats?district=Delhi")
+    assert response.status_code == 503
+    assert response.json["error"] == "database busy"
+    assert db.broken == 0
+
+
+def test_broken_connections_are_closed_not_reused(make_pool, monkeypatch):
+    pool = make_pool()
+    monkeypatch.setattr(db_pool, "_pool", pool)
+    monkeypatch.setattr(db_pool, "_pool_pid", os.getpid())
+    app = Flask(__name__)
+    db_pool.init_app(app)
+
+    with app.app_context():
+        conn = db_pool.get_conn()
+        assert db_pool.get_conn() is conn
+        db_pool.mark_broken()
+    assert conn.closed
+    assert pool.status() == {"min": 1, "max": 2, "in_use": 0, "idle": 0}
+
+    with app.app_context():
+        fresh = db_pool.get_conn()
+    assert fresh is not conn and not fresh.closed
+    assert pool.status()["idle"] == 1
+
+
+def test_idle_connections_are_checked_and_replaced_when_dead(make_pool, monkeypatch):
+    pool = make_pool()
+    conn = pool.getconn()
+    pool.putconn(conn)
+
+    # Idle for longer than HEALTH_CHECK_AFTER: pinged before reuse
+    monkeypatch.setattr(db_pool, "HEALTH_CHECK_AFTER", 0)
+    assert pool.getconn() is conn
+    assert pool._pool.pings == 1
+    pool.putconn(conn)
+
+    conn.dead = True
+    replacement = pool.getconn()
+    assert replacement is not conn and conn.closed
+    assert db_pool.metrics.snapshot()["reconnects"] == 1
+    assert pool.status()["in_use"] == 1
@@ -0,0 +1,92 @@
+"""ee_cache.cached_extract against fake_ee: what is fetched, at which scale, and what a failure leaves."""
+import math
+
+import pytest
+
+import fake_ee
+from ee_cache import ReductionCache, band_key, cached_extract, geometry_hash
+from ee_extract import Band
+
+FAST = {"batch_size": 10, "max_workers": 2, "requests_per_second": 0, "retry_wait": 0}
+
+
+@pytest.fixture
+def ee(monkeypatch):
+    fake_ee.configure()
+    scales = []
+    reduce_regions = fake_ee.Image.reduceRegions
+
+    def recording(self, collection, reducer, scale):
+        scales.append(scale)
+        return reduce_regions(self, collection, reducer, scale)
+
+    monkeypatch.setattr(fake_ee.Image, "reduceRegions", recording)
+    yield scales
+    fake_ee.configure()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ReductionCache(str(tmp_path / "ee_cache.sqlite"))
+    yield cache
+    cache.close()
+
+
+def grid(n=30):
+    return fake_ee.fishnet(fake_ee.Geometry.BBox(77.0, 28.4, 77.3, 28.7), rows=5, cols=6).toList(n)
+
+
+def band(name, source, scale):
+    image = fake_ee.ImageCollection(name).select(source).mean()
+    return Band(name, image, fake_ee.Reducer.mean(), scale, key={"dataset": name, "band": source, "reducer": "mean"})
+
+
+LIGHTING = band("lighting", "avg_rad", 500)
+LST = band("lst", "LST_Day_1km", 1000)
+
+
+def test_second_run_is_served_from_the_cache(ee, cache):
+    first, failed = cached_extract(grid(), 30, [LIGHTING, LST], cache, ee_module=fake_ee, **FAST)
+    assert failed == 0 and len(first) == 30
+    ee.clear()
+
+    again, failed = cached_extract(grid(), 30, [LIGHTING, LST], cache, ee_module=fake_ee, **FAST)
+    assert ee == []
+    assert [c["properties"] for c in again] == [c["properties"] for c in first]
+
+
+def test_a_missing_band_is_reduced_at_the_scale_of_all_requested_bands(ee, cache):
+    first, _ = cached_extract(grid(), 30, [LIGHTING], cache, ee_module=fake_ee, **FAST)
+    assert set(ee) == {500}
+    ee.clear()
+
+    # Only lst is missing; it is reduced at 500 m, the finest requested scale
+    cells, _ = cached_extract(grid(), 30, [LIGHTING, LST], cache, ee_module=fake_ee, **FAST)
+    assert set(ee) == {500}
+    assert all(c["properties"]["lst"] is not None for c in cells)
+    ee.clear()
+
+    fine = band("landcover", "label", 30)
+    cells, _ = cached_extract(grid(), 30, [LIGHTING, fine], cache, ee_module=fake_ee, **FAST)
+    # A 30 m band is its own scale group: lighting is still reused at 500 m
+    assert set(ee) == {30}
+    assert [c["properties"]["lighting"] for c in cells] == [c["properties"]["lighting"] for c in first]
+    assert band_key(LIGHTING, 30) != band_key(LIGHTING, 500) == band_key(LIGHTING)
+
+
+def test_missing_bands_of_different_scale_groups_go_in_separate_requests(ee, cache):
+    no2 = band("no2", "tropospheric_NO2_column_number_density", 7000)
+    cells, failed = cached_extract(grid(), 30, [LIGHTING, LST, no2], cache, ee_module=fake_ee, **FAST)
+    assert failed == 0
+    assert sorted(set(ee)) == [500, 7000]
+    assert all(not math.isnan(c["properties"]["no2"]) for c in cells)
+
+
+def test_failed_cells_are_nan_in_grid_order_and_not_cached(ee, cache):
+    fake_ee.configure(failure_rate=1.0)
+    cells, failed = cached_extract(grid(), 30, [LIGHTING], cache, ee_module=fake_ee, max_retries=1, **FAST)
+    assert failed == 30
+    assert [c["id"] for c in cells] == [str(i) for i in range(30)]
+    assert all(math.isnan(c["properties"]["lighting"]) for c in cells)
+    hashes = [geometry_hash(c["geometry"]) for c in cells]
+    assert cache.get_many(hashes, band_key(LIGHTING)) == {}
@@ -0,0 +1,116 @@
+"""ee_extract.extract against fake_ee: order, values, retries, failures and concurrency."""
+import random
+import time
+
+import pytest
+
+import fake_ee
+from ee_extract import Band, BatchResult, extract, multiband_layer, scale_groups, scale_layers
+
+FAST = {"requests_per_second": 0, "retry_wait": 0}
+
+
+@pytest.fixture(autouse=True)
+def ee():
+    fake_ee.configure()
+    random.seed(0)
+    yield
+    fake_ee.configure()
+
+
+def grid(rows=8, cols=10):
+    collection = fake_ee.fishnet(fake_ee.Geometry.BBox(77.0, 28.4, 77.5, 28.8), rows=rows, cols=cols)
+    return collection.features, collection.toList(rows * cols)
+
+
+def layer():
+    return multiband_layer("cells", [
+        Band("landcover", fake_ee.ImageCollection("DW").select("label").mode(), fake_ee.Reducer.mode(), 30),
+        Band("lighting", fake_ee.ImageCollection("VIIRS").select("avg_rad").median(), fake_ee.Reducer.mean(), 500),
+    ], ee_module=fake_ee)
+
+
+def test_every_cell_comes_back_once_in_grid_order_with_its_own_values():
+    features, ee_list = grid()
+    batches = list(extract(ee_list, len(features), [layer()], batch_size=7, max_workers=4, ee_module=fake_ee,
+                           **FAST))
+    assert all(b.ok for b in batches)
+    assert [b.start for b in batches] == sorted(b.start for b in batches)
+    cells = [c for b in batches for c in b.cells()]
+    assert [c["id"] for c in cells] == [f["id"] for f in features]
+    for cell in cells:
+        x, y = fake_ee._centroid(cell["geometry"])
+        assert cell["properties"]["landcover"] == fake_ee._synthetic("label", x, y)
+        assert cell["properties"]["lighting"] == fake_ee._synthetic("avg_rad", x, y)
+
+
+def test_start_resumes_part_way_through_the_grid():
+    features, ee_list = grid()
+    batches = list(extract(ee_list, len(features), [layer()], start=35, batch_size=10, ee_module=fake_ee, **FAST))
+    assert batches[0].start == 35 and batches[-1].end == len(features)
+    assert [c["id"] for b in batches for c in b.cells()] == [f["id"] for f in features[35:]]
+
+
+def test_transient_failures_are_retried():
+    fake_ee.configure(failure_rate=0.3)
+    before = fake_ee.stats()["failures"]
+    features, ee_list = grid()
+    batches = list(extract(ee_list, len(features), [layer()], batch_size=5, max_retries=20, ee_module=fake_ee,
+                           **FAST))
+    assert fake_ee.stats()["failures"] > before
+    assert all(b.ok for b in batches)
+    assert sum(len(b.cells()) for b in batches) == len(features)
+
+
+def test_batches_that_keep_failing_are_reported_not_dropped():
+    fake_ee.configure(failure_rate=1.0)
+    features, ee_list = grid()
+    batches = list(extract(ee_list, len(features), [layer()], batch_size=10, max_retries=2, ee_module=fake_ee,
+                           **FAST))
+    assert batches and not any(b.ok for b in batches)
+    assert all(isinstance(b.error, fake_ee.EEException) for b in batches)
+    # Contiguous cover of the grid, so callers can record exactly what is missing
+    assert batches[0].start == 0 and batches[-1].end == len(features)
+    assert all(a.end == b.start for a, b in zip(batches, batches[1:]))
+
+
+def test_requests_overlap():
+    fake_ee.configure(latency=0.05)
+    features, ee_list = grid()
+    start = time.perf_counter()
+    batches = list(extract(ee_list, len(features), [layer()], batch_size=4, max_batch_size=4, max_workers=8,
+                           ee_module=fake_ee, **FAST))
+    elapsed = time.perf_counter() - start
+    # 20 requests one after the other would take 1 s
+    assert len(batches) == 20
+    assert elapsed < 0.5
+
+
+def test_cells_join_layers_on_feature_id_not_position():
+    first = [{"id": "a", "geometry": {"g": 1}, "properties": {"x": 1}},
+             {"id": "b", "geometry": {"g": 2}, "properties": {"x": 2}}]
+    second = [{"id": "b", "geometry": None, "properties": {"y": 20}},
+              {"id": "zzz", "geometry": None, "properties": {"y": 99}},
+              {"id": "a", "geometry": None, "properties": {"y": 10}}]
+    cells = BatchResult(0, 2, {"one": first, "two": second}).cells()
+    assert [(c["id"], c["properties"]) for c in cells] == [("a", {"x": 1, "y": 10}), ("b", {"x": 2, "y": 20})]
+
+
+def test_scale_layers_keep_fine_and_coarse_bands_apart():
+    def make(name, source, scale):
+        return Band(name, fake_ee.ImageCollection(name).select(source).mean(), fake_ee.Reducer.mean(), scale)
+
+    bands = [make("no2", "tropospheric_NO2_column_number_density", 7000), make("landcover", "label", 10),
+             make("lst", "LST_Day_1km", 1000), make("lighting", "avg_rad", 500)]
+    assert [[b.name for b in g] for g in scale_groups(bands)] == [["landcover"], ["lighting", "lst"], ["no2"]]
+
+    layers = scale_layers("cells", bands, ee_module=fake_ee)
+    assert [(layer.name, layer.scale) for layer in layers] == [("cells@10", 10), ("cells@500", 500),
+                                                                ("cells@7000", 7000)]
+    features, ee_list = grid()
+    cells = [c for b in extract(ee_list, len(features), layers, batch_size=20, ee_module=fake_ee, **FAST)
+             for c in b.cells()]
+    assert [c["id"] for c in cells] == [f["id"] for f in features]
+    assert all(c["geometry"] is not None for c in cells)
+    x, y = fake_ee._centroid(cells[0]["geometry"])
+    assert cells[0]["properties"]["no2"] == fake_ee._synthetic("tropospheric_NO2_column_number_density", x, y)
@@ -0,0 +1,71 @@
+"""flood_zonal.flood_fraction against a per-pixel loop on a synthetic water mask."""
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip("rasterio")
+from rasterio.transform import from_origin  # noqa: E402
+
+import flood_zonal  # noqa: E402
+
+WEST, NORTH, RES = 77.0, 28.65, 0.001
+WIDTH, HEIGHT = 230, 170
+
+
+def write_raster(path, data, dtype, nodata):
+    profile = {"driver": "GTiff", "width": data.shape[1], "height": data.shape[0], "count": 1, "dtype": dtype,
+               "crs": "EPSG:4326", "transform": from_origin(WEST, NORTH, RES, RES), "nodata": nodata}
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(data.astype(dtype), 1)
+
+
+def inside(x, y, ring):
+    """Ray casting: is (x, y) inside the polygon ring?"""
+    hit = False
+    for (x0, y0), (x1, y1) in zip(ring, ring[1:]):
+        if (y0 > y) != (y1 > y) and x < x0 + (y - y0) * (x1 - x0) / (y1 - y0):
+            hit = not hit
+    return hit
+
+
+def test_flood_fraction_matches_a_per_pixel_loop(tmp_path):
+    rng = np.random.default_rng(3)
+    mask = (rng.random((HEIGHT, WIDTH)) < 0.3).astype("uint8")
+    mask[rng.random((HEIGHT, WIDTH)) < 0.05] = 255
+    mask[100:, 150:] = 255  # a corner without data
+    mask_path = str(tmp_path / "mask.tif")
+    write_raster(mask_path, mask, "uint8", 255)
+
+    def square(x0, y0, size):
+        return {"type": "Polygon", "coordinates": [[[x0, y0], [x0 + size, y0], [x0 + size, y0 + size],
+                                                   [x0, y0 + size], [x0, y0]]]}
+
+    # Edges off the pixel centres, so centre-in-polygon is never ambiguous
+    cells = [square(WEST + 0.0102 + 0.0252 * i, NORTH - 0.0902 - 0.0252 * j, 0.025)
+             for i in range(8) for j in range(3)]
+    # Below the squares: grid cells never overlap
+    triangle = [[WEST + 0.0102, NORTH - 0.1682], [WEST + 0.1302, NORTH - 0.1682], [WEST + 0.0702, NORTH - 0.1452]]
+    cells.append({"type": "Polygon", "coordinates": [triangle + triangle[:1]]})
+    cells.append(square(WEST + 0.1602, NORTH - 0.1652, 0.004))  # all nodata
+    cells.append(square(WEST - 1.0, NORTH + 1.0, 0.01))  # off the raster
+    cells.append(None)
+
+    fractions = flood_zonal.flood_fraction(cells, mask_path, block_size=40)
+
+    xs = WEST + (np.arange(WIDTH) + 0.5) * RES
+    ys = NORTH - (np.arange(HEIGHT) + 0.5) * RES
+    for cell, got in zip(cells, fractions):
+        wet = total = 0
+        if cell is not None:
+            ring = cell["coordinates"][0]
+            x0, y0 = np.min(ring, axis=0)
+            x1, y1 = np.max(ring, axis=0)
+            for r in np.nonzero((ys > y0) & (ys < y1))[0]:
+                for c in np.nonzero((xs > x0) & (xs < x1))[0]:
+                    if mask[r, c] != 255 and inside(xs[c], ys[r], ring):
+                        total += 1
+                        wet += mask[r, c] == 1
+        if total:
+            assert got == pytest.approx(wet / total)
+        else:
+            assert np.isnan(got)
+    assert np.isnan(fractions[-3:]).all()
@@ -0,0 +1,54 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import grid_io
+
+pytestmark = pytest.mark.skipif(grid_io.pq is None, reason="pyarrow is not installed")
+
+
+def grid_frame():
+    square = {"type": "Polygon", "coordinates": [[[77.0, 28.0], [77.01, 28.0], [77.01, 28.01], [77.0, 28.01],
+                                                  [77.0, 28.0]]]}
+    return pd.DataFrame({
+        "landcover_class": [6, 1],
+        "landcover_name": ["Built area", "Trees"],
+        "lst_celsius": [31.123456789012, np.nan],
+        "no2": [1.2345678901234e-4, 9.87654321e-5],
+        "geometry": [json.dumps(square), json.dumps(square)],
+    })
+
+
+def test_parquet_round_trips_the_csv_values_exactly(tmp_path):
+    path = str(tmp_path / "grid.csv")
+    df = grid_frame()
+    grid_io.save_grid(df, path)
+
+    from_parquet = grid_io.to_frame(grid_io.read_grid(grid_io.parquet_path(path)))
+    from_csv = pd.read_csv(path, float_precision="round_trip")
+    for column in ("lst_celsius", "no2"):
+        assert from_parquet[column].dtype == np.float64
+        np.testing.assert_array_equal(from_parquet[column], from_csv[column])
+        np.testing.assert_array_equal(from_parquet[column], df[column])
+
+
+def test_csv_fallback_reads_the_values_that_were_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(grid_io, "pq", None)
+    path = str(tmp_path / "grid.csv")
+    grid_io.save_grid(grid_frame(), path)
+    assert grid_io.load_grid(path)["no2"].tolist() == grid_frame()["no2"].tolist()
+
+
+def test_rewriting_a_grid_loaded_from_parquet_does_not_round_it(tmp_path):
+    path = str(tmp_path / "grid.csv")
+    grid_io.save_grid(grid_frame(), path)
+    for _ in range(2):
+        df = grid_io.load_grid(path)
+        df["flood_fraction"] = 0.1
+        grid_io.save_grid(df, path)
+    rewritten = pd.read_csv(path, float_precision="round_trip")
+    np.testing.assert_array_equal(rewritten["lst_celsius"], grid_frame()["lst_celsius"])
+    assert rewritten["no2"].tolist() == grid_frame()["no2"].tolist()
+    assert json.loads(grid_io.load_grid(path)["geometry"][0])["type"] == "Polygon"
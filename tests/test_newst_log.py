@@ -0,0 +1,82 @@
+"""newst_log's block-wise water mask and polygons against per-pixel loops on synthetic scenes."""
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip("rasterio")
+from rasterio.transform import from_origin  # noqa: E402
+
+import newst_log  # noqa: E402
+
+WEST, NORTH, RES = 77.0, 28.65, 0.001
+WIDTH, HEIGHT = 230, 170
+NODATA = -9999.0
+
+
+def write_raster(path, data, dtype, nodata):
+    profile = {"driver": "GTiff", "width": data.shape[1], "height": data.shape[0], "count": 1, "dtype": dtype,
+               "crs": "EPSG:4326", "transform": from_origin(WEST, NORTH, RES, RES), "nodata": nodata}
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(data.astype(dtype), 1)
+
+
+@pytest.fixture
+def scenes(tmp_path):
+    rng = np.random.default_rng(7)
+    pre = rng.normal(-15, 2, (HEIGHT, WIDTH))
+    post = pre + rng.normal(0, 2, (HEIGHT, WIDTH))
+    pre[rng.random((HEIGHT, WIDTH)) < 0.02] = NODATA
+    post[:5, :] = NODATA
+    paths = str(tmp_path / "pre.tif"), str(tmp_path / "post.tif")
+    write_raster(paths[0], pre, "float32", NODATA)
+    write_raster(paths[1], post, "float32", NODATA)
+    return paths, pre.astype("float32"), post.astype("float32")
+
+
+def brute_force_mask(pre, post, rows, cols):
+    out = np.zeros((len(rows), len(cols)), dtype="uint8")
+    for i, r in enumerate(rows):
+        for j, c in enumerate(cols):
+            if pre[r, c] == NODATA or post[r, c] == NODATA:
+                out[i, j] = newst_log.MASK_NODATA
+            elif pre[r, c] - post[r, c] < newst_log.THRESHOLD_DB:
+                out[i, j] = 1
+    return out
+
+
+def test_water_mask_matches_a_per_pixel_loop(scenes, tmp_path):
+    (pre_path, post_path), pre, post = scenes
+    mask_path = str(tmp_path / "mask.tif")
+    # A bbox inside the scene, tiled into uneven 64-pixel blocks
+    lonlat = [WEST + 0.0203, NORTH - 0.1504, WEST + 0.2001, NORTH - 0.0102]
+    window, crs, flooded = newst_log.write_water_mask(pre_path, post_path, mask_path, lonlat, block_size=64)
+
+    rows = range(int(window.row_off), int(window.row_off + window.height))
+    cols = range(int(window.col_off), int(window.col_off + window.width))
+    expected = brute_force_mask(pre, post, rows, cols)
+    with rasterio.open(mask_path) as src:
+        mask = src.read(1)
+        assert src.nodata == newst_log.MASK_NODATA
+    np.testing.assert_array_equal(mask, expected)
+    assert flooded == int((expected == 1).sum())
+
+
+def test_water_polygons_cover_exactly_the_wet_pixels(scenes, tmp_path):
+    (pre_path, post_path), pre, post = scenes
+    mask_path = str(tmp_path / "mask.tif")
+    whole = [WEST, NORTH - HEIGHT * RES, WEST + WIDTH * RES, NORTH]
+    _, _, flooded = newst_log.write_water_mask(pre_path, post_path, mask_path, whole, block_size=50)
+    features, sum_x, sum_y = newst_log.water_polygons(mask_path, block_size=50, min_region_pixels=1)
+
+    def ring_area(ring):
+        x, y = np.asarray(ring).T
+        return abs(np.dot(x, np.roll(y, 1)) - np.dot(y, np.roll(x, 1))) / 2
+
+    # Outer ring minus holes, summed over the polygons
+    area = sum(ring_area(outer) - sum(ring_area(hole) for hole in holes)
+               for outer, *holes in (f["geometry"]["coordinates"] for f in features))
+    assert area / RES ** 2 == pytest.approx(flooded)
+
+    wet = brute_force_mask(pre, post, range(HEIGHT), range(WIDTH)) == 1
+    rows, cols = np.nonzero(wet)
+    assert sum_x == pytest.approx(np.sum(WEST + (cols + 0.5) * RES))
+    assert sum_y == pytest.approx(np.sum(NORTH - (rows + 0.5) * RES))
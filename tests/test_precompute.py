@@ -0,0 +1,281 @@
+"""precompute.run() and bulk_load against a recording connection: which statements run in which transaction."""
+import csv
+import json
+import re
+
+import pytest
+
+import bulk_load
+import precompute
+
+LIVE_TABLES = {"testing_shapes", "district_grid", "grid_cells", "grid_spec", "grid_pyramid", "district_stats"}
+EXCLUSIVE_RE = re.compile(r"^\s*(DROP TABLE IF EXISTS|ALTER TABLE)\s+(\w+)", re.IGNORECASE | re.MULTILINE)
+
+
+class RecordingCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.connection = conn
+        self.itersize = 0
+        self._rows = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        if isinstance(sql, bytes):  # from execute_values
+            sql = sql.decode()
+        self.conn.transactions[-1].append(sql)
+        self._rows = self.conn.answer(sql, params)
+
+    def copy_expert(self, sql, buf):
+        self.conn.transactions[-1].append(sql)
+        self.conn.copied.extend(csv.reader(buf))
+
+    def mogrify(self, template, args):
+        if isinstance(template, bytes):
+            template = template.decode()
+        return (template % tuple(repr(a) for a in args)).encode()
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class RecordingConnection:
+    encoding = "UTF8"
+
+    def __init__(self, columns=("flood_frac", "ps_dist_m")):
+        self.columns = columns
+        self.transactions = []
+        self.created = set()
+        self.stations = []
+        self.centroids = []
+        self.copied = []
+        self.spec = (0, 0)
+        self.max_gid = 0
+
+    def answer(self, sql, params):
+        if "information_schema.columns" in sql:
+            return [(c,) for c in ("gid", "geom") + tuple(self.columns)]
+        if "to_regclass" in sql:
+            name = params[0] if params else "testing_shapes"
+            return [(name == "testing_shapes" or name[:-len("_new")] in self.created,)]
+        match = re.search(r"CREATE TABLE (\w+)_new", sql)
+        if match:
+            self.created.add(match.group(1))
+        if "FROM ps_location_ascii" in sql:
+            return self.stations
+        if "ST_Centroid(geom)" in sql:
+            return self.centroids
+        if "district_grid_new;" in sql and "COUNT" in sql:
+            return [(0, 0)]
+        if "FROM grid_spec_new;" in sql:
+            return [self.spec]
+        if "COALESCE(MAX(gid), 0)" in sql:
+            return [(self.max_gid,)]
+        return []
+
+    def cursor(self, name=None, cursor_factory=None):
+        return RecordingCursor(self)
+
+    def __enter__(self):
+        self.transactions.append([])
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    connection = RecordingConnection()
+    monkeypatch.setattr(precompute.psycopg2, "connect", lambda **settings: connection)
+    monkeypatch.setattr(precompute.response_cache, "shared_tier_from_env", lambda: None)
+    monkeypatch.setattr(precompute.district_stats, "fetch_police_stations", lambda cur, mocks=True: [])
+    return connection
+
+
+def exclusive_targets(statements):
+    return {m.group(2) for sql in statements for m in EXCLUSIVE_RE.finditer(sql)}
+
+
+def test_refresh_builds_new_tables_and_swaps_them_in_a_short_final_transaction(conn):
+    precompute.run(precompute.COMMANDS["refresh"])
+    migrate, build, swap = conn.transactions
+
+    # Nothing to migrate, nothing locked
+    assert not exclusive_targets(migrate)
+    # The long build never drops or alters a table readers use
+    assert not exclusive_targets(build) & LIVE_TABLES
+    # Scratch tables are dropped only from the session's temp schema
+    dropped = re.findall(r"DROP TABLE IF EXISTS ([\w.]+)", "\n".join(build))
+    assert dropped and all(t.endswith("_new") or t.startswith("pg_temp.") for t in dropped)
+    # ps_dist_m is written to the copy of the grid, never to the live table
+    assert not [sql for sql in build if re.search(r"(UPDATE|INSERT INTO)\s+testing_shapes\b(?!_new)", sql)]
+    assert any(sql.startswith("UPDATE testing_shapes_new") and "ps_dist_m" in sql for sql in build)
+    assert build[0] == "DROP TABLE IF EXISTS testing_shapes_new;"
+    # The swap renames every rebuilt table and does nothing else expensive
+    assert LIVE_TABLES <= exclusive_targets(swap)
+    assert not [sql for sql in swap if "CREATE" in sql or "UPDATE" in sql or "ANALYZE" in sql]
+
+
+def test_migrate_only_alters_when_columns_are_missing(conn):
+    conn.columns = ("flood_frac",)
+    precompute.run(precompute.COMMANDS["migrate"])
+    migrate = conn.transactions[0]
+    assert exclusive_targets(migrate) == {"testing_shapes"}
+    assert any("ADD COLUMN IF NOT EXISTS ps_dist_m" in sql for sql in migrate)
+    assert not any("ADD COLUMN IF NOT EXISTS flood_frac" in sql for sql in migrate)
+
+
+def test_police_distance_uses_the_api_station_set_without_mocks(conn):
+    from police_stations import StationIndex, fetch_police_stations
+
+    conn.stations = [{"name": "PS A", "district": "Delhi", "x": None, "y": None, "lon": 77.20, "lat": 28.60},
+                     {"name": "PS B", "district": "Delhi", "x": "77 18 0 E", "y": "28 36 0 N", "lon": None, "lat": None}]
+    conn.centroids = [(1, 77.20, 28.60), (2, 77.25, 28.70), (3, 76.95, 28.45)]
+    conn.transactions.append([])
+    with conn.cursor() as cur:
+        precompute.build_police_distance(cur)
+    inserted = " ".join(sql for sql in conn.transactions[-1] if "INSERT INTO ps_dist" in sql)
+    written = {int(g): float(d) for g, d in re.findall(r"\((\d+), ?([\d.e+-]+)\)", inserted)}
+
+    class Rows:
+        def execute(self, sql):
+            pass
+
+        def fetchall(self):
+            return conn.stations
+
+    # The API's fallback index for cells without ps_dist_m
+    index = StationIndex(fetch_police_stations(Rows(), mocks=False))
+    expected = index.nearest_distance([c[1] for c in conn.centroids], [c[2] for c in conn.centroids])
+    assert len(index) == 2
+    assert [written[g] for g in (1, 2, 3)] == pytest.approx(expected.tolist())
+    assert written[1] == 0.0
+
+
+def test_bulk_load_derives_tables_from_the_new_grid_and_swaps_everything_at_the_end(conn, tmp_path):
+    path = tmp_path / "grid.csv"
+    path.write_text("landcover_class,landcover_name,lighting_radiance,geometry\n"
+                    '50,Built-up,12.5,"{""type"": ""Polygon"", ""coordinates"": []}"\n', encoding="utf-8")
+    precompute.run(bulk_load.load_steps(str(path), 100), bulk_load.SWAPS)
+    migrate, build, swap = conn.transactions
+
+    # The build reads testing_shapes_new and never locks a live table
+    assert not exclusive_targets(build) & LIVE_TABLES
+    assert not [sql for sql in build if re.search(r"\btesting_shapes\b(?!_new)", sql)]
+    # testing_shapes moves in the same short transaction as its derived tables, first
+    assert exclusive_targets(swap) >= LIVE_TABLES
+    assert "ALTER TABLE testing_shapes_new RENAME TO testing_shapes;" in swap
+    assert swap.index("ALTER TABLE testing_shapes_new RENAME TO testing_shapes;") < \
+        swap.index("ALTER TABLE district_grid_new RENAME TO district_grid;")
+
+
+def test_csv_rows_map_columns_to_testing_shapes_order(tmp_path):
+    geometry = {"type": "Polygon", "coordinates": [[[77.0, 28.0], [77.1, 28.0], [77.1, 28.1], [77.0, 28.0]]]}
+    path = tmp_path / "grid.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["no2", "landcover_name", "landcover_class", "lighting_radiance", "lst_celsius",
+                         "uhi_intensity", "geometry"])
+        writer.writerow(["0.0001", "Trees", "10", "3.5", "31.2", "", json.dumps(geometry)])
+        writer.writerow(["", "Water", "80", "", "", "", ""])
+
+    first, second = bulk_load.csv_rows(str(path))
+    # gid, landcover_, landcove_1, lighting_r, lst_celsiu, uhi_intens, no2, flood_frac, geometry
+    assert first == [1, "10", "Trees", "3.5", "31.2", None, "0.0001", None, json.dumps(geometry)]
+    assert second[0] == 2 and second[-1] is None
+
+
+def test_load_step_copies_in_chunks_and_builds_indexes_after_the_insert(conn, tmp_path):
+    path = tmp_path / "grid.csv"
+    path.write_text("landcover_name,geometry\n" + "".join(f'Trees,"{{}}"\n' for _ in range(5)) + "Water,\n",
+                    encoding="utf-8")
+    conn.transactions.append([])
+    with conn.cursor() as cur:
+        bulk_load.load_step(str(path), 2)(cur)
+    statements = conn.transactions[-1]
+
+    assert sum(sql == bulk_load.COPY_SQL for sql in statements) == 3
+    assert [row[0] for row in conn.copied] == [str(g) for g in range(1, 7)]
+    insert = next(i for i, sql in enumerate(statements) if "INSERT INTO testing_shapes_new" in sql)
+    assert "ST_GeomFromGeoJSON" in statements[insert] and "geom_src IS NOT NULL" in statements[insert]
+    pkey = statements.index("ALTER TABLE testing_shapes_new ADD PRIMARY KEY (gid);")
+    gist = next(i for i, sql in enumerate(statements) if "USING GIST" in sql)
+    analyze = statements.index("ANALYZE testing_shapes_new;")
+    assert insert < pkey < gist < analyze
+
+
+def test_grid_cells_are_placed_from_the_new_grid_and_sized_after_they_exist(conn):
+    conn.transactions.append([])
+    with conn.cursor() as cur:
+        precompute.build_grid_cells(cur, grid="testing_shapes_new")
+    statements = conn.transactions[-1]
+
+    def position(text):
+        return next(i for i, sql in enumerate(statements) if text in sql)
+
+    bounds = position("CREATE TEMP TABLE grid_bounds")
+    assert "FROM testing_shapes_new" in statements[bounds] and "ON COMMIT DROP" in statements[bounds]
+    # Rows run along y and columns along x, snapped to the nearest fishnet line
+    cells = statements[position("CREATE TABLE grid_cells_new")]
+    assert "ROUND((b.y0 - s.origin_y) / s.dy)::integer AS cell_row" in cells
+    assert "ROUND((b.x0 - s.origin_x) / s.dx)::integer AS cell_col" in cells
+    # The spec exists before the cells are placed on it, and is sized after
+    assert bounds < position("CREATE TABLE grid_spec_new") < position("CREATE TABLE grid_cells_new") \
+        < position("UPDATE grid_spec_new") < position("ALTER TABLE grid_cells_new ADD PRIMARY KEY (gid);")
+    # Only the _new tables are written; the live ones are left to swap_all
+    assert not exclusive_targets(statements) & LIVE_TABLES
+    assert {"grid_cells", "grid_spec"} <= conn.created
+
+
+def test_grid_pyramid_rolls_up_the_new_cells_with_disjoint_gids(conn):
+    # The largest grid whose level-1 block rows still fit in the gid
+    conn.spec = (2 * precompute.PYRAMID_GID_STRIDE, 3)
+    conn.transactions.append([])
+    with conn.cursor() as cur:
+        precompute.build_grid_pyramid(cur, grid="testing_shapes_new", levels=3)
+    statements = conn.transactions[-1]
+    create = next(sql for sql in statements if "CREATE TABLE grid_pyramid_new" in sql)
+    assert "FROM testing_shapes_new w" in create and "JOIN grid_cells_new c" in create
+    assert "l.level * 100000000 + (c.cell_row >> l.level) * 10000" in create
+    assert "ALTER TABLE grid_pyramid_new ADD PRIMARY KEY (level, block_row, block_col);" in statements
+    assert not exclusive_targets(statements) & LIVE_TABLES
+
+
+@pytest.mark.parametrize("spec, max_gid", [((20001, 10), 200), ((10, 20001), 200), ((10, 10), 10 ** 8)])
+def test_grid_pyramid_refuses_grids_whose_gids_would_collide(conn, spec, max_gid):
+    conn.spec, conn.max_gid = spec, max_gid
+    conn.transactions.append([])
+    with conn.cursor() as cur, pytest.raises(RuntimeError):
+        precompute.build_grid_pyramid(cur)
+    assert not any("CREATE TABLE grid_pyramid_new" in sql for sql in conn.transactions[-1])
+
+
+def test_district_grid_maps_every_gadm_level_to_the_new_grid(conn):
+    conn.transactions.append([])
+    with conn.cursor() as cur:
+        precompute.build_district_grid(cur, grid="testing_shapes_new")
+    statements = conn.transactions[-1]
+    create = next(sql for sql in statements if "CREATE TABLE district_grid_new" in sql)
+    for table, column in precompute.GADM_LEVELS:
+        assert f"SELECT {column} AS name, geom FROM {table}" in create
+    assert "FROM testing_shapes_new w" in create and "ON ST_Intersects(w.geom, l.geom)" in create
+    # The API looks names up as LOWER(name), one row per (name, cell)
+    assert "LOWER(l.name) AS name_key" in create and "DISTINCT ON (LOWER(l.name), w.gid)" in create
+    assert "ALTER TABLE district_grid_new ADD PRIMARY KEY (name_key, gid);" in statements
+    assert not exclusive_targets(statements) & LIVE_TABLES
@@ -0,0 +1,87 @@
+"""RegularGrid point lookups on a small fishnet with binary-exact cell edges."""
+import math
+
+import numpy as np
+import pytest
+
+from regular_grid import RegularGrid
+
+# 3 rows x 4 cols of 0.25 x 0.125 degree cells from (77, 28); cell (1, 3) is empty
+SPEC = {"origin_x": 77.0, "origin_y": 28.0, "dx": 0.25, "dy": 0.125, "n_rows": 3, "n_cols": 4}
+
+
+def make_grid():
+    rows = [{"cell_row": i, "cell_col": j, "gid": 1 + i * 4 + j, "landcove_1": "Trees" if j % 2 else "Built area",
+             "lighting_r": float(i * 10 + j), "no2": None}
+            for i in range(3) for j in range(4) if (i, j) != (1, 3)]
+    return RegularGrid.from_rows(SPEC, rows)
+
+
+def test_points_inside_cells_map_to_their_row_and_col():
+    grid = make_grid()
+    row, col, found = grid.locate([77.1, 77.6, 77.9], [28.05, 28.2, 28.3])
+    assert row.tolist() == [0, 1, 2]
+    assert col.tolist() == [0, 2, 3]
+    assert found.all()
+
+
+def test_points_on_inner_edges_belong_to_the_cell_above_and_right():
+    grid = make_grid()
+    # Cells are closed on their lower and left edges: x = 77.25 is col 1, y = 28.125 is row 1
+    row, col, found = grid.locate([77.0, 77.25, 77.5, 77.25], [28.0, 28.0, 28.125, 28.25])
+    assert list(zip(row.tolist(), col.tolist())) == [(0, 0), (0, 1), (1, 2), (2, 1)]
+    assert found.all()
+
+
+def test_outer_upper_and_right_boundary_is_outside_the_grid():
+    grid = make_grid()
+    east, north = 77.0 + 4 * 0.25, 28.0 + 3 * 0.125
+    row, col, found = grid.locate([east, 77.1, east, math.nextafter(east, 0)],
+                                  [28.05, north, north, math.nextafter(north, 0)])
+    assert found.tolist() == [False, False, False, True]
+    assert (row[-1], col[-1]) == (2, 3)
+
+
+def test_points_outside_the_grid_or_nan_are_not_found():
+    grid = make_grid()
+    lng = [76.99, 77.1, 78.5, 77.1, np.nan, 77.1]
+    lat = [28.05, 27.99, 28.05, 29.0, 28.05, np.nan]
+    row, col, found = grid.locate(lng, lat)
+    assert not found.any()
+    # Rows/cols of misses stay valid indexes so callers can gather without masking first
+    assert ((row >= 0) & (row < 3) & (col >= 0) & (col < 4)).all()
+    assert grid.lookup(lng, lat) == [None] * len(lng)
+
+
+def test_empty_cells_inside_the_grid_are_not_found():
+    grid = make_grid()
+    row, col, found = grid.locate([77.8], [28.13])
+    assert (row[0], col[0], found[0]) == (1, 3, False)
+    assert grid.lookup([77.8], [28.13]) == [None]
+
+
+def test_lookup_returns_cell_attributes_and_the_rebuilt_polygon():
+    grid = make_grid()
+    cell, missing = grid.lookup([77.6, 80.0], [28.2, 28.2], geometry=True)
+    assert missing is None
+    assert cell["gid"] == 1 + 1 * 4 + 2
+    assert (cell["row"], cell["col"]) == (1, 2)
+    assert cell["landcove_1"] == "Built area"
+    assert cell["lighting_r"] == 12.0
+    assert cell["no2"] is None
+    assert cell["geometry"]["coordinates"][0] == [[77.5, 28.125], [77.75, 28.125], [77.75, 28.25],
+                                                  [77.5, 28.25], [77.5, 28.125]]
+    assert "geometry" not in grid.lookup([77.6], [28.2])[0]
+
+
+def test_spec_counts_only_non_empty_cells():
+    spec = make_grid().spec()
+    assert spec == {"origin": [77.0, 28.0], "cell_size": [0.25, 0.125], "rows": 3, "cols": 4, "cells": 11}
+
+
+@pytest.mark.parametrize("lng, lat", [(77.0, 28.0), (77.999, 28.374)])
+def test_every_point_of_a_cell_polygon_maps_back_to_that_cell(lng, lat):
+    grid = make_grid()
+    cell = grid.lookup([lng], [lat], geometry=True)[0]
+    x0, y0 = cell["geometry"]["coordinates"][0][0]
+    assert grid.lookup([x0], [y0])[0]["gid"] == cell["gid"]
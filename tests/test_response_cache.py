@@ -0,0 +1,46 @@
+import os
+
+import response_cache
+from response_cache import DiskTier, ResponseCache
+
+
+def test_disk_tier_bump_deletes_old_versions(tmp_path):
+    cache = ResponseCache(shared=DiskTier(str(tmp_path)))
+    key = cache.key("Delhi", "json")
+    cache.set(key, b"old payload")
+    old_dirs = [d for d in os.listdir(tmp_path) if d.startswith("v-")]
+    assert len(old_dirs) == 1
+
+    cache.invalidate()
+    new_key = cache.key("Delhi", "json")
+    assert new_key != key
+    cache.set(new_key, b"new payload")
+    dirs = [d for d in os.listdir(tmp_path) if d.startswith("v-")]
+    assert len(dirs) == 1 and dirs != old_dirs
+    assert cache.shared.get(new_key) == b"new payload"
+
+
+def test_disk_tier_ignores_writes_for_a_superseded_version(tmp_path):
+    tier = DiskTier(str(tmp_path))
+    stale = ResponseCache(shared=tier)
+    key = stale.key("Delhi", "json")
+    # Another worker bumps the version before this one writes
+    tier.bump_version()
+    stale.set(key, b"stale payload")
+    assert tier.get(key) is None
+    assert not [d for d in os.listdir(tmp_path) if d.startswith("v-")]
+
+
+def test_shared_version_is_read_at_most_once_per_ttl(tmp_path, monkeypatch):
+    tier = DiskTier(str(tmp_path))
+    reads = []
+    get_version = tier.get_version
+    monkeypatch.setattr(tier, "get_version", lambda: reads.append(1) or get_version())
+    monkeypatch.setattr(response_cache, "VERSION_TTL", 60.0)
+    cache = ResponseCache(shared=tier)
+    for _ in range(10):
+        cache.key("Delhi")
+    assert len(reads) == 1
+    # Invalidating through this cache updates its copy right away
+    version = cache.invalidate()
+    assert cache.key("Delhi").startswith(version + ":")
@@ -0,0 +1,109 @@
+"""uhi baselines against a pandas groupby and a brute-force window loop."""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import uhi
+
+ROWS, COLS = 9, 11
+
+
+def synthetic_grid(seed=0):
+    rng = np.random.default_rng(seed)
+    row, col = (a.ravel() for a in np.mgrid[:ROWS, :COLS])
+    lst = rng.normal(32.0, 3.0, row.size)
+    lst[rng.random(row.size) < 0.15] = np.nan
+    # 6 = built area, 8/9 = snow and unknown: not rural
+    landcover = rng.choice([0, 1, 2, 4, 5, 6, 6, 7, 8, 9], row.size)
+    # The top-right 3 x 3 corner has no rural cell with an LST
+    corner = (row >= ROWS - 3) & (col >= COLS - 3)
+    landcover[corner & (row % 2 == 0)] = uhi.BUILT_CLASS
+    lst[corner & (row % 2 == 1)] = np.nan
+    return lst, landcover, row, col
+
+
+def groupby_baselines(lst, landcover, codes, n_regions, stat):
+    df = pd.DataFrame({"lst": lst, "code": codes})[np.isin(landcover, uhi.RURAL_CLASSES) & (codes >= 0)]
+    # groupby skips NaN LST by itself
+    return df.groupby("code")["lst"].agg(stat).reindex(range(n_regions)).to_numpy()
+
+
+@pytest.mark.parametrize("stat", ["median", "mean"])
+@pytest.mark.parametrize("size", [1, 3, 4])
+def test_region_baselines_match_a_pandas_groupby(stat, size):
+    lst, landcover, row, col = synthetic_grid()
+    codes = uhi.block_regions(row, col, size)
+    codes[::17] = -1  # cells outside every region
+    n_regions = int(codes.max()) + 1
+    got = uhi.region_baselines(lst, landcover, codes, n_regions, stat)
+    np.testing.assert_allclose(got, groupby_baselines(lst, landcover, codes, n_regions, stat), rtol=1e-12)
+
+
+def test_regions_without_rural_cells_have_no_baseline_or_uhi():
+    lst, landcover, row, col = synthetic_grid()
+    codes = uhi.block_regions(row, col, 3)
+    corner = codes[(row == ROWS - 1) & (col == COLS - 1)][0]
+    baselines = uhi.region_baselines(lst, landcover, codes, int(codes.max()) + 1)
+    assert np.isnan(baselines[corner])
+    assert np.isfinite(np.delete(baselines, corner)).all()
+
+    df = pd.DataFrame({"lst_celsius": lst, "landcover_class": landcover, "block": codes})
+    uhi.add_uhi(df, by="block", baseline_column="baseline")
+    in_corner = df["block"] == corner
+    assert df.loc[in_corner, ["uhi_intensity", "baseline"]].isna().all().all()
+    built = (df["landcover_class"] == uhi.BUILT_CLASS) & ~in_corner & df["lst_celsius"].notna()
+    np.testing.assert_allclose(df.loc[built, "uhi_intensity"],
+                               df.loc[built, "lst_celsius"] - df.loc[built, "baseline"])
+    assert df.loc[df["landcover_class"] != uhi.BUILT_CLASS, "uhi_intensity"].isna().all()
+
+
+def test_unknown_stat_is_rejected():
+    lst, landcover, row, col = synthetic_grid()
+    with pytest.raises(ValueError):
+        uhi.region_baselines(lst, landcover, np.zeros(len(lst), dtype=np.int64), 1, "max")
+
+
+@pytest.mark.parametrize("radius", [0, 1, 2, 6])
+def test_window_baselines_match_a_brute_force_loop(radius):
+    lst, landcover, row, col = synthetic_grid()
+    got = uhi.window_baselines(lst, landcover, row, col, radius)
+
+    rural = uhi.rural_mask(landcover, lst)
+    expected = np.full(len(lst), np.nan)
+    for k in range(len(lst)):
+        near = rural & (np.abs(row - row[k]) <= radius) & (np.abs(col - col[k]) <= radius)
+        if near.any():
+            expected[k] = lst[near].mean()
+    np.testing.assert_allclose(got, expected, rtol=1e-9)
+    if radius == 0:
+        # A cell's own window holds only itself
+        assert np.isnan(got[~rural]).all()
+
+
+def test_window_baselines_skip_cells_without_a_grid_position():
+    lst, landcover, row, col = synthetic_grid()
+    row, col = row.copy(), col.copy()
+    row[5] = col[5] = -1
+    got = uhi.window_baselines(lst, landcover, row, col, 1)
+    assert np.isnan(got[5])
+    # ...and do not count towards their neighbours
+    reference = uhi.window_baselines(np.delete(lst, 5), np.delete(landcover, 5), np.delete(row, 5),
+                                     np.delete(col, 5), 1)
+    np.testing.assert_allclose(np.delete(got, 5), reference)
+
+
+def test_add_uhi_window_reads_positions_from_the_geometry():
+    lst, landcover, row, col = synthetic_grid()
+    dx, dy = 0.01, 0.01
+
+    def square(i, j):
+        x0, y0 = 77.0 + j * dx, 28.0 + i * dy
+        return json.dumps({"type": "Polygon", "coordinates": [[[x0, y0], [x0 + dx, y0], [x0 + dx, y0 + dy],
+                                                               [x0, y0 + dy], [x0, y0]]]})
+
+    df = pd.DataFrame({"lst_celsius": lst, "landcover_class": landcover,
+                       "geometry": [square(i, j) for i, j in zip(row, col)]})
+    baseline = uhi.add_uhi(df, window=2)
+    np.testing.assert_allclose(baseline, uhi.window_baselines(lst, landcover, row, col, 2))
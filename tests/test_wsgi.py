@@ -0,0 +1,17 @@
+import db_pool
+
+
+def test_import_does_not_touch_the_database(db, monkeypatch):
+    monkeypatch.setattr(db_pool, "close_pool", lambda: None)
+    import wsgi
+
+    assert db.queries == []
+    assert wsgi.WORKERS * db_pool.POOL_MAX <= max(wsgi.MAX_CONNECTIONS, wsgi.WORKERS)
+
+
+def test_pool_size_splits_max_connections_across_workers():
+    import wsgi
+
+    assert wsgi.pool_size(workers=17, threads=8, max_connections=90) == 5
+    assert wsgi.pool_size(workers=2, threads=8, max_connections=90) == 8
+    assert wsgi.pool_size(workers=200, threads=8, max_connections=90) == 1
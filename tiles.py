@@ -0,0 +1,78 @@
+"""Mapbox vector tiles (MVT) of the grid layer, built by PostGIS.
+
+Each tile holds the cells of `testing_shapes` that intersect it, clipped and
+quantized by ST_AsMVTGeom, with the attributes needed for scoring. Below
+TILE_PYRAMID_ZOOM each zoom step reads the next coarser `grid_pyramid` level
+(see precompute.py) instead, so zoomed-out tiles stay small. Tiles are
+cached as bytes in a ResponseCache so repeated pans and zooms never reach the
+database.
+"""
+import os
+
+import response_cache
+from grid_store import GRID_SRID, PYRAMID_LEVELS, execute_grid
+
+LAYER_NAME = "grid"
+EXTENT = 4096
+BUFFER = 64
+MIN_ZOOM = int(os.environ.get("TILE_MIN_ZOOM", 4))
+MAX_ZOOM = int(os.environ.get("TILE_MAX_ZOOM", 18))
+TILE_CACHE_SIZE = int(os.environ.get("TILE_CACHE_SIZE", 2048))
+# Zoom from which the base grid cells are drawn
+PYRAMID_ZOOM = int(os.environ.get("TILE_PYRAMID_ZOOM", 12))
+
+MVT_MIMETYPE = "application/vnd.mapbox-vector-tile"
+
+TILE_SQL = """
+    WITH bounds AS (
+        SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS geom
+    ),
+    cells AS (
+        SELECT
+            ST_AsMVTGeom(ST_Transform(w.geom, 3857), bounds.geom, {extent}, {buffer}, true) AS geom,
+            w.gid,
+            w.landcove_1,
+            CAST(w.lighting_r AS double precision) AS lighting_r,
+            CAST(w.lst_celsiu AS double precision) AS lst_celsiu,
+            CAST(w.no2 AS double precision) AS no2,
+            CAST(w.uhi_intens AS double precision) AS uhi_intens,
+            w.flood_frac,
+            w.ps_dist_m
+        FROM {source} w, bounds
+        WHERE w.geom && ST_Transform(bounds.geom, {srid}){level_filter}
+    )
+    SELECT ST_AsMVT(cells.*, '{layer}', {extent}, 'geom', 'gid') AS tile
+    FROM cells
+    WHERE cells.geom IS NOT NULL;
+"""
+
+
+def _tile_sql(source, level_filter=""):
+    return TILE_SQL.format(source=source, level_filter=level_filter, extent=EXTENT, buffer=BUFFER,
+                           srid=GRID_SRID, layer=LAYER_NAME)
+
+
+BASE_TILE_SQL = _tile_sql("testing_shapes")
+PYRAMID_TILE_SQL = _tile_sql("grid_pyramid", " AND w.level = %(level)s")
+
+
+def tile_level(z):
+    """Pyramid level drawn at zoom `z` (0 = base cells)."""
+    return max(0, min(PYRAMID_LEVELS, PYRAMID_ZOOM - z))
+
+
+def valid_tile(z, x, y):
+    return MIN_ZOOM <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def render_tile(cur, z, x, y):
+    """MVT bytes for tile z/x/y (empty bytes if no cells fall inside)."""
+    level = tile_level(z)
+    execute_grid(cur, PYRAMID_TILE_SQL if level else BASE_TILE_SQL, {"z": z, "x": x, "y": y, "level": level})
+    row = cur.fetchone()
+    tile = row["tile"] if row else None
+    return bytes(tile) if tile else b""
+
+
+def make_cache():
+    return response_cache.ResponseCache(maxsize=TILE_CACHE_SIZE, shared=response_cache.shared_tier_from_env())
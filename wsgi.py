@@ -0,0 +1,127 @@
+"""Production entry point for the API.
+
+    python wsgi.py                    # gunicorn (Linux/macOS) or waitress (Windows)
+    gunicorn wsgi:app                 # picks up gunicorn.conf.py from this directory
+
+Environment:
+    WEB_BIND           host:port to listen on (default 0.0.0.0:5000)
+    WEB_WORKERS        worker processes (gunicorn only, default 2 x CPUs + 1)
+    WEB_THREADS        threads per worker (default 8)
+    WEB_TIMEOUT        seconds before a stuck worker is restarted (default 60)
+    WARM_DISTRICTS     comma-separated districts whose payloads are built at startup
+    DB_MAX_CONNECTIONS connections all workers together may open (default 90,
+                       under Postgres' default max_connections of 100)
+    DB_POOL_MAX        per-worker pool size; defaults to DB_MAX_CONNECTIONS
+                       split across the workers, at most WEB_THREADS
+    DB_NAME / DB_USER / DB_PASSWORD / DB_HOST / DB_PORT   see db_pool.py
+
+Startup loads the police stations (and their KD-tree) and the WARM_DISTRICTS
+payloads once, in the gunicorn master (`when_ready`, with `preload_app`), so
+the warmed caches are shared by all workers copy-on-write; the master then
+closes its connections and each worker opens its own pool after the fork
+(`post_fork`). Importing this module does not touch the database.
+"""
+import logging
+import os
+import sys
+
+import app_logging
+import db_pool
+from database_connection import app, build_district_payload, district_cache, district_cache_key, grid_store
+
+app_logging.configure_logging()
+log = logging.getLogger("usp.wsgi")
+
+BIND = os.environ.get("WEB_BIND", "0.0.0.0:5000")
+WORKERS = int(os.environ.get("WEB_WORKERS", 2 * (os.cpu_count() or 1) + 1))
+THREADS = int(os.environ.get("WEB_THREADS", 8))
+TIMEOUT = int(os.environ.get("WEB_TIMEOUT", 60))
+WARM_DISTRICTS = [d.strip() for d in os.environ.get("WARM_DISTRICTS", "").split(",") if d.strip()]
+MAX_CONNECTIONS = int(os.environ.get("DB_MAX_CONNECTIONS", 90))
+
+
+def pool_size(workers=WORKERS, threads=THREADS, max_connections=MAX_CONNECTIONS):
+    """Per-worker DB_POOL_MAX so that workers x pool stays within max_connections."""
+    return max(1, min(threads, max_connections // workers))
+
+
+# waitress serves from a single process
+_workers = 1 if sys.platform == "win32" else WORKERS
+if "DB_POOL_MAX" not in os.environ:
+    db_pool.POOL_MAX = pool_size(_workers)
+    db_pool.POOL_MIN = min(db_pool.POOL_MIN, db_pool.POOL_MAX)
+elif _workers * db_pool.POOL_MAX > MAX_CONNECTIONS:
+    log.warning("%d workers x DB_POOL_MAX=%d exceeds DB_MAX_CONNECTIONS=%d",
+                _workers, db_pool.POOL_MAX, MAX_CONNECTIONS)
+
+
+def warm_up(districts=WARM_DISTRICTS):
+    """Fill the police station and district caches; a database outage only logs a warning."""
+    try:
+        with app.app_context():
+            stations = grid_store.police_stations(db_pool.cursor)
+            grid_store.station_index(db_pool.cursor)
+            for district in districts:
+                key = district_cache_key(district)
+                if district_cache.get(key) is None:
+                    district_cache.set(key, app.json.dumps(build_district_payload(district)).encode('utf-8'))
+                grid_store.get(db_pool.cursor, district)
+        log.info("warmed caches: %d police stations, districts %s", len(stations), districts or "none")
+    except Exception:
+        log.warning("cache warm-up failed; caches will fill on first requests", exc_info=True)
+    finally:
+        # Connections must not be shared with forked workers
+        db_pool.close_pool()
+
+
+def when_ready(server):
+    """gunicorn hook: warm the caches once in the master, before workers fork."""
+    warm_up()
+
+
+def post_fork(server, worker):
+    """gunicorn hook: open this worker's own connection pool."""
+    try:
+        db_pool.get_pool()
+    except Exception:
+        log.warning("worker %s could not connect yet; the pool opens on first request", worker.pid, exc_info=True)
+
+
+def serve_gunicorn():
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in {
+                "bind": BIND,
+                "workers": WORKERS,
+                "threads": THREADS,
+                "worker_class": "gthread",
+                "timeout": TIMEOUT,
+                "preload_app": True,
+                "when_ready": when_ready,
+                "post_fork": post_fork,
+            }.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    Server().run()
+
+
+def serve_waitress():
+    from waitress import serve
+
+    host, _, port = BIND.rpartition(":")
+    warm_up()
+    serve(app, host=host or "0.0.0.0", port=int(port), threads=THREADS)
+
+
+if __name__ == "__main__":
+    if sys.platform == "win32":
+        print(f"🚀 waitress on {BIND}, {THREADS} threads")
+        serve_waitress()
+    else:
+        print(f"🚀 gunicorn on {BIND}, {WORKERS} workers x {THREADS} threads")
+        serve_gunicorn()